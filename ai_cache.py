@@ -0,0 +1,184 @@
+"""
+Persistent response cache for Krishi Mitra AI calls
+Stores Gemini answers in SQLite next to krishi_mitra.db so they survive restarts
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+
+def normalize_query(text):
+    """Normalize a query so trivially different spellings share a cache entry."""
+    text = unicodedata.normalize('NFKC', str(text or '')).casefold()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip('?!.,;:।॥ ')
+
+
+def make_cache_key(method, query, language, model):
+    """Build a stable key from (method, normalized query, language, model)."""
+    raw = json.dumps([method, normalize_query(query), language, model], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed cache with per-method TTLs and LRU eviction by byte budget.
+
+    Hits refresh an entry's last access at most every `touch_interval` seconds,
+    so the read path rarely writes; LRU order only needs to be roughly right.
+    """
+
+    def __init__(self, db_path, ttls=None, default_ttl=7 * 24 * 3600, max_bytes=64 * 1024 * 1024,
+                 touch_interval=300):
+        self.db_path = db_path
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_response_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    language TEXT,
+                    response TEXT NOT NULL,
+                    size_bytes INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_cache_last_access
+                ON ai_response_cache (last_access)
+            ''')
+            self._conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_cache_expires_at
+                ON ai_response_cache (expires_at)
+            ''')
+            self._conn.commit()
+            self._total_bytes = self._stored_bytes()
+
+    def _stored_bytes(self):
+        return self._conn.execute(
+            'SELECT COALESCE(SUM(size_bytes), 0) FROM ai_response_cache'
+        ).fetchone()[0]
+
+    def get(self, method, query, language, model):
+        """Return a cached response or None when missing or expired."""
+        key = make_cache_key(method, query, language, model)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT response, expires_at, last_access, size_bytes '
+                'FROM ai_response_cache WHERE cache_key = ?',
+                (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                if now - row[2] >= self.touch_interval:
+                    self._conn.execute(
+                        'UPDATE ai_response_cache SET last_access = ? WHERE cache_key = ?',
+                        (now, key)
+                    )
+                    self._conn.commit()
+                self.hits[method] = self.hits.get(method, 0) + 1
+                return row[0]
+            if row:
+                self._conn.execute('DELETE FROM ai_response_cache WHERE cache_key = ?', (key,))
+                self._conn.commit()
+                self._total_bytes -= row[3]
+            self.misses[method] = self.misses.get(method, 0) + 1
+            return None
+
+    def set(self, method, query, language, model, response):
+        """Store a response and evict least recently used entries over budget."""
+        key = make_cache_key(method, query, language, model)
+        now = time.time()
+        ttl = self.ttls.get(method, self.default_ttl)
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            replaced = self._conn.execute(
+                'SELECT size_bytes FROM ai_response_cache WHERE cache_key = ?', (key,)
+            ).fetchone()
+            self._total_bytes += size - (replaced[0] if replaced else 0)
+            self._conn.execute('''
+                INSERT OR REPLACE INTO ai_response_cache
+                (cache_key, method, language, response, size_bytes, created_at, expires_at, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (key, method, language, response, size, now, now + ttl, now))
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        expired, expired_bytes = self._conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM ai_response_cache WHERE expires_at <= ?',
+            (now,)
+        ).fetchone()
+        if expired:
+            self._conn.execute('DELETE FROM ai_response_cache WHERE expires_at <= ?', (now,))
+            self._total_bytes -= expired_bytes
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Other processes share the file, so recount before evicting
+        total = self._stored_bytes()
+        cursor = self._conn.execute(
+            'SELECT cache_key, size_bytes FROM ai_response_cache ORDER BY last_access ASC'
+        )
+        victims = []
+        for cache_key, size in cursor:
+            if total <= self.max_bytes:
+                break
+            victims.append((cache_key,))
+            total -= size
+        self._conn.executemany('DELETE FROM ai_response_cache WHERE cache_key = ?', victims)
+        self._total_bytes = total
+
+    def get_or_generate(self, method, query, language, model, generate, cacheable=None):
+        """Return a cached answer, or call generate() and cache a successful result.
+
+        `cacheable(response)` overrides which results count as successful.
+        """
+        cached = self.get(method, query, language, model)
+        if cached is not None:
+            return cached
+        response = generate()
+        if cacheable is not None:
+            store = cacheable(response)
+        else:
+            store = isinstance(response, str) and response and not response.startswith('Error:')
+        if store:
+            self.set(method, query, language, model, response)
+        return response
+
+    def stats(self):
+        """Return hit/miss counters and current cache size."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM ai_response_cache'
+            ).fetchone()
+            return {
+                'hits': dict(self.hits),
+                'misses': dict(self.misses),
+                'entries': entries,
+                'size_bytes': size,
+                'max_bytes': self.max_bytes,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM ai_response_cache')
+            self._conn.commit()
+            self._total_bytes = 0
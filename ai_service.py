@@ -2,15 +2,132 @@
 Google Gemini AI Service for Krishi Mitra
 """
 
+import asyncio
+import contextvars
+import functools
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
 import google.generativeai as genai
 from PIL import Image
 import streamlit as st
-from config import get_gemini_api_key
+from config import (
+    get_gemini_api_key, GEMINI_API_ENDPOINT, AI_CACHE_PATH, AI_CACHE_MAX_BYTES, AI_CACHE_TTLS,
+    SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES, AI_MAX_CONCURRENCY, AI_SYNC_TIMEOUT,
+    MODEL_DAILY_REQUEST_LIMIT, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN_SECONDS,
+    QUOTA_COOLDOWN_SECONDS, AI_HEDGING_ENABLED, AI_HEDGE_PERCENTILE, AI_HEDGE_MIN_DELAY_SECONDS,
+    AI_HEDGE_MAX_PER_MINUTE, GEMINI_RPM_LIMIT, GEMINI_TPM_LIMIT, AI_EXPECTED_OUTPUT_TOKENS,
+    AI_QUEUE_TIMEOUT_SECONDS, AI_COALESCE_TIMEOUT_SECONDS, KNOWLEDGE_DB_PATH, CROP_CORPUS_VERSION,
+    SCHEME_KB_VERSION, IMAGE_CACHE_MAX_DISTANCE, IMAGE_CACHE_MAX_ENTRIES, DIAGNOSIS_IMAGES_PER_REQUEST,
+    CHAT_CONTEXT_MESSAGES, CHAT_CONTEXT_TOKEN_BUDGET, CHAT_SUMMARY_MAX_TOKENS,
+    JOB_QUEUE_PATH, JOB_WORKERS, JOB_RESULT_TTL_SECONDS,
+    AI_CASSETTE_MODE, AI_CASSETTE_PATH, AI_CASSETTE_LATENCY, AI_CASSETTE_LATENCY_SCALE,
+    AI_CASSETTE_429_RATE, AI_CASSETTE_SEED, PROMPT_TOKEN_BUDGETS,
+    LOCAL_LLM_MODEL_PATH, LOCAL_LLM_WORKERS, LOCAL_LLM_THREADS, LOCAL_LLM_MAX_PENDING,
+    LOCAL_LLM_CONTEXT_TOKENS, LOCAL_LLM_MAX_OUTPUT_TOKENS, LOCAL_LLM_TIMEOUT_SECONDS,
+    LOCAL_LLM_QUEUE_SECONDS
+)
+from ai_cache import ResponseCache, normalize_query
+from semantic_cache import SemanticCache
+from model_router import ModelRouter, is_quota_error, is_transient_error
+from hedging import HedgePolicy
+import lang_detect
+from rate_limiter import FairScheduler, current_session, wait_callback
+from singleflight import SingleFlight
+from knowledge_store import KnowledgeStore
+from scheme_kb import SchemeKnowledgeBase
+from image_cache import ImageDiagnosisCache
+from utils import perceptual_hash
+from chat_context import ConversationContext, format_message
+import prompts
+from prompts import count_tokens, truncate_to_tokens, language_name, TokenUsage
+from batch_diagnosis import pack_batches, batch_contents
+from diagnosis import parse_diagnosis, parse_diagnoses, dump_diagnosis
+from job_queue import JobQueue
+from cassette import Cassette, OFF, REPLAY
+from local_llm import LlamaBackend
+
+ALL_MODELS_UNAVAILABLE = "Error: All models exceeded quota. Please try after 24 hours or use a different API key."
+QUEUE_TIMEOUT = "Error: Too many farmers are asking right now. Please try again in a minute."
+INTERRUPTED = "Error: The answer was interrupted. Please ask again."
+
+# Methods the background job queue may run; their arguments are stored as JSON
+JOB_METHODS = (
+    'get_farming_response', 'generate_crop_knowledge', 'stream_crop_knowledge',
+    'get_government_scheme_info', 'stream_government_scheme_info'
+)
+
+# Gemini bills each inline image as a fixed number of input tokens
+IMAGE_INPUT_TOKENS = 258
+
+def is_error_response(response):
+    """True when a generated or streamed answer ended in an error."""
+    return not response or response.startswith('Error:') or '\n\nError: ' in response
+
+class LocalAnswer(str):
+    """Text from the local fallback model: shown to the farmer, never cached.
+    
+    A small CPU model's answer is a stopgap; caching it under the Gemini model
+    key would keep serving it long after Gemini is back.
+    """
+
+def join_chunks(chunks):
+    """Join streamed chunks, keeping the LocalAnswer mark if any chunk had it."""
+    text = ''.join(chunks)
+    return LocalAnswer(text) if any(isinstance(chunk, LocalAnswer) for chunk in chunks) else text
+
+def is_cacheable(response):
+    """True for a complete Gemini answer."""
+    return not is_error_response(response) and not isinstance(response, LocalAnswer)
+
+def request_contents(prompt, image=None):
+    """Prompt plus one image, or a numbered list of images for batch requests."""
+    if image is None:
+        return prompt
+    if isinstance(image, list):
+        return batch_contents(prompt, image)
+    return [prompt, image]
+
+def generation_config(prompt):
+    """Generation settings a rendered prompt asks for, such as a JSON response schema."""
+    return getattr(prompt, 'generation_config', None)
+
+def image_hash(image):
+    """Perceptual hash from compress_image, computed here if missing."""
+    value = image.info.get('dhash')
+    return value if value is not None else perceptual_hash(image)
+
+def image_digest(image):
+    """Content hash of a PIL image for request coalescing."""
+    digest = hashlib.sha256(f"{image.mode}:{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
 
 class KrishiAI:
-    def __init__(self):
-        api_key = get_gemini_api_key()
-        genai.configure(api_key=api_key)
+    def __init__(self, cassette=None, fallback=None):
+        if cassette is None and AI_CASSETTE_MODE != OFF:
+            cassette = Cassette(
+                AI_CASSETTE_PATH,
+                mode=AI_CASSETTE_MODE,
+                latency=AI_CASSETTE_LATENCY,
+                latency_scale=AI_CASSETTE_LATENCY_SCALE,
+                quota_error_rate=AI_CASSETTE_429_RATE,
+                seed=AI_CASSETTE_SEED
+            )
+        self.cassette = cassette
+        
+        # Replay runs fully offline, so no API key is needed
+        model_factory = genai.GenerativeModel
+        if cassette is None or cassette.mode != REPLAY:
+            api_key = get_gemini_api_key()
+            if GEMINI_API_ENDPOINT:
+                genai.configure(api_key=api_key, transport='rest',
+                                client_options={'api_endpoint': GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=api_key)
+        if cassette is not None:
+            model_factory = cassette.wrap(genai.GenerativeModel)
         
         # Try multiple models in order
         self.models_to_try = [
@@ -19,146 +136,774 @@ class KrishiAI:
             'models/gemini-2.0-flash-lite-001',
             'models/gemini-2.5-flash-lite'
         ]
-        self.current_model_index = 0
-        self.model = genai.GenerativeModel(self.models_to_try[0])
+        self.router = ModelRouter(
+            self.models_to_try,
+            model_factory,
+            daily_limit=MODEL_DAILY_REQUEST_LIMIT,
+            failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+            cooldown_seconds=CIRCUIT_COOLDOWN_SECONDS,
+            quota_cooldown_seconds=QUOTA_COOLDOWN_SECONDS
+        )
+        self.model = self.router.handle(self.models_to_try[0])
+        self.hedging = HedgePolicy(
+            enabled=AI_HEDGING_ENABLED,
+            percentile=AI_HEDGE_PERCENTILE,
+            min_delay=AI_HEDGE_MIN_DELAY_SECONDS,
+            max_per_minute=AI_HEDGE_MAX_PER_MINUTE
+        )
+        # Text-only requests go to this backend when no Gemini model can take them
+        if fallback is None and LOCAL_LLM_MODEL_PATH:
+            fallback = LlamaBackend(
+                LOCAL_LLM_MODEL_PATH,
+                threads=LOCAL_LLM_THREADS,
+                workers=LOCAL_LLM_WORKERS,
+                max_pending=LOCAL_LLM_MAX_PENDING,
+                context_tokens=LOCAL_LLM_CONTEXT_TOKENS,
+                max_tokens=LOCAL_LLM_MAX_OUTPUT_TOKENS,
+                timeout=LOCAL_LLM_TIMEOUT_SECONDS
+            )
+        self.fallback = fallback
+        self.token_usage = TokenUsage()
+        self.malformed_diagnoses = 0
+        # Hedged primaries share the async client's in-flight cap; backups are
+        # budgeted per minute on top of it
+        self._executor = ThreadPoolExecutor(max_workers=AI_MAX_CONCURRENCY + AI_HEDGE_MAX_PER_MINUTE,
+                                            thread_name_prefix="krishi-hedge")
+        self.scheduler = FairScheduler(
+            GEMINI_RPM_LIMIT,
+            GEMINI_TPM_LIMIT,
+            quantum=AI_EXPECTED_OUTPUT_TOKENS
+        )
+        self.cache = ResponseCache(AI_CACHE_PATH, ttls=AI_CACHE_TTLS, max_bytes=AI_CACHE_MAX_BYTES)
+        self.semantic_cache = SemanticCache(
+            AI_CACHE_PATH,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries_per_language=SEMANTIC_CACHE_MAX_ENTRIES,
+            # Near-duplicates must not outlive the exact answer they reuse
+            ttl=AI_CACHE_TTLS['get_farming_response']
+        )
+        self.inflight = SingleFlight(timeout=AI_COALESCE_TIMEOUT_SECONDS, interrupted=INTERRUPTED)
+        self.knowledge = KnowledgeStore(KNOWLEDGE_DB_PATH)
+        self.schemes = SchemeKnowledgeBase(self.knowledge, SCHEME_KB_VERSION)
+        self.image_cache = ImageDiagnosisCache(
+            AI_CACHE_PATH,
+            max_distance=IMAGE_CACHE_MAX_DISTANCE,
+            max_entries=IMAGE_CACHE_MAX_ENTRIES
+        )
+        self.chat_context = ConversationContext(
+            self.summarize_conversation,
+            keep_messages=CHAT_CONTEXT_MESSAGES,
+            token_budget=CHAT_CONTEXT_TOKEN_BUDGET,
+            summary_tokens=CHAT_SUMMARY_MAX_TOKENS
+        )
+    
+    def _request_cost(self, prompt, image=None):
+        images = len(image) if isinstance(image, list) else int(image is not None)
+        return count_tokens(prompt) + images * IMAGE_INPUT_TOKENS + AI_EXPECTED_OUTPUT_TOKENS
+    
+    def _admit(self, prompt, image=None):
+        """Wait for this session's fair share of the API key's rate limits."""
+        # With a local model to answer instead, a long queue is not worth waiting out
+        timeout = LOCAL_LLM_QUEUE_SECONDS if self._can_fall_back(prompt, image) else AI_QUEUE_TIMEOUT_SECONDS
+        return self.scheduler.acquire(
+            current_session.get(),
+            self._request_cost(prompt, image),
+            timeout=timeout,
+            on_wait=wait_callback.get()
+        )
+    
+    def _flight_key(self, method, query, language, image_hash=None):
+        return (method, normalize_query(query), language, image_hash)
+    
+    def _coalesced(self, key, generate):
+        """Share one upstream call between identical concurrent requests."""
+        try:
+            return self.inflight.do(key, generate)
+        except TimeoutError as e:
+            return f"Error: {str(e)}"
+    
+    def _cached(self, method, query, language, generate):
+        """Serve from the response cache, generating on a miss."""
+        return self._coalesced(
+            self._flight_key(method, query, language),
+            lambda: self.cache.get_or_generate(method, query, language, self.models_to_try[0], generate,
+                                               cacheable=is_cacheable)
+        )
+    
+    def _record_error(self, model_name, error):
+        """Record a failed call; True when the next model should be tried."""
+        if is_quota_error(error):
+            self.router.record_failure(model_name, quota=True)
+            return True
+        if is_transient_error(error):
+            self.router.record_failure(model_name)
+            return True
+        self.router.release(model_name)
+        return False
+    
+    def _record_usage(self, prompt, image, text, response=None):
+        """Log tokens sent and received, preferring the API's own counts."""
+        usage = getattr(response, 'usage_metadata', None)
+        sent = (getattr(usage, 'prompt_token_count', 0)
+                or self._request_cost(prompt, image) - AI_EXPECTED_OUTPUT_TOKENS)
+        received = getattr(usage, 'candidates_token_count', 0) or count_tokens(text)
+        self.token_usage.record(getattr(prompt, 'name', 'prompt'), sent, received)
+    
+    def _call_model(self, model_name, prompt, image=None):
+        """Call one model; returns (text, error, fall_back)."""
+        if not self.router.acquire(model_name):
+            return None, None, True
+        model = self.router.handle(model_name)
+        start = time.monotonic()
+        try:
+            response = model.generate_content(request_contents(prompt, image),
+                                              generation_config=generation_config(prompt))
+            
+            text = response.text
+            
+        except Exception as e:
+            return None, str(e), self._record_error(model_name, e)
+        
+        self.router.record_success(model_name, time.monotonic() - start)
+        self._record_usage(prompt, image, text, response)
+        return text, None, False
+    
+    def _can_fall_back(self, prompt, image=None):
+        """True when the local backend can take this request; it has no vision or JSON mode."""
+        return (image is None and generation_config(prompt) is None
+                and self.fallback is not None and self.fallback.available())
+    
+    def _fall_back(self, prompt, image, error):
+        """Answer on the local backend, or return the Gemini error if it cannot."""
+        if not self._can_fall_back(prompt, image):
+            return error
+        text = self.fallback.generate(prompt)
+        return LocalAnswer(text) if text else error
+    
+    def _fall_back_stream(self, prompt, image, error):
+        chunks = self.fallback.stream(prompt) if self._can_fall_back(prompt, image) else None
+        if chunks is None:
+            yield error
+            return
+        started = False
+        try:
+            for chunk in chunks:
+                started = True
+                yield LocalAnswer(chunk)
+        except Exception as e:
+            yield f"\n\nError: {str(e)}" if started else error
     
     def _try_generate(self, prompt, image=None):
-        """Try generating with fallback models."""
-        max_attempts = len(self.models_to_try)
+        """Try generating on the fastest healthy model, falling back on failure."""
+        if not self._admit(prompt, image):
+            return self._fall_back(prompt, image, QUEUE_TIMEOUT)
+        
+        candidates = self.router.candidates()
+        
+        if self.hedging.enabled and len(candidates) > 1:
+            self.hedging.record_request()
+            text, error, fall_back = self._hedged_call(candidates[0], candidates[1], prompt, image)
+            if text is not None:
+                return text
+            if not fall_back:
+                return f"Error: {error}"
+            candidates = candidates[2:]
+        
+        for model_name in candidates:
+            text, error, fall_back = self._call_model(model_name, prompt, image)
+            if text is not None:
+                return text
+            if not fall_back:
+                return f"Error: {error}"
+        
+        return self._fall_back(prompt, image, ALL_MODELS_UNAVAILABLE)
+    
+    def _hedged_call(self, primary, backup, prompt, image=None):
+        """Race the primary model against a delayed backup; the first answer wins."""
+        started = threading.Event()
+        
+        def call_primary():
+            started.set()
+            return self._call_model(primary, prompt, image)
         
-        for attempt in range(max_attempts):
+        primary_future = self._executor.submit(call_primary)
+        delay = self.hedging.hedge_delay(self.router, primary)
+        # Time queued behind other calls says nothing about the model's speed
+        started.wait()
+        done, _ = wait([primary_future], timeout=delay)
+        
+        reservation = None if done else self.hedging.try_acquire()
+        if reservation is not None and not self.scheduler.try_acquire(self._request_cost(prompt, image)):
+            self.hedging.release(reservation)
+            reservation = None
+        if reservation is None:
+            result = primary_future.result()
+            if result[0] is None and result[2]:
+                return self._call_model(backup, prompt, image)
+            return result
+        
+        self.hedging.fired()
+        backup_future = self._executor.submit(self._call_model, backup, prompt, image)
+        pending = {primary_future, backup_future}
+        result = (None, None, True)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result[0] is None:
+                    continue
+                # Calls already on the wire cannot be aborted; their answer is dropped
+                for other in pending:
+                    other.cancel()
+                if future is backup_future:
+                    self.hedging.record_hedge_win()
+                    if not primary_future.done():
+                        won_at = time.monotonic()
+                        primary_future.add_done_callback(
+                            lambda f: self.hedging.record_latency_saved(time.monotonic() - won_at)
+                        )
+                return result
+        return result
+    
+    def run_job(self, method, args):
+        """Run a queued background job."""
+        if method not in JOB_METHODS:
+            raise ValueError(f"Unknown job method: {method}")
+        return getattr(self, method)(*args)
+    
+    def detect_language(self, text):
+        """Detect language of input text locally, without an API call."""
+        return lang_detect.detect_language(text)
+    
+    def _try_generate_stream(self, prompt, image=None):
+        """Stream response chunks, falling back to the next model on failure."""
+        if not self._admit(prompt, image):
+            yield from self._fall_back_stream(prompt, image, QUEUE_TIMEOUT)
+            return
+        
+        for model_name in self.router.candidates():
+            if not self.router.acquire(model_name):
+                continue
+            model = self.router.handle(model_name)
+            started = False
+            chunks = []
             try:
-                model_name = self.models_to_try[self.current_model_index]
-                model = genai.GenerativeModel(model_name)
+                response = model.generate_content(request_contents(prompt, image), stream=True,
+                                                  generation_config=generation_config(prompt))
                 
-                if image:
-                    response = model.generate_content([prompt, image])
-                else:
-                    response = model.generate_content(prompt)
-                
-                return response.text
+                for chunk in response:
+                    if chunk.text:
+                        started = True
+                        chunks.append(chunk.text)
+                        yield chunk.text
                 
             except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "quota" in error_str.lower():
-                    # Try next model
-                    self.current_model_index = (self.current_model_index + 1) % len(self.models_to_try)
+                should_fall_back = self._record_error(model_name, e)
+                # Only fall back before anything has been shown to the farmer
+                if should_fall_back and not started:
                     continue
-                else:
-                    return f"Error: {error_str}"
+                yield f"\n\nError: {str(e)}" if started else f"Error: {str(e)}"
+                return
+            except BaseException:
+                # A rerun closes the stream mid-answer; free a half-open trial
+                self.router.release(model_name)
+                raise
+            
+            # Streamed durations depend on answer length, so only health is recorded
+            self.router.record_success(model_name)
+            # The final chunk carries the usage totals for the whole answer
+            self._record_usage(prompt, image, ''.join(chunks), chunk if chunks else None)
+            return
         
-        return "Error: All models exceeded quota. Please try after 24 hours or use a different API key."
+        yield from self._fall_back_stream(prompt, image, ALL_MODELS_UNAVAILABLE)
     
-    def detect_language(self, text):
-        """Detect language of input text."""
-        prompt = f"""
-        Detect the language of the following text and respond with ONLY the ISO 639-1 language code.
-        Supported codes: mr (Marathi), hi (Hindi), en (English), gu (Gujarati), ta (Tamil), te (Telugu), kn (Kannada).
-        If uncertain, default to 'en'.
-        
-        Text: "{text}"
+    def _cached_stream(self, method, query, language, stream):
+        """Stream from the response cache, or stream live and cache the full answer."""
+        model = self.models_to_try[0]
+        cached = self.cache.get(method, query, language, model)
+        if cached is not None:
+            yield cached
+            return
         
-        Respond with only the 2-letter code.
-        """
+        # Identical requests already streaming elsewhere get the full answer at once
+        key = self._flight_key(method, query, language)
+        call, is_leader = self.inflight.begin(key)
+        if not is_leader:
+            try:
+                yield call.wait(self.inflight.timeout)
+            except TimeoutError as e:
+                yield f"Error: {str(e)}"
+            return
         
+        chunks = []
         try:
-            response = self._try_generate(prompt)
-            lang_code = response.strip().lower()[:2]
-            valid_codes = ['mr', 'hi', 'en', 'gu', 'ta', 'te', 'kn']
-            return lang_code if lang_code in valid_codes else 'en'
-        except:
-            return 'en'
-    
-    def get_farming_response(self, query, language='en'):
+            for chunk in stream():
+                chunks.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            self.inflight.finish(key, call, result=INTERRUPTED)
+            raise
+        except Exception as e:
+            self.inflight.finish(key, call, error=e)
+            raise
+        
+        response = join_chunks(chunks)
+        if is_cacheable(response):
+            self.cache.set(method, query, language, model, response)
+        self.inflight.finish(key, call, result=response)
+    
+    def _farming_prompt(self, query, language, context=''):
+        return prompts.FARMING.render(
+            PROMPT_TOKEN_BUDGETS.get('get_farming_response'),
+            language=language_name(language), context=context, query=query
+        )
+    
+    def _crop_image_prompt(self, farmer_query, language):
+        return prompts.CROP_IMAGE.render(
+            PROMPT_TOKEN_BUDGETS.get('analyze_crop_image'),
+            language=language_name(language), farmer_query=farmer_query or "None"
+        )
+    
+    def _crop_images_prompt(self, count, farmer_query, language):
+        return prompts.CROP_IMAGES.render(
+            PROMPT_TOKEN_BUDGETS.get('analyze_crop_images'),
+            count=count, language=language_name(language), farmer_query=farmer_query or "None"
+        )
+    
+    def _crop_knowledge_prompt(self, crop_name, language):
+        return prompts.CROP_KNOWLEDGE.render(
+            PROMPT_TOKEN_BUDGETS.get('generate_crop_knowledge'),
+            crop_name=crop_name, language=language_name(language)
+        )
+    
+    def _scheme_prompt(self, query, language):
+        return prompts.SCHEME.render(
+            PROMPT_TOKEN_BUDGETS.get('get_government_scheme_info'),
+            language=language_name(language), query=query
+        )
+    
+    def summarize_conversation(self, previous_summary, messages):
+        """Fold chat messages into a short rolling summary, cached by its inputs."""
+        transcript = '\n'.join(format_message(message) for message in messages)
+        prompt = prompts.CONVERSATION_SUMMARY.render(
+            PROMPT_TOKEN_BUDGETS.get('summarize_conversation'),
+            summary=previous_summary or "None", transcript=transcript
+        )
+        
+        summary = self._cached('summarize_conversation', f"{previous_summary}\n{transcript}", 'en',
+                               lambda: self._try_generate(prompt))
+        if is_error_response(summary):
+            return truncate_to_tokens(f"{previous_summary} {transcript}".strip(), CHAT_SUMMARY_MAX_TOKENS)
+        return summary
+    
+    def get_farming_response(self, query, language='en', context=''):
         """Get AI response for farming questions."""
-        language_names = {
-            'mr': 'Marathi', 'hi': 'Hindi', 'en': 'English',
-            'gu': 'Gujarati', 'ta': 'Tamil', 'te': 'Telugu', 'kn': 'Kannada'
-        }
-        lang_name = language_names.get(language, 'English')
+        system_prompt = self._farming_prompt(query, language, context)
         
-        system_prompt = f"""
-        You are Krishi Mitra, an expert agricultural advisor for Indian farmers.
-        Respond ONLY in {lang_name} language.
+        if context:
+            # Follow-ups depend on the conversation, so only exact repeats are reused
+            return self._cached('get_farming_response', f"{context}\n{query}", language,
+                                lambda: self._try_generate(system_prompt))
         
-        Farmer's Question: {query}
-        """
+        def generate():
+            similar = self.semantic_cache.lookup(query, language)
+            if similar is not None:
+                return similar
+            response = self._try_generate(system_prompt)
+            if is_cacheable(response):
+                self.semantic_cache.add(query, language, response)
+            return response
         
-        return self._try_generate(system_prompt)
+        return self._cached('get_farming_response', query, language, generate)
     
-    def analyze_crop_image(self, image, farmer_query="", language='en'):
-        """Analyze crop image."""
-        language_names = {
-            'mr': 'Marathi', 'hi': 'Hindi', 'en': 'English',
-            'gu': 'Gujarati', 'ta': 'Tamil', 'te': 'Telugu', 'kn': 'Kannada'
-        }
-        lang_name = language_names.get(language, 'English')
-        
-        prompt = f"""
-        You are an agricultural expert. Analyze this crop image.
-        Respond in {lang_name} language.
-        
-        Farmer's context: {farmer_query if farmer_query else "None"}
-        
-        Provide:
-        1. Crop identification
-        2. Health assessment
-        3. Disease/Pest detection
-        4. Treatment recommendations
-        5. Care tips
+    def stream_farming_response(self, query, language='en', context=''):
+        """Stream AI response for farming questions chunk by chunk."""
+        system_prompt = self._farming_prompt(query, language, context)
+        
+        if context:
+            return self._cached_stream('get_farming_response', f"{context}\n{query}", language,
+                                       lambda: self._try_generate_stream(system_prompt))
+        
+        def stream():
+            similar = self.semantic_cache.lookup(query, language)
+            if similar is not None:
+                yield similar
+                return
+            chunks = []
+            for chunk in self._try_generate_stream(system_prompt):
+                chunks.append(chunk)
+                yield chunk
+            response = join_chunks(chunks)
+            if is_cacheable(response):
+                self.semantic_cache.add(query, language, response)
+        
+        return self._cached_stream('get_farming_response', query, language, stream)
+    
+    def _store_diagnosis(self, phash, language, farmer_query, response):
+        """Validate a JSON diagnosis and cache it in normalized form.
+        
+        Malformed output is returned as-is, uncached, for the UI to show as text.
         """
+        if is_error_response(response):
+            return response
+        diagnosis = parse_diagnosis(response)
+        if diagnosis is None:
+            self.malformed_diagnoses += 1
+            return response
+        report = dump_diagnosis(diagnosis)
+        self.image_cache.add(phash, language, farmer_query, report)
+        return report
+    
+    def _batch_reports(self, response, count):
+        """Normalized JSON reports of a batch answer by photo; None where one failed validation."""
+        reports = [None if diagnosis is None else dump_diagnosis(diagnosis)
+                   for diagnosis in parse_diagnoses(response, count)]
+        self.malformed_diagnoses += reports.count(None)
+        return reports
+    
+    def analyze_crop_image(self, image, farmer_query="", language='en'):
+        """Analyze crop image; returns a JSON diagnosis, or text if the model ignored the schema."""
+        phash = image_hash(image)
+        cached = self.image_cache.lookup(phash, language, farmer_query)
+        if cached is not None:
+            return cached
+        
+        prompt = self._crop_image_prompt(farmer_query, language)
         
-        return self._try_generate(prompt, image)
+        def generate():
+            return self._store_diagnosis(phash, language, farmer_query, self._try_generate(prompt, image))
+        
+        key = self._flight_key('analyze_crop_image', farmer_query, language, image_digest(image))
+        return self._coalesced(key, generate)
+    
+    def analyze_crop_images(self, images, farmer_query="", language='en'):
+        """Analyze several crop images in as few requests as possible; one report per image."""
+        reports = [None] * len(images)
+        hashes = [image_hash(image) for image in images]
+        pending = []
+        for index, image in enumerate(images):
+            reports[index] = self.image_cache.lookup(hashes[index], language, farmer_query)
+            if reports[index] is None:
+                pending.append((index, image))
+        
+        if len(pending) == 1:
+            index, image = pending[0]
+            reports[index] = self.analyze_crop_image(image, farmer_query, language)
+            return reports
+        
+        for batch in pack_batches(pending, DIAGNOSIS_IMAGES_PER_REQUEST):
+            batch_images = [image for _, image in batch]
+            prompt = self._crop_images_prompt(len(batch), farmer_query, language)
+            response = self._try_generate(prompt, batch_images)
+            if is_error_response(response):
+                for index, _ in batch:
+                    reports[index] = response
+                continue
+            for (index, image), report in zip(batch, self._batch_reports(response, len(batch))):
+                if report is None:
+                    # The model skipped or garbled this image; ask for it on its own
+                    reports[index] = self.analyze_crop_image(image, farmer_query, language)
+                else:
+                    self.image_cache.add(hashes[index], language, farmer_query, report)
+                    reports[index] = report
+        return reports
     
     def generate_crop_knowledge(self, crop_name, language='en'):
         """Generate crop lifecycle information."""
-        language_names = {
-            'mr': 'Marathi', 'hi': 'Hindi', 'en': 'English',
-            'gu': 'Gujarati', 'ta': 'Tamil', 'te': 'Telugu', 'kn': 'Kannada'
-        }
-        lang_name = language_names.get(language, 'English')
-        
-        prompt = f"""
-        You are an agricultural expert. Provide complete information about {crop_name}.
-        Respond entirely in {lang_name} language.
-        
-        Include:
-        - Crop overview
-        - Complete lifecycle
-        - Seasonal calendar
-        - Input requirements
-        - Economics
-        - Best practices
-        """
+        stored = self.knowledge.get('crop', crop_name, language, CROP_CORPUS_VERSION)
+        if stored is not None:
+            return stored
         
-        return self._try_generate(prompt)
+        prompt = self._crop_knowledge_prompt(crop_name, language)
+        return self._cached('generate_crop_knowledge', crop_name, language,
+                            lambda: self._try_generate(prompt))
+    
+    def stream_crop_knowledge(self, crop_name, language='en'):
+        """Stream crop lifecycle information chunk by chunk."""
+        stored = self.knowledge.get('crop', crop_name, language, CROP_CORPUS_VERSION)
+        if stored is not None:
+            return iter([stored])
+        
+        prompt = self._crop_knowledge_prompt(crop_name, language)
+        return self._cached_stream('generate_crop_knowledge', crop_name, language,
+                                   lambda: self._try_generate_stream(prompt))
     
     def get_government_scheme_info(self, query, language='en'):
         """Provide government scheme information."""
-        language_names = {
-            'mr': 'Marathi', 'hi': 'Hindi', 'en': 'English',
-            'gu': 'Gujarati', 'ta': 'Tamil', 'te': 'Telugu', 'kn': 'Kannada'
-        }
-        lang_name = language_names.get(language, 'English')
-        
-        prompt = f"""
-        You are a government scheme expert for Indian agriculture.
-        Respond in {lang_name} language.
-        
-        Query: {query}
-        
-        Provide:
-        - Scheme overview
-        - Eligibility criteria
-        - Benefits
-        - Application process
-        - Contact information
+        stored = self.schemes.answer(query, language)
+        if stored is not None:
+            return stored
+        
+        prompt = self._scheme_prompt(query, language)
+        return self._cached('get_government_scheme_info', query, language,
+                            lambda: self._try_generate(prompt))
+    
+    def stream_government_scheme_info(self, query, language='en'):
+        """Stream government scheme information chunk by chunk."""
+        stored = self.schemes.answer(query, language)
+        if stored is not None:
+            return iter([stored])
+        
+        prompt = self._scheme_prompt(query, language)
+        return self._cached_stream('get_government_scheme_info', query, language,
+                                   lambda: self._try_generate_stream(prompt))
+
+class AsyncKrishiAI:
+    """Asyncio client that shares prompts and caches with a KrishiAI instance.
+    
+    Requests run on one background event loop, and a global semaphore bounds how
+    many Gemini calls are in flight across all Streamlit sessions.
+    """
+    
+    def __init__(self, ai, max_concurrency=AI_MAX_CONCURRENCY, timeout=AI_SYNC_TIMEOUT):
+        self.ai = ai
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="krishi-ai-loop", daemon=True)
+        self._thread.start()
+    
+    async def _generate(self, model, contents, config=None):
+        if GEMINI_API_ENDPOINT:
+            # The SDK's REST transport has no async client; keep the loop free
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, functools.partial(model.generate_content, contents, generation_config=config)
+            )
+        return await model.generate_content_async(contents, generation_config=config)
+    
+    async def _try_generate(self, prompt, image=None):
+        """Try generating with fallback models without blocking a thread."""
+        router = self.ai.router
+        loop = asyncio.get_running_loop()
+        admit = functools.partial(contextvars.copy_context().run, self.ai._admit, prompt, image)
+        if not await loop.run_in_executor(None, admit):
+            return await self._fall_back(prompt, image, QUEUE_TIMEOUT)
+        
+        for model_name in router.candidates():
+            if not router.acquire(model_name):
+                continue
+            model = router.handle(model_name)
+            start = time.monotonic()
+            try:
+                async with self._semaphore:
+                    response = await self._generate(model, request_contents(prompt, image),
+                                                    generation_config(prompt))
+                
+                text = response.text
+                
+            except Exception as e:
+                if self.ai._record_error(model_name, e):
+                    continue
+                return f"Error: {str(e)}"
+            except BaseException:
+                # Cancelled by a timeout; free a half-open trial
+                router.release(model_name)
+                raise
+            
+            router.record_success(model_name, time.monotonic() - start)
+            self.ai._record_usage(prompt, image, text, response)
+            return text
+        
+        return await self._fall_back(prompt, image, ALL_MODELS_UNAVAILABLE)
+    
+    async def _fall_back(self, prompt, image, error):
+        """Answer on the local backend's own worker pool, or return the Gemini error."""
+        if not self.ai._can_fall_back(prompt, image):
+            return error
+        future = self.ai.fallback.submit(prompt)
+        if future is None:
+            return error
+        try:
+            text = await asyncio.wait_for(asyncio.wrap_future(future), LOCAL_LLM_TIMEOUT_SECONDS)
+        except Exception:
+            return error
+        return LocalAnswer(text) if text else error
+    
+    async def _coalesced(self, key, generate):
+        """Share one upstream call with identical sync or async requests in flight."""
+        inflight = self.ai.inflight
+        call, is_leader = inflight.begin(key)
+        if not is_leader:
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(None, call.wait, inflight.timeout)
+            except TimeoutError as e:
+                return f"Error: {str(e)}"
+        try:
+            response = await generate()
+        except asyncio.CancelledError:
+            inflight.finish(key, call, result=INTERRUPTED)
+            raise
+        except Exception as e:
+            inflight.finish(key, call, error=e)
+            raise
+        inflight.finish(key, call, result=response)
+        return response
+    
+    async def _cached(self, method, query, language, generate):
+        model = self.ai.models_to_try[0]
+        cached = self.ai.cache.get(method, query, language, model)
+        if cached is not None:
+            return cached
+        
+        async def generate_and_store():
+            response = await generate()
+            if is_cacheable(response):
+                self.ai.cache.set(method, query, language, model, response)
+            return response
+        
+        return await self._coalesced(self.ai._flight_key(method, query, language), generate_and_store)
+    
+    async def get_farming_response(self, query, language='en', context=''):
+        """Get AI response for farming questions."""
+        prompt = self.ai._farming_prompt(query, language, context)
+        
+        if context:
+            return await self._cached('get_farming_response', f"{context}\n{query}", language,
+                                      lambda: self._try_generate(prompt))
+        
+        async def generate():
+            similar = self.ai.semantic_cache.lookup(query, language)
+            if similar is not None:
+                return similar
+            response = await self._try_generate(prompt)
+            if is_cacheable(response):
+                self.ai.semantic_cache.add(query, language, response)
+            return response
+        
+        return await self._cached('get_farming_response', query, language, generate)
+    
+    async def analyze_crop_image(self, image, farmer_query="", language='en'):
+        """Analyze crop image."""
+        phash = image_hash(image)
+        cached = self.ai.image_cache.lookup(phash, language, farmer_query)
+        if cached is not None:
+            return cached
+        
+        prompt = self.ai._crop_image_prompt(farmer_query, language)
+        
+        async def generate():
+            response = await self._try_generate(prompt, image)
+            return self.ai._store_diagnosis(phash, language, farmer_query, response)
+        
+        key = self.ai._flight_key('analyze_crop_image', farmer_query, language, image_digest(image))
+        return await self._coalesced(key, generate)
+    
+    async def analyze_crop_images(self, images, farmer_query="", language='en'):
+        """Analyze several crop images; packed requests run concurrently."""
+        reports = [None] * len(images)
+        hashes = [image_hash(image) for image in images]
+        pending = []
+        for index, image in enumerate(images):
+            reports[index] = self.ai.image_cache.lookup(hashes[index], language, farmer_query)
+            if reports[index] is None:
+                pending.append((index, image))
+        
+        if len(pending) == 1:
+            index, image = pending[0]
+            reports[index] = await self.analyze_crop_image(image, farmer_query, language)
+            return reports
+        
+        async def run_batch(batch):
+            prompt = self.ai._crop_images_prompt(len(batch), farmer_query, language)
+            response = await self._try_generate(prompt, [image for _, image in batch])
+            if is_error_response(response):
+                for index, _ in batch:
+                    reports[index] = response
+                return
+            retries = []
+            for (index, image), report in zip(batch, self.ai._batch_reports(response, len(batch))):
+                if report is None:
+                    retries.append((index, image))
+                else:
+                    self.ai.image_cache.add(hashes[index], language, farmer_query, report)
+                    reports[index] = report
+            # The model skipped or garbled these images; ask for each on its own
+            results = await asyncio.gather(*(self.analyze_crop_image(image, farmer_query, language)
+                                             for _, image in retries))
+            for (index, _), report in zip(retries, results):
+                reports[index] = report
+        
+        await asyncio.gather(*(run_batch(batch)
+                               for batch in pack_batches(pending, DIAGNOSIS_IMAGES_PER_REQUEST)))
+        return reports
+    
+    async def generate_crop_knowledge(self, crop_name, language='en'):
+        """Generate crop lifecycle information."""
+        stored = self.ai.knowledge.get('crop', crop_name, language, CROP_CORPUS_VERSION)
+        if stored is not None:
+            return stored
+        
+        prompt = self.ai._crop_knowledge_prompt(crop_name, language)
+        return await self._cached('generate_crop_knowledge', crop_name, language,
+                                  lambda: self._try_generate(prompt))
+    
+    async def get_government_scheme_info(self, query, language='en'):
+        """Provide government scheme information."""
+        stored = self.ai.schemes.answer(query, language)
+        if stored is not None:
+            return stored
+        
+        prompt = self.ai._scheme_prompt(query, language)
+        return await self._cached('get_government_scheme_info', query, language,
+                                  lambda: self._try_generate(prompt))
+    
+    # --- Sync wrappers for Streamlit pages ---
+    
+    def run(self, coro):
+        """Run a coroutine on the shared loop and wait for its result.
+        
+        Returns an "Error: ..." message instead if it takes longer than the timeout.
         """
+        session = current_session.get()
+        
+        async def with_session():
+            # The loop thread has its own context, so carry the caller's session over
+            current_session.set(session)
+            return await coro
         
-        return self._try_generate(prompt)
+        future = asyncio.run_coroutine_threadsafe(with_session(), self._loop)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # Cancels the coroutine on the loop so it stops holding a semaphore slot
+            future.cancel()
+            return f"Error: No answer within {self.timeout} seconds. Please try again."
+    
+    def gather(self, *coros):
+        """Run several coroutines concurrently and return their results in order."""
+        async def _gather():
+            return await asyncio.gather(*coros)
+        results = self.run(_gather())
+        return [results] * len(coros) if isinstance(results, str) else results
+    
+    def generate_crop_knowledge_many(self, crop_names, language='en'):
+        """Fan out crop knowledge generation for several crops at once."""
+        return self.gather(*[self.generate_crop_knowledge(name, language) for name in crop_names])
+    
+    def get_farming_responses(self, queries, language='en'):
+        """Answer several farming questions concurrently."""
+        return self.gather(*[self.get_farming_response(query, language) for query in queries])
 
 # Singleton instance
 @st.cache_resource
 def get_ai_service():
     return KrishiAI()
+
+@st.cache_resource
+def get_async_ai_service():
+    return AsyncKrishiAI(get_ai_service())
         
+
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(
+        JOB_QUEUE_PATH,
+        get_ai_service().run_job,
+        workers=JOB_WORKERS,
+        result_ttl=JOB_RESULT_TTL_SECONDS,
+        is_error=is_error_response,
+        cacheable=is_cacheable,
+        join=join_chunks
+    ).start()
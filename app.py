@@ -7,6 +7,7 @@ import sqlite3
 import hashlib
 from datetime import datetime
 import os
+from database import get_db_connection  # importing runs the schema migrations once
 
 # Must be first
 st.set_page_config(
@@ -16,40 +17,18 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Database setup
-DB_PATH = "krishi_mitra.db"
-
-def init_user_db():
-    """Initialize user database."""
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mobile_email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            farmer_name TEXT,
-            location TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
 def register_user(mobile_email, password, farmer_name, location):
     try:
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        cursor = conn.cursor()
+        conn = get_db_connection()
         password_hash = hash_password(password)
-        cursor.execute('''
-            INSERT INTO users (mobile_email, password_hash, farmer_name, location)
-            VALUES (?, ?, ?, ?)
-        ''', (mobile_email, password_hash, farmer_name, location))
-        conn.commit()
-        conn.close()
+        with conn:
+            conn.execute('''
+                INSERT INTO users (mobile_email, password_hash, farmer_name, location)
+                VALUES (?, ?, ?, ?)
+            ''', (mobile_email, password_hash, farmer_name, location))
         return True, "Registration successful!"
     except sqlite3.IntegrityError:
         return False, "Mobile number or Email already registered!"
@@ -58,21 +37,15 @@ def register_user(mobile_email, password, farmer_name, location):
 
 def login_user(mobile_email, password):
     try:
-        conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-        cursor = conn.cursor()
+        conn = get_db_connection()
         password_hash = hash_password(password)
-        cursor.execute('''
-            SELECT * FROM users WHERE mobile_email = ? AND password_hash = ?
-        ''', (mobile_email, password_hash))
-        user = cursor.fetchone()
-        conn.close()
+        user = conn.execute('''
+            SELECT id, mobile_email, farmer_name, location FROM users
+            WHERE mobile_email = ? AND password_hash = ?
+        ''', (mobile_email, password_hash)).fetchone()
         if user:
-            return True, {
-                'id': user[0],
-                'mobile_email': user[1],
-                'farmer_name': user[3],
-                'location': user[4]
-            }
+            # Columns by name: the users table has had more than one layout
+            return True, dict(user)
         return False, "Invalid credentials!"
     except Exception as e:
         return False, f"Error: {str(e)}"
@@ -491,9 +464,6 @@ def show_login_page():
         ''', unsafe_allow_html=True)
 
 
-# Initialize
-init_user_db()
-
 # Check login status
 if "logged_in" not in st.session_state:
     st.session_state.logged_in = False
@@ -0,0 +1,53 @@
+"""
+Batched multi-image crop diagnosis for Krishi Mitra
+Several photos are packed into one multimodal request under numbered markers,
+and the JSON answer carries one diagnosis per marker number
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_MARKER = "=== IMAGE {number} ==="
+
+# Inline multimodal requests are capped at about 20MB including the prompt
+MAX_REQUEST_BYTES = 18 * 1024 * 1024
+
+
+def image_size(image):
+    """Approximate encoded size of a compressed PIL image."""
+    fp = getattr(image, 'fp', None)
+    if fp is not None and hasattr(fp, 'getbuffer'):
+        return fp.getbuffer().nbytes
+    return image.width * image.height * 3
+
+
+def preprocess_images(uploaded_files, compress, workers=4):
+    """Compress uploads in parallel; PIL releases the GIL while resizing and encoding."""
+    if len(uploaded_files) <= 1:
+        return [compress(f) for f in uploaded_files]
+    with ThreadPoolExecutor(max_workers=min(workers, len(uploaded_files))) as pool:
+        return list(pool.map(compress, uploaded_files))
+
+
+def pack_batches(items, max_images, max_bytes=MAX_REQUEST_BYTES):
+    """Group (index, image) pairs into as few requests as the limits allow."""
+    batches = []
+    current, current_bytes = [], 0
+    for index, image in items:
+        size = image_size(image)
+        if current and (len(current) >= max_images or current_bytes + size > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append((index, image))
+        current_bytes += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+def batch_contents(prompt, images):
+    """Interleave numbered markers with the images so the model can refer to each."""
+    contents = [prompt]
+    for number, image in enumerate(images, 1):
+        contents.extend([IMAGE_MARKER.format(number=number), image])
+    return contents
+
@@ -0,0 +1,429 @@
+"""
+Benchmarks for Krishi Mitra performance features
+Run: python benchmarks.py [name ...]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+
+def _percentiles(samples_ms):
+    """Format p50/p90/p99 of a list of millisecond samples."""
+    p50, p90, p99 = np.percentile(np.array(samples_ms), [50, 90, 99])
+    return f"p50={p50:.3f}ms p90={p90:.3f}ms p99={p99:.3f}ms"
+
+
+def bench_semantic_cache(entries=100_000, queries=1000):
+    """Lookup latency of the semantic index at `entries` cached answers."""
+    from semantic_cache import SemanticIndex, embed
+
+    rng = np.random.default_rng(42)
+    index = SemanticIndex(capacity=entries)
+    vectors = rng.standard_normal((entries, index.dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    start = time.perf_counter()
+    for i in range(entries):
+        index.add(i, vectors[i], now=float(i))
+    build_s = time.perf_counter() - start
+
+    probes = ["how to control aphids", "best fertilizer for rice", "भातासाठी सर्वोत्तम खत"]
+    embed_ms, search_ms = [], []
+    for i in range(queries):
+        t0 = time.perf_counter()
+        vector = embed(probes[i % len(probes)])
+        t1 = time.perf_counter()
+        index.search(vector, 0.85)
+        t2 = time.perf_counter()
+        embed_ms.append((t1 - t0) * 1000)
+        search_ms.append((t2 - t1) * 1000)
+
+    print(f"semantic_cache: {entries} entries, index built in {build_s:.2f}s, "
+          f"{index.vectors.nbytes / 1e6:.1f} MB of vectors")
+    print(f"  embed:  {_percentiles(embed_ms)}")
+    print(f"  search: {_percentiles(search_ms)}")
+
+
+# Labelled question pairs: (same answer?, query, query). Non-duplicates share
+# most of their words, so they test the threshold and the exact-match guards.
+SEMANTIC_PAIRS = [
+    (True, "how to control aphids", "aphid control"),
+    (True, "how to control aphids in cotton", "aphid control in cotton?"),
+    (True, "best fertilizer for rice", "which fertilizer is best for paddy"),
+    (True, "my wheat leaves are turning yellow", "wheat leaves turning yellow what to do"),
+    (True, "when to sow soybean", "soybean sowing time"),
+    (True, "गेहूं में यूरिया कितना डालें", "gehu me urea kitna dale"),
+    (True, "धान में खाद कब डालें?", "dhan me khad kab dale"),
+    (True, "कपास में माहू का नियंत्रण", "kapas me mahu ka niyantran"),
+    (True, "टमाटर के पत्ते पीले", "tamatar ke patte peele"),
+    (True, "सोयाबीन की बुवाई कब करें", "soyabean ki buvai kab kare"),
+    (True, "ऊस लागवड कशी करावी", "us lagvad kashi karavi"),
+    (True, "कांद्यावरील करपा रोग", "kandyavaril karpa rog"),
+    (True, "गेहूं में यूरिया कितना डालें", "गेहूं में कितना यूरिया डालना है"),
+    (True, "urea dose for 1 acre wheat", "wheat urea dose per 1 acre"),
+    (True, "how much water does sugarcane need", "sugarcane water requirement how much"),
+    (True, "tomato leaf curl virus treatment", "treatment for leaf curl virus in tomatoes"),
+    (True, "organic pesticide for brinjal", "organic pesticides for brinjal"),
+    (True, "drip irrigation subsidy", "subsidy for drip irrigation"),
+    (True, "onion storage tips", "tips for onion storage"),
+    (True, "neem oil spray for aphids", "aphids neem oil spray"),
+    (False, "urea for 1 acre", "urea for 2 acre"),
+    (False, "urea for 1 acre wheat", "urea for 1 hectare wheat"),
+    (False, "spray 2 ml per litre", "spray 20 ml per litre"),
+    (False, "do not use urea", "use urea"),
+    (False, "can I spray without mask", "can I spray with mask"),
+    (False, "गेहूं में यूरिया कितना डालें", "धान में यूरिया कितना डालें"),
+    (False, "best fertilizer for wheat", "best fertilizer for rice"),
+    (False, "how to control aphids", "aphid control in cotton?"),
+    (False, "when to sow wheat", "when to harvest wheat"),
+    (False, "how much water for sugarcane", "how much urea for sugarcane"),
+    (False, "tomato leaf curl treatment", "tomato fruit borer treatment"),
+    (False, "yellow leaves in wheat", "yellow leaves in maize"),
+    (False, "मत डालो यूरिया", "यूरिया डालो"),
+    (False, "soybean seed rate per acre", "soybean seed rate per hectare"),
+    (False, "pm kisan scheme eligibility", "pm kisan scheme installment date"),
+    (False, "drip irrigation subsidy", "solar pump subsidy"),
+    (False, "onion storage tips", "onion sowing tips"),
+    (False, "potato late blight", "tomato late blight"),
+    (False, "fertilizer for 5 acre cotton", "fertilizer for 5 acre soybean"),
+    (False, "spray after 10 days", "spray after 20 days"),
+    (True, "pink bollworm in cotton", "cotton pink bollworm"),
+    (True, "what is pm kisan", "pm kisan kya hai"),
+    (True, "soil testing kaise kare", "how to do soil testing"),
+    (True, "wheat rust treatment", "treatment for rust in wheat"),
+    (True, "rice nursery preparation", "preparation of rice nursery"),
+    (True, "मेरी गेहूं की फसल में पीले पत्ते", "meri gehun ki fasal mein peele patte"),
+    (True, "गन्ने को कितना पानी", "ganne ko kitna pani"),
+    (False, "how to store wheat seed", "how to treat wheat seed"),
+    (False, "wheat rust symptoms", "wheat rust treatment"),
+    (False, "cotton pink bollworm control", "cotton whitefly control"),
+    (False, "कपास में माहू का नियंत्रण", "कपास में गुलाबी सुंडी का नियंत्रण"),
+    (False, "drip irrigation subsidy", "drip irrigation installation"),
+    (False, "rice nursery preparation", "rice transplanting"),
+    (False, "soil testing", "soil erosion"),
+    (False, "organic farming certification", "organic farming benefits"),
+    (False, "गन्ने को कितना पानी", "गन्ने को कितना खाद"),
+]
+
+
+def bench_semantic_threshold(low=0.60, high=0.96, step=0.02):
+    """Precision and recall of semantic cache hits on SEMANTIC_PAIRS per threshold."""
+    from config import SEMANTIC_CACHE_THRESHOLD
+    from semantic_cache import embed, guard_key
+
+    scored = []
+    for same, a, b in SEMANTIC_PAIRS:
+        score = float(embed(a) @ embed(b)) if guard_key(a) == guard_key(b) else -1.0
+        scored.append((same, score))
+    positives = sum(same for same, _ in scored)
+    closest = max(score for same, score in scored if not same)
+    print(f"semantic_threshold: {positives} duplicate and {len(scored) - positives} distinct pairs, "
+          f"closest distinct pair scores {closest:.3f}")
+    for threshold in np.arange(low, high + step / 2, step):
+        hits = [same for same, score in scored if score >= threshold]
+        false_hits = len(hits) - sum(hits)
+        precision = sum(hits) / len(hits) if hits else 1.0
+        marker = '  <- configured' if abs(threshold - SEMANTIC_CACHE_THRESHOLD) < step / 2 else ''
+        print(f"  {threshold:.2f}: precision {precision:.1%} recall {sum(hits) / positives:.1%} "
+              f"false hits {false_hits}{marker}")
+
+
+# Held out from lang_detect.TRAINING_TEXT
+LANG_DETECT_SAMPLES = [
+    ('en', "How much water does sugarcane need in summer?"),
+    ('en', "Which pesticide is safe for tomato plants"),
+    ('en', "My wheat leaves are turning yellow, what should I do?"),
+    ('en', "When is the right time to sow soybean"),
+    ('mr', "माझ्या कापसाच्या पिकावर कीड पडली आहे"),
+    ('mr', "सोयाबीन पेरणी कधी करावी?"),
+    ('mr', "ऊस लागवडीसाठी किती पाणी लागते"),
+    ('mr', "टोमॅटोच्या पानांवर डाग आले आहेत, काय करावे?"),
+    ('mr', "गव्हाच्या पिकाला कोणते खत द्यावे"),
+    ('hi', "मेरी गेहूं की फसल में पीले पत्ते आ रहे हैं"),
+    ('hi', "सोयाबीन की बुवाई कब करनी चाहिए?"),
+    ('hi', "गन्ने को गर्मी में कितना पानी देना चाहिए"),
+    ('hi', "टमाटर के पौधों के लिए कौन सा कीटनाशक सुरक्षित है"),
+    ('hi', "धान में खाद कब डालें?"),
+    ('gu', "મારા કપાસના પાકમાં જીવાત પડી છે"),
+    ('gu', "સોયાબીનની વાવણી ક્યારે કરવી?"),
+    ('gu', "ઘઉં માટે કયું ખાતર સારું છે"),
+    ('ta', "என் நெல் பயிரில் பூச்சி தாக்குதல் உள்ளது"),
+    ('ta', "கரும்புக்கு எவ்வளவு தண்ணீர் தேவை?"),
+    ('ta', "தக்காளி செடிக்கு எந்த உரம் நல்லது"),
+    ('te', "నా పత్తి పంటకు పురుగు పట్టింది"),
+    ('te', "సోయాబీన్ ఎప్పుడు విత్తాలి?"),
+    ('te', "చెరకుకు ఎంత నీరు అవసరం"),
+    ('kn', "ನನ್ನ ಹತ್ತಿ ಬೆಳೆಗೆ ಕೀಟ ಬಾಧೆ ಇದೆ"),
+    ('kn', "ಸೋಯಾಬೀನ್ ಬಿತ್ತನೆ ಯಾವಾಗ ಮಾಡಬೇಕು?"),
+    ('kn', "ಕಬ್ಬಿಗೆ ಎಷ್ಟು ನೀರು ಬೇಕು"),
+    ('hi', "gehu ki fasal mein peele patte kyu aa rahe hain"),
+    ('hi', "dhan ke liye kaunsi khad sabse achhi hai"),
+    ('mr', "kapus pikavar kid padli aahe kay karave"),
+    ('mr', "usachi lagvad kashi karavi"),
+    ('gu', "kapas ma jivat padi chhe shu karvu"),
+    ('ta', "nel payirukku enna uram podanum eppadi"),
+    ('te', "patti pantaku purugu undi emi cheyali"),
+    ('kn', "bhatta bele ge yavaga gobbara haka beku"),
+    ('en', "Is neem oil safe for vegetables"),
+    ('en', "Tell me about the PM Kisan scheme"),
+    ('en', "Why are my onion bulbs rotting"),
+    ('hi', "मत डालो यूरिया, पत्ते जल जाएंगे"),
+    ('hi', "बैंगन में फल छेदक का इलाज बताइए"),
+    ('hi', "mere aam ke ped par phool nahi aa rahe"),
+    ('hi', "bhindi mein safed makhi ka upay batao"),
+    ('mr', "वांग्यावर फळ पोखरणारी अळी आली आहे"),
+    ('mr', "आंब्याला मोहोर येत नाही, काय करावे"),
+    ('mr', "tomatovar karpa rog aala aahe"),
+    ('mr', "dalimbachya baget pani kiti dyave"),
+    ('gu', "મગફળીમાં સફેદ ઈયળ માટે શું કરવું"),
+    ('gu', "kapas ma gulabi iyal mate dava kai chhe"),
+    ('gu', "mara ghau na pan pila kem thay chhe"),
+    ('ta', "வாழை மரத்திற்கு எந்த உரம் போட வேண்டும்"),
+    ('ta', "vaazhai marathukku entha uram poda vendum"),
+    ('ta', "en thakkali chedi eppadi kaappathuvathu"),
+    ('te', "మిరప పంటలో తెగులు వచ్చింది"),
+    ('te', "mirapa pantalo tegulu vachindi emi cheyali"),
+    ('te', "naa vari polamlo neellu ekkuva ayyayi"),
+    ('kn', "ಬಾಳೆ ಗಿಡಕ್ಕೆ ಯಾವ ಗೊಬ್ಬರ ಹಾಕಬೇಕು"),
+    ('kn', "nanna tomato gidakke roga bandide enu maadali"),
+    ('kn', "adike thotakke eshtu neeru beku"),
+]
+
+
+def bench_lang_detect(rounds=2000):
+    """Accuracy and throughput of offline language detection on held-out samples."""
+    from lang_detect import TRAINING_TEXT, detect_language
+
+    trained = {text for samples in TRAINING_TEXT.values() for texts in samples.values() for text in texts}
+    assert not trained & {text for _, text in LANG_DETECT_SAMPLES}, "benchmark samples must be held out"
+
+    correct = 0
+    per_lang = {}
+    for expected, text in LANG_DETECT_SAMPLES:
+        got = detect_language(text)
+        ok = got == expected
+        correct += ok
+        hits, total = per_lang.get(expected, (0, 0))
+        per_lang[expected] = (hits + ok, total + 1)
+        if not ok:
+            print(f"  miss: expected {expected}, got {got}: {text}")
+
+    texts = [text for _, text in LANG_DETECT_SAMPLES]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            detect_language(text)
+    elapsed = time.perf_counter() - start
+    calls = rounds * len(texts)
+
+    print(f"lang_detect: held-out accuracy {correct}/{len(LANG_DETECT_SAMPLES)} "
+          f"({correct / len(LANG_DETECT_SAMPLES):.1%}), trained on {len(trained)} sentences")
+    print("  per language: " + ", ".join(
+        f"{lang} {hits}/{total}" for lang, (hits, total) in sorted(per_lang.items())))
+    print(f"  throughput: {calls / elapsed:,.0f} texts/s, {elapsed / calls * 1e6:.1f} µs/text")
+
+
+def bench_fair_scheduler(rpm=1200, normal_sessions=9, normal_requests=5, spam_requests=60):
+    """Simulate one spamming session and many normal ones sharing the key's RPM."""
+    import threading
+    from rate_limiter import FairScheduler
+
+    scheduler = FairScheduler(requests_per_minute=rpm, tokens_per_minute=10_000_000, quantum=1000)
+    scheduler.requests.tokens = 0  # start drained so every request competes
+    waits = {}
+    lock = threading.Lock()
+
+    def fake_backend_call(session, count):
+        for _ in range(count):
+            start = time.perf_counter()
+            assert scheduler.acquire(session, 1000, timeout=60)
+            time.sleep(0.005)  # fake Gemini round trip
+            with lock:
+                waits.setdefault(session, []).append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=fake_backend_call, args=('spammer', spam_requests // 6))
+               for _ in range(6)]
+    threads += [threading.Thread(target=fake_backend_call, args=(f'farmer-{i}', normal_requests))
+                for i in range(normal_sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(samples) for samples in waits.values())
+    print(f"fair_scheduler: {total} requests from {len(waits)} sessions in {elapsed:.2f}s "
+          f"at {rpm} RPM ({total / elapsed:.1f} req/s)")
+    print(f"  spammer wait: {_percentiles(waits['spammer'])}")
+    normal = [w for session, samples in waits.items() if session != 'spammer' for w in samples]
+    print(f"  farmers wait: {_percentiles(normal)}")
+
+
+def bench_image_hash(stored=1_000_000, images=200, queries=2000):
+    """dHash throughput and near-duplicate lookup latency at `stored` hashes."""
+    import random
+    from PIL import Image, ImageFilter
+    from utils import perceptual_hash
+    from image_cache import MultiIndexHash, hamming
+
+    rng = np.random.default_rng(7)
+    photo = Image.fromarray(rng.integers(0, 255, (800, 800, 3), dtype=np.uint8)).filter(
+        ImageFilter.GaussianBlur(12))
+    start = time.perf_counter()
+    for _ in range(images):
+        perceptual_hash(photo)
+    hash_s = time.perf_counter() - start
+
+    retake = photo.resize((640, 640)).filter(ImageFilter.GaussianBlur(1))
+    print(f"image_hash: dHash {images / hash_s:,.0f} images/s on 800x800, "
+          f"retake distance {hamming(perceptual_hash(photo), perceptual_hash(retake))} bits")
+
+    random.seed(7)
+    index = MultiIndexHash()
+    start = time.perf_counter()
+    values = [random.getrandbits(64) for _ in range(stored)]
+    for entry_id, value in enumerate(values):
+        index.add(entry_id, value)
+    build_s = time.perf_counter() - start
+
+    hit_ms, miss_ms = [], []
+    for i in range(queries):
+        target = values[random.randrange(stored)]
+        near = target
+        for bit in random.sample(range(64), 5):
+            near ^= 1 << bit
+        t0 = time.perf_counter()
+        found = index.search(near, 6)
+        t1 = time.perf_counter()
+        index.search(random.getrandbits(64), 6)
+        t2 = time.perf_counter()
+        assert found is not None
+        hit_ms.append((t1 - t0) * 1000)
+        miss_ms.append((t2 - t1) * 1000)
+
+    print(f"  multi-index: {stored:,} hashes indexed in {build_s:.1f}s")
+    print(f"  near-duplicate hit (5 bits off): {_percentiles(hit_ms)}")
+    print(f"  miss:                            {_percentiles(miss_ms)}")
+
+
+def bench_local_llm(max_tokens=128):
+    """Tokens/sec of the local fallback model at 1, 2, 4... threads."""
+    from local_llm import Llama, LlamaBackend
+
+    # Read from the environment directly; config needs Streamlit secrets
+    model_path = os.getenv("KRISHI_LOCAL_LLM_PATH", "")
+    if Llama is None or not os.path.isfile(model_path):
+        print("local_llm: skipped (install llama-cpp-python and set KRISHI_LOCAL_LLM_PATH to a GGUF model)")
+        return
+
+    prompt = ("You are Krishi Mitra, an expert agricultural advisor for Indian farmers.\n"
+              "Farmer's Question: My wheat leaves are turning yellow, what should I do?")
+    cores = os.cpu_count() or 1
+    threads = [n for n in (1, 2, 4, 8, 16) if n < cores] + [cores]
+    print(f"local_llm: {os.path.basename(model_path)}, {max_tokens} tokens per run, {cores} cores")
+    for n in threads:
+        result = LlamaBackend(model_path, threads=n).benchmark(prompt, max_tokens=max_tokens)
+        print(f"  {n:>2} threads: {result['tokens_per_second']:6.1f} tok/s, "
+              f"{result['tokens_per_second_per_core']:5.2f} tok/s/core, "
+              f"load {result['load_seconds']:.1f}s")
+
+
+def bench_product_search(rows=1_000_000, queries=100):
+    """FTS5 trigram search against the old LIKE scan at `rows` listings."""
+    import random
+    import sqlite3
+    import tempfile
+    from migrations import migrate
+    from database import _search_products, _like_search
+
+    random.seed(11)
+    products = ["Organic Tomatoes", "Basmati Rice", "Desi Ghee", "Turmeric Powder", "Alphonso Mango",
+                "सेंद्रिय टोमॅटो", "गेहूं", "હળદર", "நெல்", "ಬೆಲ್ಲ", "పసుపు"]
+    places = ["Nashik", "Pune", "Karnal", "Anand", "Madurai", "Mysuru", "Guntur", "पुणे", "नासिक"]
+    farmers = ["Ramesh", "Suresh", "Anita", "Kumar", "Lakshmi", "सुरेश", "முருகன்"]
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        migrate(conn)
+        start = time.perf_counter()
+        with conn:
+            # Unique suffixes keep the vocabulary realistic for bm25
+            conn.executemany(
+                'INSERT INTO organic_products (farmer_name, product_name, quantity, location, phone_number) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((f"{random.choice(farmers)} {i % 5000}", f"{random.choice(products)} {i % 997}",
+                  "10 kg", f"{random.choice(places)} {i % 313}", "9999999999") for i in range(rows))
+            )
+        load_s = time.perf_counter() - start
+        print(f"product_search: {rows:,} listings inserted with index triggers in {load_s:.1f}s")
+
+        probes = ["tomato", "Organic Toma", "tomatto", "टोमॅटो", "पुणे", "நெல்", "basmati karnal", "turmric"]
+        for name, search in (("fts5 trigram", _search_products), ("LIKE scan", _like_search)):
+            samples = []
+            for i in range(queries):
+                t0 = time.perf_counter()
+                search(conn, probes[i % len(probes)], 50)
+                samples.append((time.perf_counter() - t0) * 1000)
+            print(f"  {name + ':':14} {_percentiles(samples)}")
+        conn.close()
+
+
+def bench_pagination(rows=1_000_000, page_size=20):
+    """Page latency deep into the feed: OFFSET against a (created_at, id) cursor."""
+    import sqlite3
+    import tempfile
+    import database
+    from migrations import migrate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(path)
+        migrate(conn)
+        with conn:
+            # A few posts per second, so timestamps tie and the id breaks them
+            conn.executemany(
+                "INSERT INTO community_posts (farmer_name, content, created_at) "
+                "VALUES ('Ramesh', 'Sowing update', datetime(1700000000 + ? / 3, 'unixepoch'))",
+                ((i,) for i in range(rows))
+            )
+        conn.close()
+        saved, database._pool = database._pool, database.ConnectionPool(path)
+        try:
+            print(f"pagination: {rows:,} posts, {page_size} per page")
+            for page in (1, 100, 10_000, rows // page_size - 1):
+                offset = page * page_size
+                t0 = time.perf_counter()
+                database.get_all_posts(page_size, offset)
+                offset_ms = (time.perf_counter() - t0) * 1000
+                # The cursor a reader reaches by paging this far
+                last = database.get_all_posts(1, offset - 1)[0]
+                cursor = database.encode_cursor(last['created_at'], last['id'])
+                t0 = time.perf_counter()
+                database._keyset_page('SELECT * FROM community_posts', 'created_at', 'id', page_size, cursor)
+                keyset_ms = (time.perf_counter() - t0) * 1000
+                print(f"  page {page:>6,}: OFFSET {offset_ms:8.3f}ms  cursor {keyset_ms:6.3f}ms")
+        finally:
+            database._pool = saved
+
+
+BENCHMARKS = {
+    'semantic_cache': bench_semantic_cache,
+    'semantic_threshold': bench_semantic_threshold,
+    'lang_detect': bench_lang_detect,
+    'fair_scheduler': bench_fair_scheduler,
+    'image_hash': bench_image_hash,
+    'local_llm': bench_local_llm,
+    'product_search': bench_product_search,
+    'pagination': bench_pagination,
+}
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
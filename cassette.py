@@ -0,0 +1,187 @@
+"""
+Record/replay cassettes for Krishi Mitra Gemini calls
+Record mode saves every prompt, image hash and response to a gzipped JSON-lines
+file; replay mode serves them back offline with simulated latency and
+injected 429s, so the app can be profiled and regression-tested
+deterministically.
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from utils import perceptual_hash
+
+OFF = 'off'
+RECORD = 'record'
+REPLAY = 'replay'
+
+QUOTA_ERROR = "429 Resource has been exhausted (e.g. check quota). Injected by cassette replay."
+
+
+class CassetteMiss(LookupError):
+    """Replay found no recorded response for a request."""
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+def _parts(contents):
+    return contents if isinstance(contents, list) else [contents]
+
+
+def _describe(contents):
+    """(texts, image hashes, request key) for generate_content contents."""
+    texts, images = [], []
+    digest = hashlib.sha256()
+    for part in _parts(contents):
+        if isinstance(part, str):
+            texts.append(part)
+            digest.update(b'T' + part.encode('utf-8'))
+        else:
+            images.append(f"{perceptual_hash(part):016x}")
+            digest.update(b'I' + hashlib.sha256(part.tobytes()).digest())
+    return texts, images, digest.hexdigest()[:32]
+
+
+class Cassette:
+    """One cassette file plus the replay knobs."""
+
+    def __init__(self, path, mode=REPLAY, latency=None, latency_scale=1.0,
+                 quota_error_rate=0.0, seed=0, chunk_chars=80):
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.latency_scale = latency_scale
+        self.quota_error_rate = quota_error_rate
+        self.chunk_chars = chunk_chars
+        self.entries = {}
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self.injected_errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            if self.mode == REPLAY:
+                raise FileNotFoundError(f"No cassette at {self.path}; record one first")
+            return
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry['key']] = entry
+
+    def record(self, model_name, contents, text, latency):
+        texts, images, key = _describe(contents)
+        entry = {
+            'key': key, 'model': model_name, 'prompt': texts, 'images': images,
+            'response': text, 'latency': round(latency, 3),
+        }
+        with self._lock:
+            if key in self.entries:
+                return
+            self.entries[key] = entry
+            self.recorded += 1
+            # Appending a gzip member keeps the file readable as one stream
+            with gzip.open(self.path, 'at', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    def replay(self, contents):
+        """Return (text, delay) for a request, raising like the API would."""
+        _, _, key = _describe(contents)
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded response for request {key}")
+            if self.quota_error_rate and self._random.random() < self.quota_error_rate:
+                self.injected_errors += 1
+                raise Exception(QUOTA_ERROR)
+            self.replayed += 1
+        delay = self.latency if self.latency is not None else entry['latency'] * self.latency_scale
+        return entry['response'], delay
+
+    def wrap(self, model_factory):
+        """Model factory for ModelRouter that records or replays through this cassette."""
+        if self.mode == RECORD:
+            return lambda model_name: RecordingModel(model_factory(model_name), model_name, self)
+        return lambda model_name: ReplayModel(model_name, self)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'entries': len(self.entries),
+                'recorded': self.recorded,
+                'replayed': self.replayed,
+                'misses': self.misses,
+                'injected_errors': self.injected_errors,
+            }
+
+
+class RecordingModel:
+    """Passes calls to a live model and records what came back."""
+
+    def __init__(self, model, model_name, cassette):
+        self.model = model
+        self.model_name = model_name
+        self.cassette = cassette
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        start = time.monotonic()
+        response = self.model.generate_content(contents, stream=stream, **kwargs)
+        if stream:
+            return self._record_stream(contents, response, start)
+        self.cassette.record(self.model_name, contents, response.text, time.monotonic() - start)
+        return response
+
+    def _record_stream(self, contents, response, start):
+        chunks = []
+        for chunk in response:
+            chunks.append(chunk.text or '')
+            yield chunk
+        self.cassette.record(self.model_name, contents, ''.join(chunks), time.monotonic() - start)
+
+    async def generate_content_async(self, contents, **kwargs):
+        start = time.monotonic()
+        response = await self.model.generate_content_async(contents, **kwargs)
+        self.cassette.record(self.model_name, contents, response.text, time.monotonic() - start)
+        return response
+
+
+class ReplayModel:
+    """Serves recorded responses without touching the network."""
+
+    def __init__(self, model_name, cassette):
+        self.model_name = model_name
+        self.cassette = cassette
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        text, delay = self.cassette.replay(contents)
+        if stream:
+            return self._stream(text, delay)
+        time.sleep(delay)
+        return _Response(text)
+
+    def _stream(self, text, delay):
+        size = self.cassette.chunk_chars
+        chunks = [text[i:i + size] for i in range(0, len(text), size)] or ['']
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield _Response(chunk)
+
+    async def generate_content_async(self, contents, **kwargs):
+        text, delay = self.cassette.replay(contents)
+        await asyncio.sleep(delay)
+        return _Response(text)
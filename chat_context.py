@@ -0,0 +1,79 @@
+"""
+Multi-turn chat context for Krishi Mitra
+Keeps the latest messages verbatim and folds older ones into a rolling
+summary, so prompts stay within a fixed token budget however long a chat gets
+"""
+
+from prompts import count_tokens, truncate_to_tokens
+
+ROLE_LABELS = {'user': 'Farmer', 'assistant': 'Krishi Mitra'}
+
+
+def format_message(message):
+    return f"{ROLE_LABELS.get(message['role'], message['role'])}: {message['content']}"
+
+
+class ConversationContext:
+    """Builds bounded prompt context from a chat history.
+
+    `summarize(previous_summary, messages)` folds messages into a summary; it
+    should be cached by its inputs. Per-session progress lives in a plain
+    dict (e.g. st.session_state) so reruns never refold the same messages.
+    """
+
+    def __init__(self, summarize, keep_messages=6, fold_batch=4, token_budget=1500, summary_tokens=300):
+        self.summarize = summarize
+        self.keep_messages = keep_messages
+        self.fold_batch = fold_batch
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+
+    def _fold(self, history, state):
+        summary = state.get('summary', '')
+        upto = state.get('summarized_upto', 0)
+        if upto > len(history):
+            # History was cleared; start over
+            summary, upto = '', 0
+        if len(history) - upto > self.keep_messages + self.fold_batch:
+            fold_end = len(history) - self.keep_messages
+            summary = self.summarize(summary, history[upto:fold_end])
+            upto = fold_end
+        state['summary'] = summary
+        state['summarized_upto'] = upto
+        return summary, history[upto:]
+
+    def build(self, history, state):
+        """Return context text for the prompt, or '' for a fresh conversation."""
+        summary, recent = self._fold(history, state)
+        if not summary and not recent:
+            return ''
+
+        # Newest messages are most relevant to a follow-up, so fill from the end.
+        # Whatever does not fit is folded into the summary rather than dropped;
+        # a longer summary can push out more, hence the loop.
+        while True:
+            shown = truncate_to_tokens(summary, self.summary_tokens)
+            remaining = self.token_budget - count_tokens(shown)
+            lines = []
+            for message in reversed(recent):
+                line = format_message(message)
+                cost = count_tokens(line)
+                if cost > remaining:
+                    break
+                lines.append(line)
+                remaining -= cost
+            overflow = len(recent) - len(lines)
+            if not overflow:
+                break
+            summary = self.summarize(summary, recent[:overflow])
+            recent = recent[overflow:]
+            state['summary'] = summary
+            state['summarized_upto'] += overflow
+        lines.reverse()
+
+        parts = []
+        if shown:
+            parts.append(f"Summary of earlier conversation: {shown}")
+        if lines:
+            parts.append("Recent conversation:\n" + '\n'.join(lines))
+        return '\n'.join(parts)
@@ -5,11 +5,27 @@ Configuration file for Krishi Mitra - Farming Support Application
 import os
 import streamlit as st
 
+def get_secret(name, default=None):
+    """Read a setting from Streamlit secrets, falling back to the environment.
+
+    Command-line tools such as pregenerate_knowledge.py import this module
+    without a secrets.toml, where st.secrets raises on any access.
+    """
+    try:
+        value = st.secrets.get(name)
+    except Exception:
+        value = None
+    return value if value is not None else os.getenv(name, default)
+
 # =============================================================================
 # DATABASE CONFIGURATION (SQLite or Supabase)
 # =============================================================================
+# Local databases, caches and jobs live here; point elsewhere to keep tests
+# and load tests out of real data
+DATA_DIR = os.getenv("KRISHI_DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
+
 # Check for Supabase connection first, fallback to SQLite
-DATABASE_URL = st.secrets.get("DATABASE_URL", None)
+DATABASE_URL = get_secret("DATABASE_URL")
 
 if DATABASE_URL:
     DB_TYPE = "postgresql"  # Supabase/PostgreSQL
@@ -17,21 +33,156 @@ if DATABASE_URL:
 else:
     DB_TYPE = "sqlite"  # Local SQLite fallback
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    DB_PATH = os.path.join(BASE_DIR, "krishi_mitra.db")
+    DB_PATH = os.path.join(DATA_DIR, "krishi_mitra.db")
 
 # =============================================================================
 # GEMINI API CONFIGURATION
 # =============================================================================
 def get_gemini_api_key():
     """Retrieve Gemini API key from Streamlit secrets or environment variables."""
-    try:
-        return st.secrets["GEMINI_API_KEY"]
-    except Exception:
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            st.error("⚠️ GEMINI_API_KEY not found! Please set it in Streamlit Secrets or environment variables.")
-            st.stop()
-        return api_key
+    api_key = get_secret("GEMINI_API_KEY")
+    if not api_key:
+        st.error("⚠️ GEMINI_API_KEY not found! Please set it in Streamlit Secrets or environment variables.")
+        st.stop()
+    return api_key
+
+# Set to send Gemini calls to a proxy or a local stand-in (uses the REST transport)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# =============================================================================
+# AI CONCURRENCY CONFIGURATION
+# =============================================================================
+# Maximum Gemini calls in flight across all sessions for the async client
+AI_MAX_CONCURRENCY = 8
+AI_SYNC_TIMEOUT = 120
+
+# Rate limits of the shared Gemini API key; requests beyond them are queued
+# fairly across sessions
+GEMINI_RPM_LIMIT = int(os.getenv("KRISHI_GEMINI_RPM", "30"))
+GEMINI_TPM_LIMIT = int(os.getenv("KRISHI_GEMINI_TPM", "1000000"))
+AI_EXPECTED_OUTPUT_TOKENS = 800
+AI_QUEUE_TIMEOUT_SECONDS = 60
+
+# Identical concurrent requests wait this long for the shared in-flight call
+AI_COALESCE_TIMEOUT_SECONDS = 90
+
+# Model routing: open a model's circuit after repeated failures or a quota error
+MODEL_DAILY_REQUEST_LIMIT = 1000
+CIRCUIT_FAILURE_THRESHOLD = 3
+CIRCUIT_COOLDOWN_SECONDS = 60
+QUOTA_COOLDOWN_SECONDS = 60
+
+# Hedged requests: fire a backup model when the primary is slower than its
+# observed latency percentile, within a per-minute budget
+AI_HEDGING_ENABLED = False
+AI_HEDGE_PERCENTILE = 90
+AI_HEDGE_MIN_DELAY_SECONDS = 2.0
+AI_HEDGE_MAX_PER_MINUTE = 10
+
+# =============================================================================
+# AI RESPONSE CACHE CONFIGURATION
+# =============================================================================
+AI_CACHE_PATH = os.path.join(DATA_DIR, "ai_cache.db")
+AI_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Time-to-live per KrishiAI method, in seconds
+AI_CACHE_TTLS = {
+    'get_farming_response': 7 * 24 * 3600,
+    'generate_crop_knowledge': 90 * 24 * 3600,
+    'get_government_scheme_info': 365 * 24 * 3600
+}
+
+# Near-duplicate chat questions reuse answers above this cosine similarity when
+# their crops, quantities and negation match exactly. Calibrated with
+# `python benchmarks.py semantic_threshold`, just above the closest non-duplicate.
+SEMANTIC_CACHE_THRESHOLD = 0.78
+SEMANTIC_CACHE_MAX_ENTRIES = 20000
+
+# Crop photos whose 64-bit perceptual hashes differ by at most this many bits
+# reuse the stored diagnosis
+IMAGE_CACHE_MAX_DISTANCE = 6
+IMAGE_CACHE_MAX_ENTRIES = 100000
+
+# =============================================================================
+# CHAT CONTEXT CONFIGURATION
+# =============================================================================
+# Latest messages sent verbatim; older ones are folded into a rolling summary
+CHAT_CONTEXT_MESSAGES = 6
+CHAT_CONTEXT_TOKEN_BUDGET = 1500
+CHAT_SUMMARY_MAX_TOKENS = 300
+
+# =============================================================================
+# PROMPT BUDGET CONFIGURATION
+# =============================================================================
+# Maximum input tokens per prompt; oversized farmer input is trimmed to fit
+PROMPT_TOKEN_BUDGETS = {
+    'get_farming_response': 2500,
+    'analyze_crop_image': 600,
+    'analyze_crop_images': 700,
+    'generate_crop_knowledge': 200,
+    'get_government_scheme_info': 400,
+    'summarize_conversation': 2500
+}
+
+# =============================================================================
+# BATCH DIAGNOSIS CONFIGURATION
+# =============================================================================
+# Photos a farmer can diagnose at once, and how many share one Gemini request
+DIAGNOSIS_MAX_IMAGES = 10
+DIAGNOSIS_IMAGES_PER_REQUEST = 5
+
+# =============================================================================
+# BACKGROUND JOB CONFIGURATION
+# =============================================================================
+# Long AI tasks run on a persistent worker pool and survive Streamlit reruns
+JOB_QUEUE_PATH = os.path.join(DATA_DIR, "jobs.db")
+JOB_WORKERS = 4
+JOB_RESULT_TTL_SECONDS = 7 * 24 * 3600
+# How long a page waits for a job before telling the farmer to check back
+JOB_WAIT_SECONDS = 120
+
+# =============================================================================
+# AI CASSETTE (RECORD/REPLAY) CONFIGURATION
+# =============================================================================
+# "record" saves every Gemini call to the cassette; "replay" serves them back
+# without the network. Clear ai_cache.db first for runs that must reach the model.
+AI_CASSETTE_MODE = os.getenv("KRISHI_AI_CASSETTE", "off")
+AI_CASSETTE_PATH = os.getenv(
+    "KRISHI_AI_CASSETTE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ai_cassette.jsonl.gz")
+)
+# Fixed replay latency in seconds; unset replays recorded latencies times the scale
+AI_CASSETTE_LATENCY = float(os.getenv("KRISHI_AI_CASSETTE_LATENCY")) if os.getenv("KRISHI_AI_CASSETTE_LATENCY") else None
+AI_CASSETTE_LATENCY_SCALE = float(os.getenv("KRISHI_AI_CASSETTE_LATENCY_SCALE", "1.0"))
+# Fraction of replayed calls that fail with an injected 429
+AI_CASSETTE_429_RATE = float(os.getenv("KRISHI_AI_CASSETTE_429_RATE", "0"))
+AI_CASSETTE_SEED = int(os.getenv("KRISHI_AI_CASSETTE_SEED", "0"))
+
+# =============================================================================
+# LOCAL CPU FALLBACK MODEL CONFIGURATION
+# =============================================================================
+# Path to a small quantized GGUF model (e.g. a 1-3B instruct model at Q4_K_M).
+# Unset, or without llama-cpp-python installed, the app stays cloud-only.
+LOCAL_LLM_MODEL_PATH = os.getenv("KRISHI_LOCAL_LLM_PATH", "")
+# Generations run one at a time by default; threads per generation are capped
+# at half the cores so Streamlit sessions keep a share of the CPU
+LOCAL_LLM_WORKERS = int(os.getenv("KRISHI_LOCAL_LLM_WORKERS", "1"))
+LOCAL_LLM_THREADS = int(os.getenv("KRISHI_LOCAL_LLM_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+LOCAL_LLM_MAX_PENDING = 4
+LOCAL_LLM_CONTEXT_TOKENS = 4096
+LOCAL_LLM_MAX_OUTPUT_TOKENS = 512
+LOCAL_LLM_TIMEOUT_SECONDS = 120
+# With the local model available, requests wait at most this long in the Gemini
+# rate-limit queue before it answers instead of AI_QUEUE_TIMEOUT_SECONDS
+LOCAL_LLM_QUEUE_SECONDS = 15
+
+# =============================================================================
+# PRE-GENERATED KNOWLEDGE CONFIGURATION
+# =============================================================================
+# Written offline by pregenerate_knowledge.py; bump the version to regenerate
+KNOWLEDGE_DB_PATH = os.path.join(DATA_DIR, "knowledge.db")
+CROP_CORPUS_VERSION = 1
+SCHEME_KB_VERSION = 1
 
 # =============================================================================
 # SUPPORTED LANGUAGES
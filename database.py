@@ -3,218 +3,417 @@ Database operations for Krishi Mitra
 Uses SQLite local database
 """
 
+import base64
+import json
+import os
 import sqlite3
+import threading
+
+from config import DATA_DIR
+from migrations import migrate
+
+DB_PATH = os.path.join(DATA_DIR, "krishi_mitra.db")
+
+
+class _Lease:
+    """A thread's hold on a pooled connection; hands it back when the thread ends."""
+
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.conn = conn
+
+    def __del__(self):
+        try:
+            self.pool._release(self.conn)
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """Thread-local SQLite connections, opened and tuned once and then reused.
+
+    Each thread keeps one connection for its lifetime. When the thread ends the
+    connection goes back to an idle list for the next thread, so Streamlit's
+    short-lived script threads skip the connect and PRAGMA setup.
+    """
+
+    def __init__(self, path, max_idle=8, busy_timeout=10.0, cache_size_kb=16384,
+                 mmap_size=128 * 1024 * 1024, cached_statements=256):
+        self.path = path
+        self.max_idle = max_idle
+        self.busy_timeout = busy_timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self.opened = 0
+        self.reused = 0
+        self._idle = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # The timeout is SQLite's busy timeout: writers wait instead of
+        # failing with "database is locked"
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers run alongside the single writer; NORMAL sync is
+        # durable across application crashes and skips an fsync per commit
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{self.cache_size_kb}')
+        conn.execute(f'PRAGMA mmap_size={self.mmap_size}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def connection(self):
+        """This thread's connection."""
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+                self.reused += conn is not None
+            lease = _Lease(self, conn or self._open())
+            self._local.lease = lease
+        return lease.conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def stats(self):
+        with self._lock:
+            return {'opened': self.opened, 'reused': self.reused, 'idle': len(self._idle)}
 
-DB_PATH = "krishi_mitra.db"
+
+_pool = ConnectionPool(DB_PATH)
 
 
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Pooled connection for the calling thread; use `with conn:` to commit, never close it."""
+    return _pool.connection()
+
+
+_migrated = False
+_migrate_lock = threading.Lock()
 
 
 def init_database():
+    """Bring the schema up to date; runs once per process, not per rerun."""
+    global _migrated
+    with _migrate_lock:
+        if not _migrated:
+            migrate(get_db_connection())
+            _migrated = True
+
+
+# --- Keyset Pagination ---
+
+def encode_cursor(timestamp, row_id):
+    """Opaque token for the position after a row."""
+    payload = json.dumps([timestamp, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(payload)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid page cursor") from None
+    return timestamp, int(row_id)
+
+
+def _keyset_page(select, time_column, id_column, limit, cursor, until=None):
+    """One newest-first page of `select` plus the cursor for the next, or None.
+
+    Pages seek on the (time, id) index, so page N costs the same as page 1.
+    With `until` the page instead runs down to and including that cursor's
+    row, however many rows that is, so re-reading a page already shown picks
+    up rows added since without pushing any onto the next page.
+    """
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS community_posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            farmer_name TEXT NOT NULL,
-            content TEXT NOT NULL,
-            image_path TEXT,
-            video_path TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS organic_products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            farmer_name TEXT NOT NULL,
-            product_name TEXT NOT NULL,
-            quantity TEXT NOT NULL,
-            location TEXT NOT NULL,
-            phone_number TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id TEXT,
-            role TEXT,
-            content TEXT,
-            language TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            farmer_name TEXT NOT NULL,
-            mobile_email TEXT UNIQUE NOT NULL,
-            location TEXT,
-            password_hash TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            last_login TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS login_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER REFERENCES users(id),
-            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            ip_address TEXT,
-            device_info TEXT
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+    clauses, params = [], []
+    if cursor:
+        clauses.append(f'({time_column}, {id_column}) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+    if until:
+        clauses.append(f'({time_column}, {id_column}) >= (?, ?)')
+        params.extend(decode_cursor(until))
+    where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+    order = f'ORDER BY {time_column} DESC, {id_column} DESC'
+    if until:
+        rows = conn.execute(f'{select} {where} {order}', params).fetchall()
+        return [dict(row) for row in rows], until
+    rows = conn.execute(f'{select} {where} {order} LIMIT ?', params + [limit + 1]).fetchall()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last[time_column.split('.')[-1]], last[id_column.split('.')[-1]])
+    return items, next_cursor
 
 
 # --- Community Posts ---
 
 def create_post(farmer_name, content, image_path=None, video_path=None):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO community_posts (farmer_name, content, image_path, video_path)
-        VALUES (?, ?, ?, ?)
-    ''', (farmer_name, content, image_path, video_path))
-    conn.commit()
-    post_id = cursor.lastrowid
-    conn.close()
-    return post_id
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO community_posts (farmer_name, content, image_path, video_path)
+            VALUES (?, ?, ?, ?)
+        ''', (farmer_name, content, image_path, video_path))
+    return cursor.lastrowid
 
 
 def get_all_posts(limit=50, offset=0):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    posts = conn.execute('''
         SELECT * FROM community_posts 
         ORDER BY created_at DESC 
         LIMIT ? OFFSET ?
-    ''', (limit, offset))
-    posts = cursor.fetchall()
-    conn.close()
+    ''', (limit, offset)).fetchall()
     return [dict(post) for post in posts]
 
 
+def get_posts_page(limit=20, cursor=None, until=None):
+    """Newest posts first; returns (posts, next_cursor)."""
+    return _keyset_page('SELECT * FROM community_posts', 'created_at', 'id', limit, cursor, until)
+
+
 # --- Organic Products ---
 
 def add_product(farmer_name, product_name, quantity, location, phone_number):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO organic_products (farmer_name, product_name, quantity, location, phone_number)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (farmer_name, product_name, quantity, location, phone_number))
-    conn.commit()
-    product_id = cursor.lastrowid
-    conn.close()
-    return product_id
+    with conn:
+        cursor = conn.execute('''
+            INSERT INTO organic_products (farmer_name, product_name, quantity, location, phone_number)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (farmer_name, product_name, quantity, location, phone_number))
+    return cursor.lastrowid
 
 
 def get_all_products(limit=100):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    products = conn.execute('''
         SELECT * FROM organic_products 
         ORDER BY created_at DESC 
         LIMIT ?
-    ''', (limit,))
-    products = cursor.fetchall()
-    conn.close()
+    ''', (limit,)).fetchall()
     return [dict(product) for product in products]
 
 
-def search_products(search_term):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+def get_products_page(limit=50, cursor=None, until=None):
+    """Newest listings first; returns (products, next_cursor)."""
+    return _keyset_page('SELECT * FROM organic_products', 'created_at', 'id', limit, cursor, until)
+
+
+# bm25 weights for product name, location and farmer name
+PRODUCT_SEARCH_WEIGHTS = (10.0, 4.0, 2.0)
+# Only the newest matches are ranked, so very common words stay cheap
+PRODUCT_SEARCH_CANDIDATES = 2000
+# Share of a misspelt query's trigrams a listing must contain
+FUZZY_MIN_OVERLAP = 0.5
+
+_PRODUCT_SEARCH_SQL = '''
+    SELECT organic_products.* FROM (
+        SELECT rowid AS id, bm25(product_search, {}, {}, {}) AS score
+        FROM product_search WHERE product_search MATCH ?
+        ORDER BY rowid DESC LIMIT {}
+    ) AS matches
+    JOIN organic_products ON organic_products.id = matches.id
+    WHERE {{}}
+    ORDER BY matches.score, organic_products.created_at DESC
+    LIMIT ?
+'''.format(*PRODUCT_SEARCH_WEIGHTS, PRODUCT_SEARCH_CANDIDATES)
+
+
+def _trigrams(text):
+    text = text.lower()
+    return [text[i:i + 3] for i in range(len(text) - 2)]
+
+
+def _fts_quote(text):
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _has_product_search(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_search'"
+    ).fetchone() is not None
+
+
+def _short_term_filter(terms):
+    """WHERE clause and parameters requiring each short term somewhere in a listing."""
+    clauses, params = [], []
+    for term in terms:
+        clauses.append('(organic_products.product_name LIKE ? OR organic_products.location LIKE ? '
+                       'OR organic_products.farmer_name LIKE ?)')
+        params += [f'%{term}%'] * 3
+    return ' AND '.join(clauses) or '1', params
+
+
+def _like_search(conn, search_term, limit):
     search_pattern = f'%{search_term}%'
-    cursor.execute('''
+    products = conn.execute('''
         SELECT * FROM organic_products 
         WHERE product_name LIKE ? OR location LIKE ? OR farmer_name LIKE ?
         ORDER BY created_at DESC
-    ''', (search_pattern, search_pattern, search_pattern))
-    products = cursor.fetchall()
-    conn.close()
+        LIMIT ?
+    ''', (search_pattern, search_pattern, search_pattern, limit)).fetchall()
     return [dict(product) for product in products]
 
 
+def _fuzzy_search(conn, terms, limit, seen, short=()):
+    """Listings sharing most trigrams with every term, for misspelt searches."""
+    clauses = []
+    for term in terms:
+        grams = _trigrams(term)
+        # Adjacent trigram pairs survive a single typo elsewhere in the word
+        pairs = [f"({_fts_quote(a)} AND {_fts_quote(b)})" for a, b in zip(grams, grams[1:])]
+        if not pairs:
+            return []
+        clauses.append('(' + ' OR '.join(pairs) + ')')
+    wanted = set(gram for term in terms for gram in _trigrams(term))
+    where, params = _short_term_filter(short)
+    candidates = conn.execute(_PRODUCT_SEARCH_SQL.format(where),
+                              (' AND '.join(clauses), *params, limit * 5)).fetchall()
+    scored = []
+    for position, product in enumerate(candidates):
+        if product['id'] in seen:
+            continue
+        text = ' '.join((product['product_name'], product['location'], product['farmer_name']))
+        overlap = len(wanted.intersection(_trigrams(text))) / len(wanted)
+        if overlap >= FUZZY_MIN_OVERLAP:
+            scored.append((-overlap, position, dict(product)))
+    return [product for _, _, product in sorted(scored, key=lambda item: item[:2])[:limit]]
+
+
+def search_products(search_term, limit=100):
+    """Products matching the search, best matches first.
+
+    Every word may appear anywhere in the product name, location or farmer
+    name, so prefixes and partial words match; when few listings match
+    exactly, close misspellings of the longer words follow.
+    """
+    return _search_products(get_db_connection(), search_term, limit)
+
+
+def _search_products(conn, search_term, limit=100):
+    terms = [term for term in search_term.split() if len(term) >= 3]
+    # Trigrams cannot index shorter words, so those filter the matches by LIKE
+    short = [term for term in search_term.split() if len(term) < 3]
+    if not terms or not _has_product_search(conn):
+        return _like_search(conn, search_term.strip(), limit)
+    query = ' '.join(_fts_quote(term) for term in terms)
+    where, params = _short_term_filter(short)
+    products = [dict(product) for product in
+                conn.execute(_PRODUCT_SEARCH_SQL.format(where), (query, *params, limit)).fetchall()]
+    if len(products) < limit:
+        products += _fuzzy_search(conn, terms, limit - len(products), {p['id'] for p in products}, short)
+    return products
+
+
 # --- User Management ---
 
 def register_user(farmer_name, mobile_email, location, password_hash=None):
     conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            INSERT OR IGNORE INTO users (farmer_name, mobile_email, location, password_hash)
-            VALUES (?, ?, ?, ?)
-        ''', (farmer_name, mobile_email, location, password_hash))
-        conn.commit()
+        with conn:
+            conn.execute('''
+                INSERT OR IGNORE INTO users (farmer_name, mobile_email, location, password_hash)
+                VALUES (?, ?, ?, ?)
+            ''', (farmer_name, mobile_email, location, password_hash))
         return True
     except Exception as e:
         print(f"Error registering user: {e}")
         return False
-    finally:
-        conn.close()
 
 
 def record_login(mobile_email, ip_address=None, device_info=None):
     conn = get_db_connection()
-    cursor = conn.cursor()
     try:
-        cursor.execute('''
-            UPDATE users SET last_login = CURRENT_TIMESTAMP 
-            WHERE mobile_email = ?
-        ''', (mobile_email,))
-        cursor.execute('SELECT id FROM users WHERE mobile_email = ?', (mobile_email,))
-        user = cursor.fetchone()
-        if user:
-            cursor.execute('''
-                INSERT INTO login_history (user_id, ip_address, device_info)
-                VALUES (?, ?, ?)
-            ''', (user[0], ip_address, device_info))
-        conn.commit()
+        with conn:
+            conn.execute('''
+                UPDATE users SET last_login = CURRENT_TIMESTAMP 
+                WHERE mobile_email = ?
+            ''', (mobile_email,))
+            user = conn.execute('SELECT id FROM users WHERE mobile_email = ?', (mobile_email,)).fetchone()
+            if user:
+                conn.execute('''
+                    INSERT INTO login_history (user_id, ip_address, device_info)
+                    VALUES (?, ?, ?)
+                ''', (user[0], ip_address, device_info))
     except Exception as e:
         print(f"Error recording login: {e}")
-    finally:
-        conn.close()
 
 
 def get_all_users():
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    users = conn.execute('''
         SELECT id, farmer_name, mobile_email, location, created_at, last_login 
         FROM users ORDER BY created_at DESC
-    ''')
-    users = cursor.fetchall()
-    conn.close()
+    ''').fetchall()
     return [dict(user) for user in users]
 
 
+def get_users_page(limit=100, cursor=None):
+    """Newest users first; returns (users, next_cursor)."""
+    return _keyset_page(
+        'SELECT id, farmer_name, mobile_email, location, created_at, last_login FROM users',
+        'created_at', 'id', limit, cursor
+    )
+
+
 def get_login_history(limit=100):
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+    history = conn.execute('''
         SELECT lh.id, u.farmer_name, u.mobile_email, lh.login_time, lh.ip_address
         FROM login_history lh
         JOIN users u ON lh.user_id = u.id
         ORDER BY lh.login_time DESC
         LIMIT ?
-    ''', (limit,))
-    history = cursor.fetchall()
-    conn.close()
+    ''', (limit,)).fetchall()
     return [dict(h) for h in history]
 
 
+def get_login_history_page(limit=100, cursor=None):
+    """Latest logins first; returns (logins, next_cursor)."""
+    return _keyset_page('''
+        SELECT lh.id, u.farmer_name, u.mobile_email, lh.login_time, lh.ip_address
+        FROM login_history lh
+        JOIN users u ON lh.user_id = u.id
+    ''', 'lh.login_time', 'lh.id', limit, cursor)
+
+
+# --- Statistics ---
+
+def get_stats():
+    """Total posts, products and users from the trigger-maintained counters."""
+    conn = get_db_connection()
+    counts = dict(conn.execute(
+        "SELECT counter, value FROM stats_counters WHERE bucket = '' AND counter IN ('posts', 'products', 'users')"
+    ).fetchall())
+    return {counter: counts.get(counter, 0) for counter in ('posts', 'products', 'users')}
+
+
+def get_stats_by_location(counter='products_by_location', limit=10):
+    """Largest locations for 'products_by_location' or 'users_by_location'."""
+    conn = get_db_connection()
+    rows = conn.execute('''
+        SELECT bucket, value FROM stats_counters
+        WHERE counter = ? AND bucket != '' AND value > 0
+        ORDER BY value DESC LIMIT ?
+    ''', (counter, limit)).fetchall()
+    return [(row['bucket'], row['value']) for row in rows]
+
+
 # Initialize database on import
 init_database()
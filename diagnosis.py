@@ -0,0 +1,143 @@
+"""
+Structured crop diagnoses for Krishi Mitra
+Gemini is asked for JSON matching DIAGNOSIS_SCHEMA; answers are validated and
+normalized locally before they are cached or rendered
+"""
+
+import json
+import re
+
+# OpenAPI subset accepted by Gemini's response_schema: no numeric bounds, so
+# those are stated in descriptions and enforced by parse_diagnosis
+DIAGNOSIS_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'crop': {'type': 'string', 'description': 'Crop name'},
+        'health_score': {'type': 'integer', 'description': 'Overall plant health from 0 (dead) to 100 (healthy)'},
+        'health_summary': {'type': 'string', 'description': 'One or two sentences on the plant condition'},
+        'diseases': {
+            'type': 'array',
+            'description': 'Diseases, pests or deficiencies seen; empty if none',
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'name': {'type': 'string'},
+                    'confidence': {'type': 'number', 'description': 'From 0 to 1'},
+                    'symptoms': {'type': 'string', 'description': 'Visible signs in the photo'},
+                },
+                'required': ['name', 'confidence'],
+            },
+        },
+        'treatments': {'type': 'array', 'items': {'type': 'string'}},
+        'care_tips': {'type': 'array', 'items': {'type': 'string'}},
+    },
+    'required': ['crop', 'health_score', 'diseases', 'treatments', 'care_tips'],
+}
+
+DIAGNOSIS_GENERATION_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': DIAGNOSIS_SCHEMA,
+}
+
+# Batch requests get one diagnosis per photo, tagged with its IMAGE marker number
+DIAGNOSES_SCHEMA = {
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'properties': {
+            'image': {'type': 'integer', 'description': 'Number of the IMAGE marker before the photo'},
+            **DIAGNOSIS_SCHEMA['properties'],
+        },
+        'required': ['image', *DIAGNOSIS_SCHEMA['required']],
+    },
+}
+
+DIAGNOSES_GENERATION_CONFIG = {
+    'response_mime_type': 'application/json',
+    'response_schema': DIAGNOSES_SCHEMA,
+}
+
+# Numeric ranges by field name
+BOUNDS = {'health_score': (0, 100), 'confidence': (0.0, 1.0)}
+
+_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$', re.IGNORECASE)
+
+
+def _empty(schema):
+    return {'array': [], 'object': {}, 'string': ''}.get(schema['type'], 0)
+
+
+def _conform(value, schema, name):
+    """Return value normalized to schema, raising ValueError when it does not fit."""
+    kind = schema['type']
+    if kind == 'object':
+        if not isinstance(value, dict):
+            raise ValueError(f"{name}: expected an object")
+        result = {}
+        for key, field in schema['properties'].items():
+            if value.get(key) is not None:
+                result[key] = _conform(value[key], field, key)
+            elif key in schema.get('required', ()):
+                raise ValueError(f"{name}: missing {key}")
+            else:
+                result[key] = _empty(field)
+        return result
+    if kind == 'array':
+        if not isinstance(value, list):
+            raise ValueError(f"{name}: expected a list")
+        items = [_conform(item, schema['items'], name) for item in value]
+        return [item for item in items if item != '']
+    if kind == 'string':
+        if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+            raise ValueError(f"{name}: expected text")
+        return str(value).strip()
+    if isinstance(value, str):
+        value = value.strip().rstrip('%')
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name}: expected a number") from None
+    low, high = BOUNDS.get(name, (number, number))
+    if name == 'confidence' and number > 1:
+        # Percentages slip through despite the schema description
+        number /= 100
+    number = min(max(number, low), high)
+    return round(number) if kind == 'integer' else number
+
+
+def parse_diagnosis(text):
+    """Parse and validate a diagnosis; None when the text is not one."""
+    if not text:
+        return None
+    try:
+        value = json.loads(_FENCE.sub('', text.strip()))
+        return _conform(value, DIAGNOSIS_SCHEMA, 'diagnosis')
+    except ValueError:
+        return None
+
+
+def parse_diagnoses(text, count):
+    """Validated diagnoses of a batch answer by photo; missing or malformed ones are None."""
+    diagnoses = [None] * count
+    try:
+        items = json.loads(_FENCE.sub('', (text or '').strip()))
+    except ValueError:
+        return diagnoses
+    if not isinstance(items, list):
+        return diagnoses
+    for position, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get('image', position + 1))
+            diagnosis = _conform(item, DIAGNOSIS_SCHEMA, 'diagnosis')
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= count and diagnoses[number - 1] is None:
+            diagnoses[number - 1] = diagnosis
+    return diagnoses
+
+
+def dump_diagnosis(diagnosis):
+    """Compact JSON for caching and for handing to the UI."""
+    return json.dumps(diagnosis, ensure_ascii=False, separators=(',', ':'))
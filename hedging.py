@@ -0,0 +1,88 @@
+"""
+Hedged request policy for Krishi Mitra AI calls
+Decides when to fire a backup request and accounts for what hedging costs
+"""
+
+import threading
+import time
+from collections import deque
+
+
+class HedgePolicy:
+    """Per-minute hedge budget plus cost/benefit counters."""
+
+    def __init__(self, enabled=False, percentile=90, min_delay=1.0, max_per_minute=10):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_per_minute = max_per_minute
+        self._fired_at = deque()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.skipped_budget = 0
+        self.skipped_rate_limit = 0
+        self.extra_calls = 0
+        self.latency_saved = 0.0
+
+    def hedge_delay(self, router, model_name):
+        """Seconds to wait on the primary before hedging."""
+        observed = router.stats[model_name].latency_percentile(self.percentile)
+        return max(self.min_delay, observed or 0.0)
+
+    def try_acquire(self):
+        """Reserve one hedge from the per-minute budget.
+
+        Returns the reservation, or None. Pass it to `fired` once the backup is
+        sent, or to `release` when the rate limiter refuses it.
+        """
+        now = time.monotonic()
+        with self._lock:
+            while self._fired_at and now - self._fired_at[0] > 60:
+                self._fired_at.popleft()
+            if len(self._fired_at) >= self.max_per_minute:
+                self.skipped_budget += 1
+                return None
+            self._fired_at.append(now)
+            return now
+
+    def release(self, reservation):
+        """Return an unused reservation to the budget."""
+        with self._lock:
+            try:
+                self._fired_at.remove(reservation)
+            except ValueError:
+                pass  # Already aged out of the window
+            self.skipped_rate_limit += 1
+
+    def fired(self):
+        """Count a backup request that was actually sent."""
+        with self._lock:
+            self.hedges_fired += 1
+            self.extra_calls += 1
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_hedge_win(self):
+        with self._lock:
+            self.hedges_won += 1
+
+    def record_latency_saved(self, seconds):
+        with self._lock:
+            self.latency_saved += max(0.0, seconds)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'requests': self.requests,
+                'hedges_fired': self.hedges_fired,
+                'hedges_won': self.hedges_won,
+                'skipped_budget': self.skipped_budget,
+                'skipped_rate_limit': self.skipped_rate_limit,
+                'extra_quota_calls': self.extra_calls,
+                'latency_saved_seconds': round(self.latency_saved, 3),
+            }
@@ -0,0 +1,185 @@
+"""
+Perceptual-hash cache for Krishi Mitra crop image diagnoses
+Near-duplicate photos (retakes, WhatsApp forwards) reuse a stored report
+"""
+
+import itertools
+import sqlite3
+import threading
+import time
+
+from ai_cache import normalize_query
+
+HASH_BITS = 64
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _to_signed(value):
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+class MultiIndexHash:
+    """Multi-index hashing over 64-bit hashes for Hamming-radius search.
+
+    The hash is split into `chunks` substrings. Two hashes within distance r
+    agree to within r // chunks bits on at least one substring, so only
+    buckets near the query's substrings need to be checked.
+    """
+
+    def __init__(self, chunks=4):
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.mask = (1 << self.chunk_bits) - 1
+        self.tables = [{} for _ in range(chunks)]
+        self.hashes = {}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def _parts(self, value):
+        return [(value >> (i * self.chunk_bits)) & self.mask for i in range(self.chunks)]
+
+    def add(self, entry_id, value):
+        self.hashes[entry_id] = value
+        for table, part in zip(self.tables, self._parts(value)):
+            table.setdefault(part, []).append(entry_id)
+
+    def remove(self, entry_id):
+        value = self.hashes.pop(entry_id, None)
+        if value is None:
+            return
+        for table, part in zip(self.tables, self._parts(value)):
+            bucket = table.get(part)
+            if bucket:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del table[part]
+
+    def _neighbours(self, part, radius):
+        yield part
+        for r in range(1, radius + 1):
+            for bits in itertools.combinations(range(self.chunk_bits), r):
+                flipped = part
+                for bit in bits:
+                    flipped ^= 1 << bit
+                yield flipped
+
+    def search(self, value, max_distance):
+        """Return (entry_id, distance) of the nearest hash within max_distance."""
+        best = None
+        seen = set()
+        sub_radius = max_distance // self.chunks
+        for table, part in zip(self.tables, self._parts(value)):
+            for probe in self._neighbours(part, sub_radius):
+                for entry_id in table.get(probe, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    distance = hamming(value, self.hashes[entry_id])
+                    if distance <= max_distance and (best is None or distance < best[1]):
+                        best = (entry_id, distance)
+                        if distance == 0:
+                            return best
+        return best
+
+
+class ImageDiagnosisCache:
+    """Stores diagnoses keyed by perceptual hash, language and farmer context."""
+
+    def __init__(self, db_path, max_distance=6, max_entries=100000):
+        self.db_path = db_path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.indexes = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+        self._load()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS image_diagnoses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    image_hash INTEGER NOT NULL,
+                    language TEXT NOT NULL,
+                    context TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            self._conn.commit()
+
+    def _index(self, language, context):
+        key = (language, context)
+        if key not in self.indexes:
+            self.indexes[key] = MultiIndexHash()
+        return self.indexes[key]
+
+    def _load(self):
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT id, image_hash, language, context FROM image_diagnoses'
+            ).fetchall()
+            for entry_id, image_hash, language, context in rows:
+                self._index(language, context).add(entry_id, _to_unsigned(image_hash))
+
+    def lookup(self, image_hash, language, farmer_query=""):
+        """Return a stored report for a near-duplicate image, or None."""
+        context = normalize_query(farmer_query)
+        with self._lock:
+            match = self._index(language, context).search(image_hash, self.max_distance)
+            if match is None:
+                self.misses += 1
+                return None
+            row = self._conn.execute(
+                'SELECT response FROM image_diagnoses WHERE id = ?', (match[0],)
+            ).fetchone()
+            if row is None:
+                self._index(language, context).remove(match[0])
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def add(self, image_hash, language, farmer_query, response):
+        context = normalize_query(farmer_query)
+        with self._lock:
+            cursor = self._conn.execute('''
+                INSERT INTO image_diagnoses (image_hash, language, context, response, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (_to_signed(image_hash), language, context, response, time.time()))
+            self._index(language, context).add(cursor.lastrowid, image_hash)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COUNT(*) FROM image_diagnoses').fetchone()[0]
+        excess = total - self.max_entries
+        if excess <= 0:
+            return
+        victims = self._conn.execute(
+            'SELECT id, language, context FROM image_diagnoses ORDER BY id ASC LIMIT ?', (excess,)
+        ).fetchall()
+        for entry_id, language, context in victims:
+            self._index(language, context).remove(entry_id)
+        self._conn.executemany('DELETE FROM image_diagnoses WHERE id = ?',
+                               [(victim[0],) for victim in victims])
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': sum(len(index) for index in self.indexes.values()),
+                'max_distance': self.max_distance,
+            }
@@ -0,0 +1,212 @@
+"""
+Persistent background job queue for Krishi Mitra AI tasks
+Jobs run on a worker pool outside the Streamlit script thread, so reruns and
+page switches never throw away a half-finished answer. Identical jobs share
+one ID and one stored result.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from ai_cache import normalize_query
+from rate_limiter import current_session
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def job_id(method, args):
+    """Stable ID for a call, so identical submissions deduplicate."""
+    normalized = [normalize_query(arg) if isinstance(arg, str) else arg for arg in args]
+    payload = json.dumps([method, normalized], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class JobQueue:
+    """SQLite-backed job queue with a pool of daemon worker threads.
+
+    `runner(method, args)` does the work and returns text or an iterator of
+    text chunks; partial output of iterators is saved as it arrives so pages
+    can show progress, and `join(chunks)` makes the final result. Results for
+    which `is_error(result)` holds are stored as failures and retried on the
+    next submission; results failing `cacheable(result)` are shown but stored
+    already expired, so the next submission runs the job again.
+    """
+
+    def __init__(self, db_path, runner, workers=4, result_ttl=7 * 24 * 3600,
+                 is_error=None, cacheable=None, join=''.join, progress_interval=0.5):
+        self.db_path = db_path
+        self.runner = runner
+        self.workers = workers
+        self.result_ttl = result_ttl
+        self.is_error = is_error or (lambda result: False)
+        self.cacheable = cacheable or (lambda result: True)
+        self.join = join
+        self.progress_interval = progress_interval
+        self.submitted = 0
+        self.deduplicated = 0
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+        self._threads = []
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_jobs (
+                    id TEXT PRIMARY KEY,
+                    method TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    session TEXT,
+                    status TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_ai_jobs_status ON ai_jobs (status, created_at)'
+            )
+            # Jobs a previous process was running when it stopped start over
+            self._conn.execute('UPDATE ai_jobs SET status = ? WHERE status = ?', (PENDING, RUNNING))
+            self._conn.execute('DELETE FROM ai_jobs WHERE updated_at < ?',
+                               (time.time() - self.result_ttl,))
+            self._conn.commit()
+
+    def start(self):
+        """Start the worker threads; safe to call more than once."""
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name=f"ai-job-worker-{len(self._threads)}")
+                thread.start()
+                self._threads.append(thread)
+        return self
+
+    def submit(self, method, *args):
+        """Queue a call and return its job ID; finished or running twins are reused."""
+        key = job_id(method, args)
+        now = time.time()
+        with self._lock:
+            self.submitted += 1
+            cursor = self._conn.execute('''
+                INSERT OR IGNORE INTO ai_jobs (id, method, args, session, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (key, method, json.dumps(list(args), ensure_ascii=False), current_session.get(),
+                  PENDING, now, now))
+            if cursor.rowcount == 0:
+                # Failed or expired results are retried; anything else is shared
+                cursor = self._conn.execute('''
+                    UPDATE ai_jobs SET status = ?, result = NULL, error = NULL,
+                        session = ?, created_at = ?, updated_at = ?
+                    WHERE id = ? AND (status = ? OR (status = ? AND updated_at < ?))
+                ''', (PENDING, current_session.get(), now, now, key, FAILED, DONE, now - self.result_ttl))
+                if cursor.rowcount == 0:
+                    self.deduplicated += 1
+            self._conn.commit()
+            self._changed.notify_all()
+        return key
+
+    def get(self, key):
+        """Return the job as a dict, or None if unknown."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT id, method, status, result, error, updated_at FROM ai_jobs WHERE id = ?', (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('id', 'method', 'status', 'result', 'error', 'updated_at'), row))
+
+    def wait(self, key, timeout=None, on_update=None):
+        """Block until the job finishes or the timeout passes; returns the latest job.
+
+        `on_update(job)` is called whenever the job's stored state changes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        last_update = None
+        while True:
+            job = self.get(key)
+            if job is None or job['status'] in (DONE, FAILED):
+                return job
+            if on_update and job['updated_at'] != last_update:
+                last_update = job['updated_at']
+                on_update(job)
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return job
+            with self._lock:
+                self._changed.wait(self.progress_interval if remaining is None
+                                   else min(self.progress_interval, remaining))
+
+    def _claim(self):
+        with self._lock:
+            while True:
+                row = self._conn.execute('''
+                    SELECT id, method, args, session FROM ai_jobs
+                    WHERE status = ? ORDER BY created_at LIMIT 1
+                ''', (PENDING,)).fetchone()
+                if row is None:
+                    self._changed.wait()
+                    continue
+                cursor = self._conn.execute(
+                    'UPDATE ai_jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?',
+                    (RUNNING, time.time(), row[0], PENDING)
+                )
+                self._conn.commit()
+                if cursor.rowcount:
+                    return row
+
+    def _update(self, key, status, result=None, error=None, expired=False):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE ai_jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?',
+                (status, result, error, 0 if expired else time.time(), key)
+            )
+            self._conn.commit()
+            self._changed.notify_all()
+
+    def _work(self):
+        while True:
+            key, method, args, session = self._claim()
+            token = current_session.set(session)
+            try:
+                self._run(key, method, json.loads(args))
+            except Exception as e:
+                self._update(key, FAILED, error=str(e))
+            finally:
+                current_session.reset(token)
+
+    def _run(self, key, method, args):
+        result = self.runner(method, args)
+        if not isinstance(result, str):
+            chunks = []
+            last_saved = time.monotonic()
+            for chunk in result:
+                chunks.append(chunk)
+                if time.monotonic() - last_saved >= self.progress_interval:
+                    self._update(key, RUNNING, result=''.join(chunks))
+                    last_saved = time.monotonic()
+            result = self.join(chunks)
+        if self.is_error(result):
+            self._update(key, FAILED, error=result)
+        else:
+            self._update(key, DONE, result=result, expired=not self.cacheable(result))
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._conn.execute(
+                'SELECT status, COUNT(*) FROM ai_jobs GROUP BY status'
+            ).fetchall())
+        return {
+            'submitted': self.submitted,
+            'deduplicated': self.deduplicated,
+            'workers': len(self._threads),
+            **{status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)},
+        }
@@ -0,0 +1,79 @@
+"""
+Versioned local knowledge store for Krishi Mitra
+Holds pre-generated documents (crop knowledge, schemes) so pages can serve
+them instantly without spending live AI quota
+"""
+
+import sqlite3
+import threading
+import time
+
+from ai_cache import normalize_query
+
+
+class KnowledgeStore:
+    """SQLite store of documents keyed by (kind, key, language, version)."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS knowledge_documents (
+                    kind TEXT NOT NULL,
+                    doc_key TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    version INTEGER NOT NULL,
+                    title TEXT,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (kind, doc_key, language, version)
+                )
+            ''')
+            self._conn.commit()
+
+    def get(self, kind, key, language, version):
+        """Return the stored document content, or None."""
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT content FROM knowledge_documents
+                WHERE kind = ? AND doc_key = ? AND language = ? AND version = ?
+            ''', (kind, normalize_query(key), language, version)).fetchone()
+        return row[0] if row else None
+
+    def put(self, kind, key, language, version, content, title=None):
+        """Store a document and commit immediately so batch jobs can resume."""
+        with self._lock:
+            self._conn.execute('''
+                INSERT OR REPLACE INTO knowledge_documents
+                (kind, doc_key, language, version, title, content, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (kind, normalize_query(key), language, version, title or key, content, time.time()))
+            self._conn.commit()
+
+    def has(self, kind, key, language, version):
+        return self.get(kind, key, language, version) is not None
+
+    def list_titles(self, kind, language, version):
+        """Titles of all documents of a kind available in a language."""
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT title FROM knowledge_documents
+                WHERE kind = ? AND language = ? AND version = ?
+                ORDER BY title
+            ''', (kind, language, version)).fetchall()
+        return [row[0] for row in rows]
+
+    def prune(self, kind, keep_version):
+        """Delete documents of a kind from every version except keep_version."""
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM knowledge_documents WHERE kind = ? AND version != ?',
+                (kind, keep_version)
+            )
+            self._conn.commit()
+            return cursor.rowcount
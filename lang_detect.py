@@ -0,0 +1,323 @@
+"""
+Offline language detection for Krishi Mitra
+Identifies the seven supported languages from Unicode scripts and
+a compact character n-gram model, without any network call
+"""
+
+import math
+import re
+from collections import Counter
+
+# Unicode block -> language (Devanagari is resolved further below)
+SCRIPT_RANGES = [
+    (0x0900, 0x097F, 'deva'),
+    (0x0A80, 0x0AFF, 'gu'),
+    (0x0B80, 0x0BFF, 'ta'),
+    (0x0C00, 0x0C7F, 'te'),
+    (0x0C80, 0x0CFF, 'kn'),
+]
+
+NGRAM_SIZES = (1, 2, 3)
+# Add-k smoothing for n-grams a language's training text never showed
+SMOOTHING = 0.1
+# Scales the mean per-n-gram log-likelihood gap into a confidence
+SHARPNESS = 4.0
+
+# Training text per script: the same farming questions written by farmers of
+# each language. Benchmarks measure accuracy on different, held-out sentences.
+TRAINING_TEXT = {
+    'deva': {
+        'hi': [
+            "गेहूं की बुवाई का सही समय क्या है",
+            "मेरे खेत में पानी की कमी है",
+            "धान की फसल में कीड़े लग गए हैं, क्या करूं",
+            "टमाटर के पत्ते मुड़ रहे हैं",
+            "किसान भाई जैविक खाद का उपयोग करें",
+            "सरकार ने किसानों के लिए नई योजना शुरू की है",
+            "बारिश के बाद खेत की जुताई करनी चाहिए",
+            "इस साल कपास का भाव अच्छा मिला",
+            "मुझे ड्रिप सिंचाई के बारे में जानकारी चाहिए",
+            "मिट्टी की जांच कहां करवाएं",
+            "सोयाबीन में पीला मोज़ेक रोग से कैसे बचें",
+            "आलू की खेती में कितना खर्च आता है",
+            "हमारे गांव में बिजली नहीं रहती",
+            "फसल बीमा का पैसा कब मिलेगा",
+            "प्याज को लंबे समय तक कैसे रखें",
+            "गाय के गोबर से खाद बनाना सीखें",
+            "यह दवा कितनी मात्रा में छिड़कनी है",
+            "बीज बोने से पहले उपचार जरूर करें",
+            "मंडी में आज गेहूं का क्या भाव है",
+            "पौधों को सुबह या शाम पानी दें",
+        ],
+        'mr': [
+            "गव्हाची पेरणी कधी करावी",
+            "माझ्या शेतात पाण्याची कमतरता आहे",
+            "भाताच्या पिकावर किडींचा प्रादुर्भाव झाला आहे, काय करू",
+            "टोमॅटोची पाने गुंडाळली जात आहेत",
+            "शेतकरी बांधवांनी सेंद्रिय खताचा वापर करावा",
+            "सरकारने शेतकऱ्यांसाठी नवीन योजना सुरू केली आहे",
+            "पावसानंतर शेताची नांगरणी करावी",
+            "यंदा कापसाला चांगला भाव मिळाला",
+            "मला ठिबक सिंचनाबद्दल माहिती हवी आहे",
+            "मातीची तपासणी कुठे करावी",
+            "सोयाबीनवरील पिवळा मोझॅक रोग कसा टाळावा",
+            "बटाट्याच्या शेतीला किती खर्च येतो",
+            "आमच्या गावात वीज नसते",
+            "पीक विम्याचे पैसे कधी मिळतील",
+            "कांदा जास्त दिवस कसा साठवावा",
+            "शेणापासून खत कसे बनवायचे ते शिका",
+            "हे औषध किती प्रमाणात फवारायचे आहे",
+            "बियाणे पेरण्यापूर्वी बीजप्रक्रिया नक्की करा",
+            "बाजारात आज गव्हाचा दर काय आहे",
+            "झाडांना सकाळी किंवा संध्याकाळी पाणी द्या",
+        ],
+    },
+    'latin': {
+        'en': [
+            "What is the right time to sow wheat",
+            "There is not enough water in my field",
+            "Insects have attacked my paddy crop, what should I do",
+            "The tomato leaves are curling up",
+            "Farmers should use organic manure",
+            "The government has started a new scheme for farmers",
+            "Plough the field after the rains",
+            "Cotton fetched a good price this year",
+            "I need information about drip irrigation",
+            "Where can I get my soil tested",
+            "How to prevent yellow mosaic disease in soybean",
+            "How much does potato farming cost",
+            "Our village does not get electricity",
+            "When will the crop insurance money arrive",
+            "How to store onions for a long time",
+            "Learn to make compost from cow dung",
+            "How much of this pesticide should be sprayed",
+            "Always treat the seeds before sowing",
+            "What is the price of wheat in the market today",
+            "Water the plants in the morning or evening",
+        ],
+        'hi': [
+            "gehun ki buvai ka sahi samay kya hai",
+            "mere khet mein pani ki kami hai",
+            "dhan ki fasal mein keede lag gaye hain kya karun",
+            "tamatar ke patte mud rahe hain",
+            "kisan bhai jaivik khad ka upyog karen",
+            "sarkar ne kisanon ke liye nayi yojana shuru ki hai",
+            "barish ke baad khet ki jutai karni chahiye",
+            "is saal kapas ka bhav achha mila",
+            "mujhe drip sinchai ke bare mein jankari chahiye",
+            "mitti ki janch kahan karwayen",
+            "soybean mein peela mosaic rog se kaise bachen",
+            "aloo ki kheti mein kitna kharcha aata hai",
+            "hamare gaon mein bijli nahi rehti",
+            "fasal bima ka paisa kab milega",
+            "pyaz ko lambe samay tak kaise rakhen",
+            "gobar se khad banana seekhen",
+            "yeh dawa kitni matra mein chhidakni hai",
+            "beej bone se pehle upchar zaroor karen",
+            "mandi mein aaj gehun ka kya bhav hai",
+            "paudhon ko subah ya shaam pani den",
+        ],
+        'mr': [
+            "gavhachi perni kadhi karavi",
+            "majhya shetat panyachi kamtarta aahe",
+            "bhatachya pikavar kidicha pradurbhav jhala aahe kay karu",
+            "tomatochi pane gundalli jat aahet",
+            "shetkari bandhavanni sendriya khatacha vapar karava",
+            "sarkarne shetkaryansathi navin yojana suru keli aahe",
+            "pavsanantar shetachi nangarni karavi",
+            "yanda kapsala changla bhav milala",
+            "mala thibak sinchanabaddal mahiti havi aahe",
+            "matichi tapasni kuthe karavi",
+            "soybeanvaril pivla mosaic rog kasa talava",
+            "batatyachya shetila kiti kharch yeto",
+            "amchya gavat vij naste",
+            "pik vimyache paise kadhi miltil",
+            "kanda jast divas kasa sathvava",
+            "shenapasun khat kase banvayche te shika",
+            "he aushadh kiti pramanat favarayche aahe",
+            "biyane pernyapurvi bijprakriya nakki kara",
+            "bajarat aaj gavhacha dar kay aahe",
+            "jhadanna sakali kinva sandhyakali pani dya",
+        ],
+        'gu': [
+            "ghau ni vavni no sacho samay kyo chhe",
+            "mara khetar ma pani ni achhat chhe",
+            "dangar na pak ma jivat padi gai chhe shu karu",
+            "tameta na pan vadi rahya chhe",
+            "khedut bhaio e organic khatar no upyog karvo joie",
+            "sarkare khedut mate navi yojana sharu kari chhe",
+            "varsad pachhi khetar ma khed karvi joie",
+            "aa varshe kapas no saro bhav malyo",
+            "mane tapak sinchai vishe mahiti joie chhe",
+            "mati ni chakasni kya karavvi",
+            "soyabean ma pilo mosaic rog thi kevi rite bachvu",
+            "bataka ni kheti ma ketlo kharch thay chhe",
+            "amara gam ma vijli nathi rehti",
+            "pak vima na paisa kyare malse",
+            "dungli ne lamba samay sudhi kevi rite sachvavi",
+            "chhan mathi khatar banavta shikho",
+            "aa dava ketla pramanma chhantavani chhe",
+            "biyaran vavta pehla mavjat jarur karo",
+            "bajar ma aaje ghau no bhav shu chhe",
+            "chhod ne savare athva sanje pani aapo",
+        ],
+        'ta': [
+            "godhumai vithaikka sariyana neram enna",
+            "en vayalil thanneer pattakkurai ullathu",
+            "nel payiril poochigal thakkiyullana naan enna seiya vendum",
+            "thakkali ilaigal surundu varugindrana",
+            "vivasayigal iyarkai uram payanpaduththa vendum",
+            "arasu vivasayigalukku puthiya thittam thodangiyullathu",
+            "mazhaikku piragu vayalai uzhavu seiya vendum",
+            "indha varudam paruthikku nalla vilai kidaiththathu",
+            "enakku sottu neer pasanam patri thagaval vendum",
+            "mann parisothanai engu seiyalam",
+            "soyabeanil manjal mosaic noyai eppadi thadukkalam",
+            "urulaikizhangu sagupadikku evvalavu selavagum",
+            "engal gramathil minsaram illai",
+            "payir kaapeettu panam eppodhu kidaikkum",
+            "vengayaththai neenda naal eppadi semikkalam",
+            "maatu saanathil irundhu uram thayarikka kattrukkollungal",
+            "indha marundhai evvalavu alavil thelikka vendum",
+            "vithaippatharku munbu vithai nerththi seiyungal",
+            "indru sandhaiyil godhumai vilai enna",
+            "chedigalukku kaalai allathu maalai thanneer oottrungal",
+        ],
+        'te': [
+            "godhuma vittanalu veyadaniki sariyaina samayam enti",
+            "naa polamlo neeti korata undi",
+            "vari pantaku purugulu pattayi nenu emi cheyali",
+            "tomato akulu mudatha padutunnayi",
+            "raitulu sendriya eruvulu vadali",
+            "prabhutvam raitula kosam kotha pathakam prarambhinchindi",
+            "varshala tarvata polanni dunnali",
+            "ee samvatsaram pattiki manchi dhara vachindi",
+            "naaku drip neetipaarudala gurinchi samacharam kavali",
+            "matti pariksha ekkada cheyinchukovali",
+            "soybean lo pasupu mosaic tegulunu ela nivarinchali",
+            "bangaladumpa sagu ki entha kharchu avutundi",
+            "maa oorilo karent undadu",
+            "panta bheema dabbulu eppudu vastayi",
+            "ullipayalanu ekkuva kalam ela nilva cheyali",
+            "pedatho eruvu tayaru cheyadam nerchukondi",
+            "ee mandu entha motham lo pichikari cheyali",
+            "vittanalu vese mundu vittana shuddhi tappakunda cheyandi",
+            "eeroju market lo godhuma dhara enti",
+            "mokkalaku udayam leda sayantram neellu pettandi",
+        ],
+        'kn': [
+            "godhi bittane maadalu sariyaada samaya yavudu",
+            "nanna hola dalli neerina korate ide",
+            "bhatta beleyalli keetagalu bandive naanu enu maadali",
+            "tomato ele muduri kolluttive",
+            "raitaru saavayava gobbara balasabeku",
+            "sarkara raitarigagi hosa yojane prarambhiside",
+            "maleya nantara hola ulume maadabeku",
+            "ee varsha hattige olle bele sikkitu",
+            "nanage hani neeravari bagge maahiti beku",
+            "mannu pareekshe elli maadisabeku",
+            "soybean nalli haladi mosaic rogavannu hege tadeyuvudu",
+            "aalugadde krishige eshtu kharchu aaguttade",
+            "namma ooralli vidyut irodilla",
+            "bele vime hana yavaga baruttade",
+            "eerulli yannu dheerga kaala hege sangrahisuvudu",
+            "saganiyinda gobbara maaduvudannu kaliyiri",
+            "ee aushadhavannu eshtu pramanadalli sinchisabeku",
+            "bittuvudakke munche beejopachara maadi",
+            "indu marukatteyalli godhi bele eshtu",
+            "gidagalige beligge athava sanje neeru haaki",
+        ],
+    },
+}
+
+# Letters of each script group; everything else separates words
+LETTERS = {
+    'deva': re.compile(r'[ऀ-ॣॱ-ॿ]+'),
+    'latin': re.compile(r'[a-z]+'),
+}
+
+
+def _ngrams(text, script):
+    """Character n-grams of each word, padded so word edges count."""
+    grams = []
+    for word in LETTERS[script].findall(text.lower()):
+        padded = f' {word} '
+        for n in NGRAM_SIZES:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+class NgramModel:
+    """Multinomial naive Bayes over character n-grams, one profile per language."""
+
+    def __init__(self, script, samples):
+        self.script = script
+        self.counts = {lang: Counter(g for text in texts for g in _ngrams(text, script))
+                       for lang, texts in samples.items()}
+        vocabulary = set().union(*self.counts.values())
+        self.log_probs = {}
+        self.log_unseen = {}
+        for lang, counts in self.counts.items():
+            denominator = sum(counts.values()) + SMOOTHING * (len(vocabulary) + 1)
+            self.log_probs[lang] = {g: math.log((c + SMOOTHING) / denominator) for g, c in counts.items()}
+            self.log_unseen[lang] = math.log(SMOOTHING / denominator)
+
+    def scores(self, text):
+        """Mean log-likelihood per n-gram for each language, or None for no letters."""
+        grams = _ngrams(text, self.script)
+        if not grams:
+            return None
+        return {
+            lang: sum(probs.get(g, self.log_unseen[lang]) for g in grams) / len(grams)
+            for lang, probs in self.log_probs.items()
+        }
+
+    def classify(self, text):
+        """Return (language, confidence), or (None, 0.0) for no letters."""
+        scores = self.scores(text)
+        if scores is None:
+            return None, 0.0
+        best = max(scores, key=scores.get)
+        weights = {lang: math.exp(SHARPNESS * (score - scores[best])) for lang, score in scores.items()}
+        return best, 1.0 / sum(weights.values())
+
+
+MODELS = {script: NgramModel(script, samples) for script, samples in TRAINING_TEXT.items()}
+
+
+def _script_counts(text):
+    counts = {}
+    latin = 0
+    for ch in text:
+        code = ord(ch)
+        if code < 0x80:
+            if ch.isalpha():
+                latin += 1
+            continue
+        for start, end, script in SCRIPT_RANGES:
+            if start <= code <= end:
+                counts[script] = counts.get(script, 0) + 1
+                break
+    return counts, latin
+
+
+def detect(text):
+    """Return (language code, confidence between 0 and 1) for text."""
+    text = str(text or '')
+    counts, latin = _script_counts(text)
+    if counts:
+        script = max(counts, key=counts.get)
+        script_share = counts[script] / (sum(counts.values()) + latin)
+        if script == 'deva':
+            lang, confidence = MODELS['deva'].classify(text)
+            return lang, confidence * script_share
+        return script, script_share
+    if latin:
+        return MODELS['latin'].classify(text)
+    return 'en', 0.0
+
+
+def detect_language(text, default='en'):
+    """Return the ISO 639-1 code of text, or default for empty input."""
+    lang, confidence = detect(text)
+    return lang if confidence > 0 else default
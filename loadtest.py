@@ -0,0 +1,444 @@
+"""
+Load test for Krishi Mitra
+Run: python loadtest.py --sessions 20 --concurrency 10 --latency 1.5 --quota-rate 0.05
+
+Starts a local stand-in for the Gemini generateContent API and drives
+simulated farmer sessions through app.py with Streamlit's AppTest: register,
+login, chat, crop diagnosis, community and products. Each concurrent
+session runs in its own worker process, because AppTest swaps process-wide
+Streamlit state on every run. Reports throughput, per-step latency percentiles
+and memory per session. All databases and caches go to a temporary directory,
+so real data is never touched.
+"""
+
+import argparse
+import gc
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+IMAGE_MARKER = re.compile(r'=== IMAGE (\d+) ===')
+QUOTA_ERROR = {
+    'error': {
+        'code': 429,
+        'message': 'Resource has been exhausted (e.g. check quota).',
+        'status': 'RESOURCE_EXHAUSTED',
+    }
+}
+
+SAMPLE_DIAGNOSIS = {
+    'crop': 'Tomato',
+    'health_score': 62,
+    'health_summary': 'Simulated diagnosis from the load-test stand-in.',
+    'diseases': [{'name': 'Early blight', 'confidence': 0.8, 'symptoms': 'Brown rings on lower leaves'}],
+    'treatments': ['Remove infected leaves', 'Spray mancozeb every 10 days'],
+    'care_tips': ['Water at the base of the plant'],
+}
+
+# Sidebar page order and English labels from main_app
+PAGE_CHAT, PAGE_DIAGNOSIS, PAGE_COMMUNITY, PAGE_PRODUCTS = 1, 2, 4, 6
+LABELS = {
+    'register': 'Create Account →',
+    'login': 'Sign In →',
+    'analyze': '🔍 Analyze Crop',
+    'post_content': 'Share your experience or question',
+    'post': 'Post to Community',
+    'product_name': 'Product Name',
+    'quantity': 'Quantity',
+    'list': 'List Product',
+    'search': '🔍 Search',
+}
+
+QUESTIONS = [
+    "How much water does sugarcane need in summer?",
+    "Which fertilizer is best for rice at tillering stage?",
+    "My wheat leaves are turning yellow, what should I do?",
+    "When is the right time to sow soybean?",
+    "How do I control aphids on mustard organically?",
+    "What spacing should I use for cotton?",
+]
+
+
+class GeminiStandIn:
+    """Local HTTP server emulating generateContent and streamGenerateContent."""
+
+    def __init__(self, latency=1.0, jitter=0.3, quota_error_rate=0.0,
+                 stream_chunks=4, response_chars=1200, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.quota_error_rate = quota_error_rate
+        self.stream_chunks = stream_chunks
+        self.response_chars = response_chars
+        self.requests = 0
+        self.streamed = 0
+        self.quota_errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True, name="gemini-stand-in").start()
+        return self
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = self.streamed = self.quota_errors = 0
+
+    def stop(self):
+        self._server.shutdown()
+
+    def _draw(self):
+        """Return (delay, fail) for one request."""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self._random.gauss(self.latency, self.jitter))
+            fail = self._random.random() < self.quota_error_rate
+            if fail:
+                self.quota_errors += 1
+            return delay, fail
+
+    def answer(self, request):
+        """Plausible answer text; batch diagnosis requests get one diagnosis per image."""
+        texts = [part['text'] for content in request.get('contents', [])
+                 for part in content.get('parts', []) if 'text' in part]
+        if request.get('generationConfig', {}).get('responseMimeType') == 'application/json':
+            numbers = [int(n) for text in texts for n in IMAGE_MARKER.findall(text)]
+            if numbers:
+                return json.dumps([{'image': n, **SAMPLE_DIAGNOSIS} for n in sorted(set(numbers))])
+            return json.dumps(SAMPLE_DIAGNOSIS)
+        prompt = ' '.join(texts).split()
+        filler = "Simulated advice from the load-test stand-in. "
+        body = ' '.join(prompt[-12:]) + ' ' + filler * (self.response_chars // len(filler) + 1)
+        return body[:self.response_chars]
+
+    @staticmethod
+    def _candidate(text):
+        return {'candidates': [{'content': {'parts': [{'text': text}], 'role': 'model'},
+                                'finishReason': 'STOP', 'index': 0}]}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                delay, fail = stand_in._draw()
+                if fail:
+                    time.sleep(delay / 4)
+                    self._send_json(429, QUOTA_ERROR)
+                    return
+                text = stand_in.answer(request)
+                if ':streamGenerateContent' not in self.path:
+                    time.sleep(delay)
+                    self._send_json(200, stand_in._candidate(text))
+                    return
+
+                # Streamed responses arrive as one JSON array, written piece by piece
+                with stand_in._lock:
+                    stand_in.streamed += 1
+                size = max(1, len(text) // stand_in.stream_chunks + 1)
+                pieces = [text[i:i + size] for i in range(0, len(text), size)]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.wfile.write(b'[')
+                for i, piece in enumerate(pieces):
+                    time.sleep(delay / len(pieces))
+                    if i:
+                        self.wfile.write(b',')
+                    self.wfile.write(json.dumps(stand_in._candidate(piece)).encode('utf-8'))
+                    self.wfile.flush()
+                self.wfile.write(b']')
+
+        return Handler
+
+
+def rss_bytes():
+    """Current resident set size, falling back to the peak where /proc is missing."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def sample_image(seed, size=(640, 480)):
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels).resize(size)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class SessionFailed(Exception):
+    pass
+
+
+class FarmerSession:
+    """One simulated farmer walking through the app in its own AppTest."""
+
+    STEPS = ('load', 'register', 'login', 'chat', 'diagnosis', 'community', 'products')
+
+    def __init__(self, number, run_id, timeout, images_per_diagnosis):
+        self.number = number
+        self.mobile = f"9{run_id:04d}{number:05d}"
+        self.name = f"Load Test Farmer {number}"
+        self.timeout = timeout
+        self.images_per_diagnosis = images_per_diagnosis
+        self.samples = {}
+        self.error = None
+        self.at = None
+
+    def _step(self, name, action):
+        start = time.perf_counter()
+        try:
+            action()
+            if self.at.exception:
+                raise SessionFailed(self.at.exception[0].message)
+        except Exception as e:
+            self.error = f"{name}: session {self.number}: {e!r}"
+            raise SessionFailed(name) from e
+        self.samples[name] = (time.perf_counter() - start) * 1000
+
+    def _button(self, label):
+        return next(button for button in self.at.button if button.label == label)
+
+    def _text_input(self, label=None, key=None):
+        if key:
+            return self.at.text_input(key=key)
+        return next(widget for widget in self.at.text_input if widget.label == label)
+
+    def _open_page(self, index):
+        radio = self.at.sidebar.radio[0]
+        radio.set_value(radio.options[index]).run()
+
+    def load(self):
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP_PATH, default_timeout=self.timeout)
+        self.at.secrets['GEMINI_API_KEY'] = 'load-test'
+        self.at.run()
+
+    def register(self):
+        self._text_input(key='reg_name').input(self.name)
+        self._text_input(key='reg_mobile').input(self.mobile)
+        self._text_input(key='reg_location').input("Nashik")
+        self._text_input(key='reg_password').input("loadtest123")
+        self._text_input(key='reg_confirm').input("loadtest123")
+        self._button(LABELS['register']).click().run()
+
+    def login(self):
+        self._text_input(key='login_email').input(self.mobile)
+        self._text_input(key='login_password').input("loadtest123")
+        self._button(LABELS['login']).click().run()
+        if not self.at.session_state['logged_in']:
+            raise SessionFailed("login rejected")
+
+    def chat(self):
+        self._open_page(PAGE_CHAT)
+        self.at.chat_input[0].set_value(QUESTIONS[self.number % len(QUESTIONS)]).run()
+
+    def diagnosis(self):
+        self._open_page(PAGE_DIAGNOSIS)
+        files = [(f"plant_{i}.jpg", sample_image(self.number * 10 + i), 'image/jpeg')
+                 for i in range(self.images_per_diagnosis)]
+        self.at.file_uploader[0].set_value(files).run()
+        self._button(LABELS['analyze']).click().run()
+
+    def community(self):
+        self._open_page(PAGE_COMMUNITY)
+        content = next(area for area in self.at.text_area if area.label == LABELS['post_content'])
+        content.input(f"Good rains in Nashik this week ({self.name})")
+        self._button(LABELS['post']).click().run()
+
+    def products(self):
+        self._open_page(PAGE_PRODUCTS)
+        self._text_input(LABELS['product_name']).input("Organic Tomatoes")
+        self._text_input(LABELS['quantity']).input("50 kg")
+        self._button(LABELS['list']).click().run()
+        self._text_input(LABELS['search']).input("Tomato").run()
+
+    def run(self):
+        try:
+            for name in self.STEPS:
+                self._step(name, getattr(self, name))
+        except SessionFailed:
+            pass
+        return self
+
+
+# AppTest swaps process-wide Streamlit globals on every run, so sessions run
+# in worker processes; each keeps its finished sessions alive like a server would
+_worker = {}
+
+
+def _init_worker(workdir, run_id, timeout, images, ready):
+    # The app opens some SQLite files relative to the working directory
+    os.chdir(workdir)
+    _worker.update(run_id=run_id, timeout=timeout, images=images, live=[])
+    # Warm up imports and shared resources so they are not billed to sessions
+    warmup = FarmerSession(90000 + os.getpid() % 10000, run_id, timeout, images).run()
+    ready.put(warmup.error)
+
+
+def _token_usage():
+    """Token totals per prompt template of this process's shared KrishiAI."""
+    from ai_service import get_ai_service
+    return get_ai_service().token_usage.stats()
+
+
+def _run_session(number):
+    session = FarmerSession(number, _worker['run_id'], _worker['timeout'], _worker['images'])
+    gc.collect()
+    rss_before = rss_bytes()
+    usage_before = _token_usage()
+    session.run()
+    gc.collect()
+    _worker['live'].append(session)
+    # Workers run one session at a time, so the difference is this session's
+    usage = {}
+    for name, totals in _token_usage().items():
+        before = usage_before.get(name, {})
+        usage[name] = {key: value - before.get(key, 0) for key, value in totals.items()}
+    return session.samples, session.error, rss_bytes() - rss_before, usage
+
+
+def run_sessions(workdir, count, concurrency, run_id, timeout, images, on_warm=None):
+    """Run sessions on `concurrency` warmed-up worker processes.
+
+    Returns (per-step samples, errors, per-session RSS growth, wall seconds,
+    token usage per prompt template).
+    """
+    context = multiprocessing.get_context('spawn')
+    ready = context.Queue()
+    with context.Pool(concurrency, initializer=_init_worker,
+                      initargs=(workdir, run_id, timeout, images, ready)) as pool:
+        warmup_errors = [error for error in (ready.get(timeout=timeout * 10) for _ in range(concurrency))
+                         if error]
+        if warmup_errors:
+            raise RuntimeError(f"warm-up failed: {warmup_errors[0]}")
+        if on_warm:
+            on_warm()
+        start = time.perf_counter()
+        outcomes = pool.map(_run_session, range(count), chunksize=1)
+        wall_s = time.perf_counter() - start
+
+    samples, errors, memory, usage = {}, [], [], {}
+    for session_samples, error, rss_growth, session_usage in outcomes:
+        for step, elapsed_ms in session_samples.items():
+            samples.setdefault(step, []).append(elapsed_ms)
+        if error:
+            errors.append(error)
+        memory.append(rss_growth)
+        for name, totals in session_usage.items():
+            merged = usage.setdefault(name, dict.fromkeys(totals, 0))
+            for key, value in totals.items():
+                merged[key] += value
+    return samples, errors, memory, wall_s, usage
+
+
+def report(samples, errors, memory, wall_s, sessions, stand_in, usage):
+    steps = sum(len(step_samples) for step_samples in samples.values())
+    completed = sessions - len(errors)
+    print(f"\nsessions: {completed}/{sessions} completed in {wall_s:.1f}s")
+    print(f"throughput: {steps / wall_s:.2f} steps/s, {completed / wall_s * 60:.1f} sessions/min")
+    print(f"\n{'step':<11}{'count':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step in FarmerSession.STEPS:
+        if step in samples:
+            p50, p90, p99 = np.percentile(samples[step], [50, 90, 99])
+            print(f"{step:<11}{len(samples[step]):>6}{p50:>10.0f}{p90:>10.0f}{p99:>10.0f}"
+                  f"{max(samples[step]):>10.0f}")
+    p50, p90 = np.percentile(memory, [50, 90]) / 1e6
+    print(f"\nmemory per live session: p50={p50:.2f} MB p90={p90:.2f} MB RSS growth")
+    print(f"stand-in: {stand_in.requests} requests, {stand_in.streamed} streamed, "
+          f"{stand_in.quota_errors} injected 429s")
+    print(f"\n{'prompt':<28}{'calls':>6}{'sent':>10}{'received':>10}{'sent/call':>11}")
+    for name, totals in sorted(usage.items()):
+        if totals['calls']:
+            print(f"{name:<28}{totals['calls']:>6}{totals['sent']:>10}{totals['received']:>10}"
+                  f"{totals['sent'] / totals['calls']:>11.0f}")
+    if errors:
+        print(f"\n{len(errors)} failed sessions, first few:")
+        for error in errors[:5]:
+            print(f"  {error}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test Krishi Mitra with simulated farmer sessions")
+    parser.add_argument('--sessions', type=int, default=20, help="Simulated farmer sessions")
+    parser.add_argument('--concurrency', type=int, default=4, help="Sessions running at once (worker processes)")
+    parser.add_argument('--latency', type=float, default=1.0, help="Mean stand-in latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.3, help="Latency standard deviation in seconds")
+    parser.add_argument('--quota-rate', type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument('--stream-chunks', type=int, default=4, help="Chunks per streamed answer")
+    parser.add_argument('--images', type=int, default=2, help="Photos per diagnosis")
+    parser.add_argument('--rpm', type=int, help="Override the API key's requests-per-minute limit")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-step AppTest timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    stand_in = GeminiStandIn(args.latency, args.jitter, args.quota_rate,
+                             args.stream_chunks, seed=args.seed).start()
+    workdir = tempfile.mkdtemp(prefix='krishi-loadtest-')
+
+    # Worker processes inherit this environment; everything they write goes to workdir
+    os.environ['GEMINI_API_ENDPOINT'] = stand_in.endpoint
+    os.environ['GEMINI_API_KEY'] = 'load-test'
+    os.environ['KRISHI_DATA_DIR'] = workdir
+    if args.rpm:
+        os.environ['KRISHI_GEMINI_RPM'] = str(args.rpm)
+    print(f"stand-in at {stand_in.endpoint}, data in {workdir}")
+
+    try:
+        samples, errors, memory, wall_s, usage = run_sessions(
+            workdir, args.sessions, args.concurrency, args.seed % 10000, args.timeout, args.images,
+            on_warm=stand_in.reset_counters
+        )
+    except RuntimeError as e:
+        print(e)
+        return 1
+    finally:
+        stand_in.stop()
+    report(samples, errors, memory, wall_s, args.sessions, stand_in, usage)
+    return 0 if not errors else 1
+
+
+if __name__ == '__main__':
+    # Workers must find these functions by module name: AppTest replaces __main__
+    import loadtest
+    sys.exit(loadtest.main())
@@ -0,0 +1,221 @@
+"""
+Local CPU fallback backend for Krishi Mitra
+A small quantized GGUF model run through llama.cpp answers text-only requests
+when every Gemini model is out of quota or the rate-limit queue is too long
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from llama_cpp import Llama
+except ImportError:  # Optional: the app runs cloud-only without it
+    Llama = None
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Backend:
+    """A text generation backend KrishiAI can fall back to.
+
+    `submit` and `stream` return None when the backend is busy, so callers can
+    report the original error instead of queueing without bound.
+    """
+
+    name = 'backend'
+
+    def available(self):
+        return False
+
+    def submit(self, prompt):
+        """Start generating; returns a Future of the answer text, or None."""
+        return None
+
+    def generate(self, prompt, timeout=None):
+        """Answer text, or None if the backend is busy, fails or times out."""
+        future = self.submit(prompt)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning("%s backend failed: %s", self.name, e)
+            return None
+
+    def stream(self, prompt):
+        """Iterator of answer chunks, or None."""
+        text = self.generate(prompt)
+        return None if text is None else iter([text])
+
+    def stats(self):
+        return {'name': self.name}
+
+
+class LlamaBackend(Backend):
+    """llama.cpp model on a small, bounded worker pool.
+
+    Each worker thread loads the model once on first use; GGUF weights are
+    memory-mapped, so extra workers share them and only add a context. Keep
+    `workers * threads` below the core count so Streamlit stays responsive.
+    """
+
+    name = 'llama.cpp'
+
+    def __init__(self, model_path, threads=2, workers=1, max_pending=4,
+                 context_tokens=4096, max_tokens=512, temperature=0.3, timeout=120):
+        self.model_path = model_path
+        self.threads = threads
+        self.workers = workers
+        self.context_tokens = context_tokens
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.timeout = timeout
+        self.requests = 0
+        self.rejected = 0
+        self.failures = 0
+        self.tokens = 0
+        self.seconds = 0.0
+        self.load_seconds = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="krishi-local-llm")
+
+    def available(self):
+        return Llama is not None and os.path.isfile(self.model_path)
+
+    def _model(self):
+        """This worker's model, loaded on first use."""
+        model = getattr(self._local, 'model', None)
+        if model is None:
+            start = time.monotonic()
+            model = Llama(model_path=self.model_path, n_ctx=self.context_tokens,
+                          n_threads=self.threads, verbose=False)
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.load_seconds = elapsed
+            logger.info("Loaded %s in %.1fs", os.path.basename(self.model_path), elapsed)
+            self._local.model = model
+        return model
+
+    def _reserve(self):
+        if self._slots.acquire(blocking=False):
+            return True
+        with self._lock:
+            self.rejected += 1
+        return False
+
+    def _record(self, tokens, seconds, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.failures += failed
+            self.tokens += tokens
+            self.seconds += seconds
+
+    def _complete(self, prompt, on_chunk=None, cancelled=None):
+        """Run one chat completion on this worker's model; returns (text, tokens)."""
+        start = time.monotonic()
+        chunks, tokens = [], 0
+        try:
+            output = self._model().create_chat_completion(
+                messages=[{'role': 'user', 'content': prompt}],
+                max_tokens=self.max_tokens, temperature=self.temperature, stream=True
+            )
+            for chunk in output:
+                if cancelled is not None and cancelled.is_set():
+                    break
+                text = chunk['choices'][0]['delta'].get('content')
+                if text:
+                    # llama.cpp streams one token per chunk
+                    tokens += 1
+                    chunks.append(text)
+                    if on_chunk:
+                        on_chunk(text)
+        except Exception:
+            self._record(tokens, time.monotonic() - start, failed=True)
+            raise
+        self._record(tokens, time.monotonic() - start)
+        return ''.join(chunks), tokens
+
+    def submit(self, prompt):
+        if not self._reserve():
+            return None
+        future = self._pool.submit(lambda: self._complete(prompt)[0])
+        future.add_done_callback(lambda f: self._slots.release())
+        return future
+
+    def generate(self, prompt, timeout=None):
+        return super().generate(prompt, self.timeout if timeout is None else timeout)
+
+    def stream(self, prompt):
+        if not self._reserve():
+            return None
+        pieces = queue.Queue()
+        cancelled = threading.Event()
+
+        def run():
+            try:
+                self._complete(prompt, pieces.put, cancelled)
+            except Exception as e:
+                pieces.put(e)
+            finally:
+                pieces.put(_DONE)
+                self._slots.release()
+
+        self._pool.submit(run)
+        return self._iterate(pieces, cancelled)
+
+    def _iterate(self, pieces, cancelled):
+        deadline = time.monotonic() + self.timeout
+        try:
+            while True:
+                piece = pieces.get(timeout=max(0.0, deadline - time.monotonic()))
+                if piece is _DONE:
+                    return
+                if isinstance(piece, Exception):
+                    raise piece
+                yield piece
+        except queue.Empty:
+            raise TimeoutError(f"Local model took longer than {self.timeout}s") from None
+        finally:
+            # Stop generating once nobody is reading
+            cancelled.set()
+
+    def benchmark(self, prompt, max_tokens=128):
+        """Generation speed on one worker: tokens/sec overall and per core."""
+        # Load first so the timing covers generation only
+        self._pool.submit(self._model).result()
+        saved, self.max_tokens = self.max_tokens, max_tokens
+        try:
+            start = time.monotonic()
+            _, tokens = self._pool.submit(self._complete, prompt).result()
+            elapsed = time.monotonic() - start
+        finally:
+            self.max_tokens = saved
+        return {
+            'threads': self.threads,
+            'load_seconds': self.load_seconds,
+            'tokens': tokens,
+            'seconds': elapsed,
+            'tokens_per_second': tokens / elapsed if elapsed else 0.0,
+            'tokens_per_second_per_core': tokens / elapsed / self.threads if elapsed else 0.0,
+        }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'model': os.path.basename(self.model_path),
+                'loaded': self.load_seconds is not None,
+                'requests': self.requests,
+                'rejected': self.rejected,
+                'failures': self.failures,
+                'tokens': self.tokens,
+                'tokens_per_second': self.tokens / self.seconds if self.seconds else 0.0,
+            }
@@ -8,9 +8,15 @@ from PIL import Image
 from datetime import datetime
 import os
 
-from config import APP_NAME, APP_TAGLINE, SUPPORTED_LANGUAGES, IMAGES_DIR, VIDEOS_DIR
-from database import create_post, get_all_posts, add_product, get_all_products, search_products
-from ai_service import get_ai_service
+from config import APP_NAME, APP_TAGLINE, SUPPORTED_LANGUAGES, IMAGES_DIR, VIDEOS_DIR, CROP_CORPUS_VERSION, DIAGNOSIS_MAX_IMAGES, JOB_WAIT_SECONDS
+from database import (
+    create_post, get_posts_page, add_product, get_products_page, search_products, get_stats
+)
+from ai_service import get_ai_service, get_async_ai_service, get_job_queue
+from lang_detect import detect
+from rate_limiter import set_request_context
+from batch_diagnosis import preprocess_images
+from diagnosis import parse_diagnosis
 from utils import (
     validate_image, validate_video, compress_image, 
     save_uploaded_file, get_language_name, format_datetime
@@ -18,6 +24,8 @@ from utils import (
 
 # Initialize AI Service
 ai_service = get_ai_service()
+async_ai_service = get_async_ai_service()
+job_queue = get_job_queue()
 
 # Create upload directories
 os.makedirs(IMAGES_DIR, exist_ok=True)
@@ -63,6 +71,7 @@ TRANSLATIONS = {
         'phone': 'Phone Number',
         'list': 'List Product',
         'search': '🔍 Search',
+        'load_more': '⬇️ Load more',
         'logout': '🚪 Logout',
         'language': 'Language',
         'select_feature': 'Select Feature',
@@ -114,6 +123,7 @@ TRANSLATIONS = {
         'phone': 'फोन नंबर',
         'list': 'यादीत टाका',
         'search': '🔍 शोधा',
+        'load_more': '⬇️ आणखी पहा',
         'logout': '🚪 बाहेर पडा',
         'language': 'भाषा',
         'select_feature': 'वैशिष्ट्य निवडा',
@@ -165,6 +175,7 @@ TRANSLATIONS = {
         'phone': 'फोन नंबर',
         'list': 'सूचीबद्ध करें',
         'search': '🔍 खोजें',
+        'load_more': '⬇️ और देखें',
         'logout': '🚪 लॉगआउट',
         'language': 'भाषा',
         'select_feature': 'सुविधा चुनें',
@@ -216,6 +227,7 @@ TRANSLATIONS = {
         'phone': 'ફોન નંબર',
         'list': 'યાદીમાં મૂકો',
         'search': '🔍 શોધો',
+        'load_more': '⬇️ વધુ જુઓ',
         'logout': '🚪 લોગઆઉટ',
         'language': 'ભાષા',
         'select_feature': 'સુવિધા પસંદ કરો',
@@ -267,6 +279,7 @@ TRANSLATIONS = {
         'phone': 'தொலைபேசி எண்',
         'list': 'பட்டியலிடுங்கள்',
         'search': '🔍 தேடுங்கள்',
+        'load_more': '⬇️ மேலும் காண்க',
         'logout': '🚪 வெளியேறு',
         'language': 'மொழி',
         'select_feature': 'அம்சத்தைத் தேர்வு செய்க',
@@ -318,6 +331,7 @@ TRANSLATIONS = {
         'phone': 'ఫోన్ నంబర్',
         'list': 'జాబితాలో చేర్చండి',
         'search': '🔍 వెతకండి',
+        'load_more': '⬇️ మరిన్ని చూడండి',
         'logout': '🚪 లాగౌట్',
         'language': 'భాష',
         'select_feature': 'ఫీచర్ ఎంచుకోండి',
@@ -369,6 +383,7 @@ TRANSLATIONS = {
         'phone': 'ಫೋನ್ ಸಂಖ್ಯೆ',
         'list': 'ಪಟ್ಟಿ ಮಾಡಿ',
         'search': '🔍 ಹುಡುಕಿ',
+        'load_more': '⬇️ ಇನ್ನಷ್ಟು ನೋಡಿ',
         'logout': '🚪 ಲಾಗ್ ಔಟ್',
         'language': 'ಭಾಷೆ',
         'select_feature': 'ವೈಶಿಷ್ಟ್ಯವನ್ನು ಆಯ್ಕೆಮಾಡಿ',
@@ -391,6 +406,72 @@ def get_text(key, lang='en'):
     """Get translated text for given key and language."""
     return TRANSLATIONS.get(lang, TRANSLATIONS['en']).get(key, TRANSLATIONS['en'][key])
 
+def show_job(job_id):
+    """Show a background AI job's output, updating in place until it finishes."""
+    placeholder = st.empty()
+    job = job_queue.wait(
+        job_id,
+        timeout=JOB_WAIT_SECONDS,
+        on_update=lambda job: placeholder.markdown((job['result'] or '') + " ⏳")
+    )
+    if job is None:
+        return
+    if job['status'] == 'done':
+        placeholder.markdown(job['result'])
+    elif job['status'] == 'failed':
+        placeholder.error(job['error'])
+    else:
+        placeholder.info("⏳ Still working on it — the answer will appear here when you come back.")
+
+def show_diagnosis(report):
+    """Render a structured crop diagnosis; free-form or error text is shown as is."""
+    diagnosis = parse_diagnosis(report)
+    if diagnosis is None:
+        st.markdown(report)
+        return
+    
+    col1, col2 = st.columns(2)
+    col1.metric("🌱 Crop", diagnosis['crop'] or "—")
+    col2.metric("💚 Health", f"{diagnosis['health_score']}/100")
+    st.progress(diagnosis['health_score'] / 100)
+    if diagnosis['health_summary']:
+        st.write(diagnosis['health_summary'])
+    
+    if diagnosis['diseases']:
+        st.markdown("**🦠 Diseases & Pests**")
+        for disease in diagnosis['diseases']:
+            line = f"- **{disease['name']}** ({disease['confidence']:.0%})"
+            if disease['symptoms']:
+                line += f" — {disease['symptoms']}"
+            st.markdown(line)
+    else:
+        st.success("✅ No disease or pest detected")
+    
+    for title, items in (("💊 Treatment", diagnosis['treatments']), ("🌿 Care Tips", diagnosis['care_tips'])):
+        if items:
+            st.markdown(f"**{title}**")
+            st.markdown('\n'.join(f"- {item}" for item in items))
+
+def paged_rows(key, fetch_page):
+    """Rows of every page loaded so far and the cursor of the next page.
+    
+    Session state keeps the cursor of each loaded page's last row. Each rerun
+    re-reads those pages down to the same rows, one index seek each, so new
+    posts appear on top without repeating or skipping any further down.
+    """
+    rows, cursor = [], None
+    for until in st.session_state.setdefault(key, []):
+        page, cursor = fetch_page(cursor=cursor, until=until)
+        rows.extend(page)
+    page, next_cursor = fetch_page(cursor=cursor)
+    rows.extend(page)
+    return rows, next_cursor
+
+def load_more_button(key, next_cursor, lang):
+    if next_cursor and st.button(get_text('load_more', lang), key=f"{key}_more"):
+        st.session_state[key].append(next_cursor)
+        st.rerun()
+
 # =============================================================================
 # MAIN APP FUNCTION
 # =============================================================================
@@ -1398,14 +1479,25 @@ def run_main_app(user):
     
         st.sidebar.markdown("---")
     
-                
+    # Show the farmer's place in the shared AI queue instead of a hard error
+    queue_notice = st.empty()
+    
+    def show_queue_position(position, expected_wait):
+        if position:
+            queue_notice.info(f"⏳ Many farmers are asking right now. You are #{position} in line (~{expected_wait:.0f}s).")
+        else:
+            queue_notice.empty()
+    
+    set_request_context(user.get('mobile_email'), show_queue_position)
     
     # =============================================================================
     # HOME PAGE
     # =============================================================================
     if page == get_text('home', selected_lang):
-        posts_count = len(get_all_posts(limit=1000))
-        products_count = len(get_all_products(limit=1000))
+        # One primary-key lookup on the trigger-maintained counters
+        stats = get_stats()
+        posts_count = stats['posts']
+        products_count = stats['products']
         st.markdown(f"""
         <div class="km-hero">
             <div class="km-hero-badge">&#127807; AI-Powered Farming Platform</div>
@@ -1462,13 +1554,10 @@ def run_main_app(user):
         
         col1, col2, col3 = st.columns(3)
         
-        posts = get_all_posts(limit=1000)
-        products = get_all_products(limit=1000)
-        
         with col1:
-            st.metric(get_text('community', selected_lang).split(' ')[1], len(posts))
+            st.metric(get_text('community', selected_lang).split(' ')[1], posts_count)
         with col2:
-            st.metric(get_text('products', selected_lang).split(' ')[1], len(products))
+            st.metric(get_text('products', selected_lang).split(' ')[1], products_count)
         with col3:
             st.metric(get_text('language', selected_lang), len(SUPPORTED_LANGUAGES))
         
@@ -1518,18 +1607,27 @@ def run_main_app(user):
             with st.chat_message("user"):
                 st.write(user_query)
             
-            with st.spinner("🤖 Thinking..."):
-                response = ai_service.get_farming_response(user_query, selected_lang)
+            # Answer in the language the farmer typed in when detection is confident
+            detected_lang, confidence = detect(user_query)
+            response_lang = detected_lang if confidence >= 0.7 else selected_lang
+            
+            # Earlier turns, bounded by a token budget, so follow-ups keep their context
+            context = ai_service.chat_context.build(
+                st.session_state.chat_history[:-1],
+                st.session_state.setdefault('chat_context_state', {})
+            )
+            
+            with st.chat_message("assistant"):
+                response = st.write_stream(
+                    ai_service.stream_farming_response(user_query, response_lang, context)
+                )
+                st.caption(f"{get_text('language', selected_lang)}: {get_language_name(response_lang)}")
             
             st.session_state.chat_history.append({
                 "role": "assistant", 
                 "content": response,
-                "language": selected_lang
+                "language": response_lang
             })
-            
-            with st.chat_message("assistant"):
-                st.write(response)
-                st.caption(f"{get_text('language', selected_lang)}: {get_language_name(selected_lang)}")
         
         # Quick questions
         st.markdown("---")
@@ -1567,10 +1665,11 @@ def run_main_app(user):
         
         with col1:
             st.subheader(get_text('upload_image', selected_lang))
-            uploaded_file = st.file_uploader(
-                "Choose image", 
+            uploaded_files = st.file_uploader(
+                "Choose images", 
                 type=['jpg', 'jpeg', 'png'],
-                help="Upload clear photo"
+                accept_multiple_files=True,
+                help=f"Upload clear photos (up to {DIAGNOSIS_MAX_IMAGES})"
             )
             
             additional_context = st.text_area(
@@ -1580,38 +1679,62 @@ def run_main_app(user):
             
             analyze_btn = st.button(get_text('analyze', selected_lang), type="primary")
         
+        if len(uploaded_files) > DIAGNOSIS_MAX_IMAGES:
+            st.warning(f"Only the first {DIAGNOSIS_MAX_IMAGES} photos will be analyzed")
+            uploaded_files = uploaded_files[:DIAGNOSIS_MAX_IMAGES]
+        
         with col2:
             st.subheader(get_text('preview', selected_lang))
-            if uploaded_file:
-                is_valid, msg = validate_image(uploaded_file)
-                if is_valid:
-                    image = Image.open(uploaded_file)
-                    st.image(image, use_column_width=True)
-                else:
-                    st.error(msg)
+            if uploaded_files:
+                preview_cols = st.columns(min(len(uploaded_files), 3))
+                for idx, uploaded_file in enumerate(uploaded_files):
+                    with preview_cols[idx % len(preview_cols)]:
+                        is_valid, msg = validate_image(uploaded_file)
+                        if is_valid:
+                            st.image(Image.open(uploaded_file), caption=uploaded_file.name, use_column_width=True)
+                        else:
+                            st.error(msg)
             else:
                 st.info("Image preview will appear here")
         
-        if analyze_btn and uploaded_file:
-            is_valid, msg = validate_image(uploaded_file)
-            if not is_valid:
-                st.error(msg)
-            else:
+        if analyze_btn and uploaded_files:
+            valid_files = []
+            for uploaded_file in uploaded_files:
+                is_valid, msg = validate_image(uploaded_file)
+                if is_valid:
+                    valid_files.append(uploaded_file)
+                else:
+                    st.error(f"{uploaded_file.name}: {msg}")
+            
+            if valid_files:
                 with st.spinner("🧠 Analyzing..."):
-                    compressed_image = compress_image(uploaded_file)
+                    # All photos are compressed in parallel and sent in packed requests
+                    compressed_images = preprocess_images(valid_files, compress_image)
+                    ready = [(f, image) for f, image in zip(valid_files, compressed_images) if image]
+                    
+                    for uploaded_file, image in zip(valid_files, compressed_images):
+                        if not image:
+                            st.error(f"Failed to process image {uploaded_file.name}")
                     
-                    if compressed_image:
-                        analysis = ai_service.analyze_crop_image(
-                            compressed_image, 
+                    if ready:
+                        analyses = async_ai_service.run(async_ai_service.analyze_crop_images(
+                            [image for _, image in ready], 
                             additional_context,
                             selected_lang
-                        )
+                        ))
+                        if isinstance(analyses, str):
+                            # Timed out: the error applies to every photo
+                            analyses = [analyses] * len(ready)
                         
                         st.markdown("---")
                         st.subheader(get_text('analysis_report', selected_lang))
-                        st.markdown(analysis)
-                    else:
-                        st.error("Failed to process image")
+                        if len(ready) == 1:
+                            show_diagnosis(analyses[0])
+                        else:
+                            for (uploaded_file, image), analysis in zip(ready, analyses):
+                                with st.expander(f"📷 {uploaded_file.name}", expanded=True):
+                                    st.image(image, width=200)
+                                    show_diagnosis(analysis)
     
     # =============================================================================
     # CROP KNOWLEDGE - NO VOICE
@@ -1624,12 +1747,17 @@ def run_main_app(user):
             placeholder="e.g., Wheat, Rice, Cotton..."
         )
         
+        ready_crops = ai_service.knowledge.list_titles('crop', selected_lang, CROP_CORPUS_VERSION)
+        if ready_crops:
+            st.caption("⚡ " + ", ".join(ready_crops))
+        
+        # The job keeps running if the page reruns; its ID lives in session state
         if st.button(get_text('generate', selected_lang), type="primary") and crop_name:
-            with st.spinner("🌱 Generating..."):
-                knowledge = ai_service.generate_crop_knowledge(crop_name, selected_lang)
-                
-                st.markdown("---")
-                st.markdown(knowledge)
+            st.session_state.crop_job = job_queue.submit('stream_crop_knowledge', crop_name, selected_lang)
+        
+        if st.session_state.get('crop_job'):
+            st.markdown("---")
+            show_job(st.session_state.crop_job)
     
     # =============================================================================
     # FARMER COMMUNITY - NO VOICE
@@ -1642,7 +1770,7 @@ def run_main_app(user):
         with tab1:
             st.subheader(get_text('view_posts', selected_lang))
             
-            posts = get_all_posts(limit=20)
+            posts, next_cursor = paged_rows('feed_cursors', lambda cursor, until=None: get_posts_page(20, cursor, until))
             
             if not posts:
                 st.info("No posts yet!")
@@ -1664,6 +1792,8 @@ def run_main_app(user):
                             st.video(post['video_path'])
                         
                         st.markdown("---")
+                
+                load_more_button('feed_cursors', next_cursor, selected_lang)
         
         with tab2:
             st.subheader(get_text('create_post', selected_lang))
@@ -1720,12 +1850,20 @@ def run_main_app(user):
             placeholder="e.g., PM-KISAN, Soil Health Card..."
         )
         
+        # Popular-scheme buttons hand their scheme over through session state
+        popular_query = st.session_state.pop('scheme_query', None)
+        
         if st.button(get_text('search', selected_lang), type="primary") and scheme_query:
-            with st.spinner("🏛️ Fetching..."):
-                info = ai_service.get_government_scheme_info(scheme_query, selected_lang)
-                
-                st.markdown("---")
-                st.markdown(info)
+            popular_query = scheme_query
+        
+        if popular_query:
+            st.session_state.scheme_job = job_queue.submit(
+                'stream_government_scheme_info', popular_query, selected_lang
+            )
+        
+        if st.session_state.get('scheme_job'):
+            st.markdown("---")
+            show_job(st.session_state.scheme_job)
         
         st.markdown("---")
         st.subheader(get_text('popular_schemes', selected_lang))
@@ -1765,10 +1903,11 @@ def run_main_app(user):
             
             search = st.text_input(get_text('search', selected_lang))
             
+            next_cursor = None
             if search:
                 products = search_products(search)
             else:
-                products = get_all_products(limit=50)
+                products, next_cursor = paged_rows('product_cursors', lambda cursor, until=None: get_products_page(50, cursor, until))
             
             if not products:
                 st.info("No products listed yet!")
@@ -1785,6 +1924,8 @@ def run_main_app(user):
                             <p><strong>{get_text('phone', selected_lang)}:</strong> &#128222; {product['phone_number']}</p>
                         </div>
                         """, unsafe_allow_html=True)
+                
+                load_more_button('product_cursors', next_cursor, selected_lang)
         
         with tab2:
             st.subheader(get_text('list_product', selected_lang))
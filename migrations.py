@@ -0,0 +1,259 @@
+"""
+Versioned schema migrations for the Krishi Mitra database
+Each migration runs once, in order, inside its own transaction and is
+recorded in the schema_version table; one this host cannot run yet is
+left unrecorded and retried on the next start
+"""
+
+import logging
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+class MigrationDeferred(Exception):
+    """Raised by a migration that needs something this host lacks; nothing later may depend on it."""
+
+
+USERS_COLUMNS = ('id', 'farmer_name', 'mobile_email', 'location', 'password_hash', 'created_at', 'last_login')
+
+
+def _baseline(conn):
+    """Tables as database.py has always created them."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS community_posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            farmer_name TEXT NOT NULL,
+            content TEXT NOT NULL,
+            image_path TEXT,
+            video_path TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS organic_products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            farmer_name TEXT NOT NULL,
+            product_name TEXT NOT NULL,
+            quantity TEXT NOT NULL,
+            location TEXT NOT NULL,
+            phone_number TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT,
+            role TEXT,
+            content TEXT,
+            language TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            farmer_name TEXT NOT NULL,
+            mobile_email TEXT UNIQUE NOT NULL,
+            location TEXT,
+            password_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS login_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER REFERENCES users(id),
+            login_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ip_address TEXT,
+            device_info TEXT
+        )
+    ''')
+
+
+def _canonical_users(conn):
+    """Rebuild a users table created by app.py's older layout."""
+    existing = [row[1] for row in conn.execute('PRAGMA table_info(users)')]
+    if list(existing) == list(USERS_COLUMNS):
+        return
+    conn.execute('''
+        CREATE TABLE users_canonical (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            farmer_name TEXT NOT NULL,
+            mobile_email TEXT UNIQUE NOT NULL,
+            location TEXT,
+            password_hash TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_login TIMESTAMP
+        )
+    ''')
+    columns = [column for column in USERS_COLUMNS if column in existing]
+    values = ["COALESCE(farmer_name, '')" if column == 'farmer_name' else column for column in columns]
+    conn.execute(f'''
+        INSERT INTO users_canonical ({', '.join(columns)})
+        SELECT {', '.join(values)} FROM users
+    ''')
+    conn.execute('DROP TABLE users')
+    conn.execute('ALTER TABLE users_canonical RENAME TO users')
+
+
+def _listing_indexes(conn):
+    """(time, id) indexes matching the keyset pagination ORDER BY, plus the login-history join.
+
+    Every SQLite index already ends in the rowid; naming id keeps the
+    contract visible.
+    """
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_posts_created_id ON community_posts (created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_products_created_id ON organic_products (created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_created_id ON users (created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_login_history_time_id ON login_history (login_time, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_login_history_user ON login_history (user_id)')
+
+
+def _product_search(conn):
+    """FTS5 trigram index over product listings, kept in sync by triggers."""
+    if not fts5_trigram_available(conn):
+        # search_products falls back to LIKE until an upgraded SQLite builds the index
+        raise MigrationDeferred(f"SQLite {conn.execute('SELECT sqlite_version()').fetchone()[0]} "
+                                "lacks FTS5 trigram support; product search stays unindexed")
+    # Trigrams match substrings of any script, so Devanagari, Gujarati and
+    # Dravidian names need no word segmentation
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS product_search USING fts5(
+            product_name, location, farmer_name,
+            content='organic_products', content_rowid='id', tokenize='trigram'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS organic_products_search_insert
+        AFTER INSERT ON organic_products BEGIN
+            INSERT INTO product_search (rowid, product_name, location, farmer_name)
+            VALUES (new.id, new.product_name, new.location, new.farmer_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS organic_products_search_delete
+        AFTER DELETE ON organic_products BEGIN
+            INSERT INTO product_search (product_search, rowid, product_name, location, farmer_name)
+            VALUES ('delete', old.id, old.product_name, old.location, old.farmer_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS organic_products_search_update
+        AFTER UPDATE OF product_name, location, farmer_name ON organic_products BEGIN
+            INSERT INTO product_search (product_search, rowid, product_name, location, farmer_name)
+            VALUES ('delete', old.id, old.product_name, old.location, old.farmer_name);
+            INSERT INTO product_search (rowid, product_name, location, farmer_name)
+            VALUES (new.id, new.product_name, new.location, new.farmer_name);
+        END
+    ''')
+    conn.execute("INSERT INTO product_search (product_search) VALUES ('rebuild')")
+
+
+def _stats_counters(conn):
+    """Row counts kept by triggers, so statistics never count rows."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            counter TEXT NOT NULL,
+            bucket TEXT NOT NULL DEFAULT '',
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (counter, bucket)
+        ) WITHOUT ROWID
+    ''')
+    # Totals use the '' bucket; *_by_location counters bucket by normalized location
+    for counter, table in (('posts', 'community_posts'), ('products', 'organic_products'), ('users', 'users')):
+        conn.execute(f'''
+            INSERT OR REPLACE INTO stats_counters (counter, bucket, value)
+            SELECT '{counter}', '', COUNT(*) FROM {table}
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table} BEGIN
+                UPDATE stats_counters SET value = value + 1 WHERE counter = '{counter}' AND bucket = '';
+            END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table} BEGIN
+                UPDATE stats_counters SET value = value - 1 WHERE counter = '{counter}' AND bucket = '';
+            END
+        ''')
+    location = "LOWER(TRIM(COALESCE({}.location, '')))"
+    for counter, table in (('products_by_location', 'organic_products'), ('users_by_location', 'users')):
+        conn.execute(f'''
+            INSERT OR REPLACE INTO stats_counters (counter, bucket, value)
+            SELECT '{counter}', {location.format(table)}, COUNT(*) FROM {table}
+            GROUP BY {location.format(table)}
+        ''')
+        add = f'''
+            INSERT INTO stats_counters (counter, bucket, value) VALUES ('{counter}', {location.format('new')}, 1)
+            ON CONFLICT (counter, bucket) DO UPDATE SET value = value + 1;
+        '''
+        remove = f'''
+            UPDATE stats_counters SET value = value - 1
+            WHERE counter = '{counter}' AND bucket = {location.format('old')};
+        '''
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {counter}_insert AFTER INSERT ON {table} BEGIN {add} END')
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {counter}_delete AFTER DELETE ON {table} BEGIN {remove} END')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {counter}_update AFTER UPDATE OF location ON {table}
+            WHEN {location.format('old')} IS NOT {location.format('new')} BEGIN {remove} {add} END
+        ''')
+
+
+def fts5_trigram_available(conn):
+    """True when this SQLite build has FTS5 with the trigram tokenizer (3.34+)."""
+    try:
+        conn.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x, tokenize='trigram')")
+        conn.execute('DROP TABLE temp.fts5_probe')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# (version, description, apply): append only, never renumber
+MIGRATIONS = [
+    (1, "baseline tables", _baseline),
+    (2, "canonical users table", _canonical_users),
+    (3, "listing and login-history indexes", _listing_indexes),
+    (4, "product full-text search", _product_search),
+    (5, "trigger-maintained statistics counters", _stats_counters),
+]
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute('SELECT version FROM schema_version')}
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply pending migrations in order; returns the versions applied."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at REAL NOT NULL
+        )
+    ''')
+    conn.commit()
+    applied = []
+    for version, description, apply in migrations:
+        if version in applied_versions(conn):
+            continue
+        # IMMEDIATE takes the write lock first, so two processes starting
+        # together cannot both apply the same migration
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version not in applied_versions(conn):
+                apply(conn)
+                conn.execute('INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)',
+                             (version, description, time.time()))
+                applied.append(version)
+                logger.info("Schema migration %d: %s", version, description)
+            conn.commit()
+        except MigrationDeferred as e:
+            conn.rollback()
+            logger.warning("Schema migration %d deferred: %s", version, e)
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
@@ -0,0 +1,197 @@
+"""
+Health-aware model router for Krishi Mitra
+Picks the fastest healthy Gemini model and keeps per-model statistics
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+TRANSIENT_CODES = {500, 502, 503, 504}
+
+
+def _error_code(error):
+    code = getattr(error, 'code', None)
+    if callable(code):
+        try:
+            code = code()
+        except Exception:
+            code = None
+    return code if isinstance(code, int) else None
+
+
+def is_quota_error(error):
+    """True for 429 / quota exhaustion errors from the Gemini API."""
+    error_str = str(error).lower()
+    return _error_code(error) == 429 or "429" in error_str or "quota" in error_str
+
+
+def is_transient_error(error):
+    """True for server-side errors that another model may not hit."""
+    error_str = str(error).lower()
+    return (_error_code(error) in TRANSIENT_CODES
+            or "503" in error_str or "deadline" in error_str or "unavailable" in error_str)
+
+
+def _today():
+    return datetime.now(timezone.utc).date()
+
+
+class ModelStats:
+    """Rolling latency/error statistics and circuit state for one model."""
+
+    def __init__(self, name, window=50):
+        self.name = name
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self.quota_day = _today()
+        self.requests_today = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.quota_errors = 0
+
+    def latency_percentile(self, pct):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def snapshot(self):
+        return {
+            'state': self.state,
+            'open_until': self.open_until,
+            'p50_latency': self.latency_percentile(50),
+            'p90_latency': self.latency_percentile(90),
+            'error_rate': round(self.error_rate(), 3),
+            'consecutive_failures': self.consecutive_failures,
+            'requests_today': self.requests_today,
+            'total_requests': self.total_requests,
+            'total_failures': self.total_failures,
+            'quota_errors': self.quota_errors,
+        }
+
+
+class ModelRouter:
+    """Thread-safe router with circuit breakers and daily quota accounting."""
+
+    def __init__(self, model_names, model_factory, daily_limit=None,
+                 failure_threshold=3, cooldown_seconds=60, quota_cooldown_seconds=60):
+        self.model_names = list(model_names)
+        self.model_factory = model_factory
+        self.daily_limit = daily_limit
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.quota_cooldown_seconds = quota_cooldown_seconds
+        self.stats = {name: ModelStats(name) for name in self.model_names}
+        self._handles = {}
+        self._lock = threading.Lock()
+
+    def handle(self, model_name):
+        """Return a reusable model handle, creating it on first use."""
+        with self._lock:
+            if model_name not in self._handles:
+                self._handles[model_name] = self.model_factory(model_name)
+            return self._handles[model_name]
+
+    def _roll_day(self, stats):
+        today = _today()
+        if stats.quota_day != today:
+            stats.quota_day = today
+            stats.requests_today = 0
+
+    def _available(self, stats, now):
+        self._roll_day(stats)
+        if self.daily_limit is not None and stats.requests_today >= self.daily_limit:
+            return False
+        if stats.state == OPEN:
+            if now < stats.open_until:
+                return False
+            stats.state = HALF_OPEN
+            stats.trial_in_flight = False
+            logger.info("Model %s circuit half-open", stats.name)
+        if stats.state == HALF_OPEN and stats.trial_in_flight:
+            return False
+        return True
+
+    def candidates(self):
+        """Healthy models ordered fastest first; untried models are explored first."""
+        now = time.time()
+        with self._lock:
+            ranked = []
+            for order, name in enumerate(self.model_names):
+                stats = self.stats[name]
+                if self._available(stats, now):
+                    latency = stats.latency_percentile(50) or 0.0
+                    ranked.append((latency, order, name))
+            return [name for _, _, name in sorted(ranked)]
+
+    def acquire(self, model_name):
+        """Reserve a request slot on a model; False if it became unavailable."""
+        now = time.time()
+        with self._lock:
+            stats = self.stats[model_name]
+            if not self._available(stats, now):
+                return False
+            if stats.state == HALF_OPEN:
+                stats.trial_in_flight = True
+            stats.requests_today += 1
+            stats.total_requests += 1
+            return True
+
+    def record_success(self, model_name, latency=None):
+        with self._lock:
+            stats = self.stats[model_name]
+            if latency is not None:
+                stats.latencies.append(latency)
+            stats.outcomes.append(1)
+            stats.consecutive_failures = 0
+            if stats.state != CLOSED:
+                logger.info("Model %s circuit closed", model_name)
+            stats.state = CLOSED
+            stats.trial_in_flight = False
+
+    def record_failure(self, model_name, quota=False):
+        with self._lock:
+            stats = self.stats[model_name]
+            stats.outcomes.append(0)
+            stats.total_failures += 1
+            stats.consecutive_failures += 1
+            stats.trial_in_flight = False
+            if quota:
+                stats.quota_errors += 1
+                self._open(stats, self.quota_cooldown_seconds)
+            elif stats.state == HALF_OPEN or stats.consecutive_failures >= self.failure_threshold:
+                self._open(stats, self.cooldown_seconds)
+
+    def release(self, model_name):
+        """Release a reservation that ended without a health signal."""
+        with self._lock:
+            self.stats[model_name].trial_in_flight = False
+
+    def _open(self, stats, cooldown):
+        stats.state = OPEN
+        stats.open_until = time.time() + cooldown
+        logger.warning("Model %s circuit open for %ss", stats.name, cooldown)
+
+    def snapshot(self):
+        """Per-model routing state for dashboards and logs."""
+        with self._lock:
+            return {name: self.stats[name].snapshot() for name in self.model_names}
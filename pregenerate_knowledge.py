@@ -0,0 +1,138 @@
+"""
+Batch pre-generation of the knowledge corpus for Krishi Mitra
+Run: python pregenerate_knowledge.py --kind crops --workers 4
+     python pregenerate_knowledge.py --kind schemes
+
+Generates crop knowledge or structured scheme records in every supported
+language and stores them in the versioned knowledge store read by the Crop
+Knowledge and Schemes pages. Finished documents are committed one by one, so
+an interrupted run resumes where it stopped.
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import (
+    SUPPORTED_LANGUAGES, KNOWLEDGE_DB_PATH, CROP_CORPUS_VERSION, SCHEME_KB_VERSION
+)
+from knowledge_store import KnowledgeStore
+from scheme_kb import SCHEMES, SCHEMES_BY_ID, scheme_prompt, parse_scheme_record, SchemeKnowledgeBase
+
+DEFAULT_CROPS = [
+    'Rice', 'Wheat', 'Cotton', 'Sugarcane', 'Soybean', 'Maize', 'Tomato', 'Onion',
+    'Potato', 'Groundnut', 'Chickpea', 'Pigeon Pea', 'Mustard', 'Banana', 'Chilli',
+    'Turmeric', 'Jowar', 'Bajra', 'Grapes', 'Pomegranate'
+]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate the knowledge corpus")
+    parser.add_argument('--kind', choices=['crops', 'schemes'], default='crops',
+                        help="Which corpus to generate")
+    parser.add_argument('--crops', help="Comma-separated crop names (default: built-in list)")
+    parser.add_argument('--crops-file', help="File with one crop name per line")
+    parser.add_argument('--schemes', help="Comma-separated scheme ids (default: all known schemes)")
+    parser.add_argument('--languages', default=','.join(SUPPORTED_LANGUAGES),
+                        help="Comma-separated language codes (default: all supported)")
+    parser.add_argument('--version', type=int,
+                        help="Corpus version to write (default: the active version)")
+    parser.add_argument('--workers', type=int, default=4, help="Parallel generation requests")
+    parser.add_argument('--retries', type=int, default=2, help="Retries per failed document")
+    parser.add_argument('--db', default=KNOWLEDGE_DB_PATH, help="Knowledge store path")
+    return parser.parse_args(argv)
+
+
+def load_crops(args):
+    if args.crops_file:
+        with open(args.crops_file, encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    if args.crops:
+        return [crop.strip() for crop in args.crops.split(',') if crop.strip()]
+    return list(DEFAULT_CROPS)
+
+
+def load_schemes(args):
+    if args.schemes:
+        return [scheme_id.strip() for scheme_id in args.schemes.split(',') if scheme_id.strip()]
+    return [scheme['id'] for scheme in SCHEMES]
+
+
+def generate_with_retries(ai, prompt, retries, parse=None):
+    """Generate live, bypassing caches so the corpus is fresh."""
+    from ai_service import LocalAnswer, is_error_response
+
+    error = None
+    for attempt in range(retries + 1):
+        response = ai._try_generate(prompt)
+        if is_error_response(response):
+            error = response
+        elif isinstance(response, LocalAnswer):
+            # The corpus is served for months; a stopgap local answer is not good enough
+            error = "Gemini unavailable; only the local fallback model answered"
+        else:
+            try:
+                return parse(response) if parse else response
+            except ValueError as e:
+                error = str(e)
+        if attempt < retries:
+            time.sleep(2 ** attempt)
+    raise RuntimeError(error)
+
+
+def generate_crop(ai, store, version, crop, language, retries):
+    content = generate_with_retries(ai, ai._crop_knowledge_prompt(crop, language), retries)
+    store.put('crop', crop, language, version, content, title=crop)
+
+
+def generate_scheme(ai, store, version, scheme_id, language, retries):
+    prompt = scheme_prompt(SCHEMES_BY_ID[scheme_id], SUPPORTED_LANGUAGES.get(language, 'English'))
+    record = generate_with_retries(ai, prompt, retries, parse=parse_scheme_record)
+    SchemeKnowledgeBase(store, version).put_record(scheme_id, language, record)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    from ai_service import KrishiAI
+
+    store = KnowledgeStore(args.db)
+    if args.kind == 'schemes':
+        kind, items, generate = 'scheme', load_schemes(args), generate_scheme
+        version = args.version or SCHEME_KB_VERSION
+    else:
+        kind, items, generate = 'crop', load_crops(args), generate_crop
+        version = args.version or CROP_CORPUS_VERSION
+    languages = [lang.strip() for lang in args.languages.split(',') if lang.strip()]
+
+    # The store doubles as the checkpoint: anything already there is skipped
+    pending = [(item, lang) for item in items for lang in languages
+               if not store.has(kind, item, lang, version)]
+    total = len(items) * len(languages)
+    print(f"{args.kind} v{version}: {total - len(pending)}/{total} done, {len(pending)} to generate")
+    if not pending:
+        return 0
+
+    ai = KrishiAI()
+    failures = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        futures = {pool.submit(generate, ai, store, version, item, lang, args.retries): (item, lang)
+                   for item, lang in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            item, lang = futures[future]
+            try:
+                future.result()
+                print(f"[{done}/{len(pending)}] {item} ({lang}) stored")
+            except Exception as e:
+                failures += 1
+                print(f"[{done}/{len(pending)}] {item} ({lang}) failed: {e}", file=sys.stderr)
+
+    if failures:
+        print(f"Finished with {failures} failures; rerun to retry them")
+        return 1
+    print("Finished")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
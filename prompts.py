@@ -0,0 +1,175 @@
+"""
+Prompt templates for Krishi Mitra AI calls
+Templates are compacted once, user inputs are trimmed to a per-method token
+budget, and tokens sent and received are counted per call
+"""
+
+import logging
+import re
+import textwrap
+import threading
+
+from config import SUPPORTED_LANGUAGES
+from diagnosis import DIAGNOSIS_GENERATION_CONFIG, DIAGNOSES_GENERATION_CONFIG
+
+logger = logging.getLogger(__name__)
+
+_ASCII = re.compile(r'[\x00-\x7f]')
+
+
+def language_name(code):
+    return SUPPORTED_LANGUAGES.get(code, 'English')
+
+
+def count_tokens(text):
+    """Local token estimate: ~4 ASCII characters per token, ~2 per Indic character."""
+    text = text or ''
+    ascii_chars = len(_ASCII.findall(text))
+    return max(1, round(ascii_chars / 4 + (len(text) - ascii_chars) / 2))
+
+
+def compact(text):
+    """Strip indentation and trailing space and drop blank lines."""
+    lines = (line.strip() for line in textwrap.dedent(str(text)).splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to at most max_tokens, keeping the start."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 1:
+        return ''
+    # Binary search on length: the estimate is monotonic in the prefix
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) + 1 <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low].rstrip() + '…'
+
+
+class Prompt(str):
+    """Prompt text that remembers its template name, token count and generation config."""
+
+    def __new__(cls, text, name, generation_config=None):
+        prompt = super().__new__(cls, text)
+        prompt.name = name
+        prompt.tokens = count_tokens(text)
+        prompt.generation_config = generation_config
+        return prompt
+
+
+class PromptTemplate:
+    """A compacted template whose `shrinkable` fields are trimmed to fit a budget.
+
+    Fields are trimmed in the order given, so list the least important first.
+    """
+
+    def __init__(self, name, text, shrinkable=(), generation_config=None):
+        self.name = name
+        self.text = compact(text)
+        self.shrinkable = shrinkable
+        self.generation_config = generation_config
+
+    def render(self, budget=None, **fields):
+        values = {key: compact(value) for key, value in fields.items()}
+        text = self.text.format(**values)
+        for field in self.shrinkable:
+            excess = count_tokens(text) - budget if budget else 0
+            if excess <= 0:
+                break
+            keep = max(0, count_tokens(values[field]) - excess)
+            values[field] = truncate_to_tokens(values[field], keep)
+            text = self.text.format(**values)
+        # Empty optional fields would leave blank lines behind
+        return Prompt(compact(text), self.name, self.generation_config)
+
+
+FARMING = PromptTemplate('get_farming_response', """
+    You are Krishi Mitra, an expert agricultural advisor for Indian farmers.
+    Respond ONLY in {language} language.
+    {context}
+    Farmer's Question: {query}
+    """, shrinkable=('context', 'query'))
+
+CROP_IMAGE = PromptTemplate('analyze_crop_image', """
+    You are an agricultural expert. Analyze this crop image.
+    Farmer's context: {farmer_query}
+    Reply with JSON only: identify the crop, score its health, list each
+    disease or pest with your confidence, then treatments and care tips.
+    Write all text values in {language} language; keep the keys in English.
+    """, shrinkable=('farmer_query',), generation_config=DIAGNOSIS_GENERATION_CONFIG)
+
+CROP_IMAGES = PromptTemplate('analyze_crop_images', """
+    You are an agricultural expert. Analyze each of the {count} crop images below separately.
+    Farmer's context: {farmer_query}
+    Reply with a JSON array holding one diagnosis per image, with "image" set to
+    the number in the marker before it: identify the crop, score its health,
+    list each disease or pest with your confidence, then treatments and care tips.
+    Write all text values in {language} language; keep the keys in English.
+    """, shrinkable=('farmer_query',), generation_config=DIAGNOSES_GENERATION_CONFIG)
+
+CROP_KNOWLEDGE = PromptTemplate('generate_crop_knowledge', """
+    You are an agricultural expert. Provide complete information about {crop_name}.
+    Respond entirely in {language} language.
+    Include:
+    - Crop overview
+    - Complete lifecycle
+    - Seasonal calendar
+    - Input requirements
+    - Economics
+    - Best practices
+    """, shrinkable=('crop_name',))
+
+SCHEME = PromptTemplate('get_government_scheme_info', """
+    You are a government scheme expert for Indian agriculture.
+    Respond in {language} language.
+    Query: {query}
+    Provide:
+    - Scheme overview
+    - Eligibility criteria
+    - Benefits
+    - Application process
+    - Contact information
+    """, shrinkable=('query',))
+
+SCHEME_RECORD = PromptTemplate('scheme_record', """
+    You are a government scheme expert for Indian agriculture.
+    Describe the scheme "{name}" ({full_name}).
+    Write every value in {language} language.
+    Respond with ONLY a JSON object with these string keys:
+    {fields}.
+    Use short bullet lines separated by newlines inside each value.
+    """)
+
+CONVERSATION_SUMMARY = PromptTemplate('summarize_conversation', """
+    Summarize this farming conversation so follow-up questions can be answered.
+    Keep crops, locations, symptoms, quantities and advice already given.
+    Use at most 120 words, in English.
+    Earlier summary: {summary}
+    New messages:
+    {transcript}
+    """, shrinkable=('transcript', 'summary'))
+
+
+class TokenUsage:
+    """Running totals of tokens sent and received per prompt template."""
+
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, sent, received):
+        with self._lock:
+            totals = self.totals.setdefault(name, {'calls': 0, 'sent': 0, 'received': 0})
+            totals['calls'] += 1
+            totals['sent'] += sent
+            totals['received'] += received
+        logger.info("%s: %d tokens sent, %d received", name, sent, received)
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(totals) for name, totals in self.totals.items()}
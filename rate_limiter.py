@@ -0,0 +1,216 @@
+"""
+Global rate limiting and fair scheduling for Krishi Mitra AI calls
+One API key is shared by every Streamlit session, so requests pass through a
+token bucket sized to the key's RPM/TPM limits and are granted to sessions in
+deficit round-robin order
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+
+current_session = contextvars.ContextVar('krishi_session', default='anonymous')
+wait_callback = contextvars.ContextVar('krishi_wait_callback', default=None)
+
+
+def set_request_context(session_id, on_wait=None):
+    """Tag AI calls made from this context with a session and a wait reporter."""
+    current_session.set(session_id or 'anonymous')
+    wait_callback.set(on_wait)
+
+
+class TokenBucket:
+    """Continuously refilling bucket; not thread-safe on its own."""
+
+    def __init__(self, per_minute, clock=time.monotonic):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        self._refill()
+        return self.tokens
+
+    def can_consume(self, amount):
+        return self.available() >= min(amount, self.capacity)
+
+    def consume(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def time_until(self, amount):
+        """Seconds until `amount` tokens are available."""
+        missing = min(amount, self.capacity) - self.available()
+        return max(0.0, missing / self.rate) if self.rate else float('inf')
+
+
+class _Ticket:
+    __slots__ = ('session', 'cost', 'granted')
+
+    def __init__(self, session, cost):
+        self.session = session
+        self.cost = cost
+        self.granted = False
+
+
+class FairScheduler:
+    """Grants AI calls within RPM/TPM limits, round-robin across sessions."""
+
+    def __init__(self, requests_per_minute, tokens_per_minute, quantum=1000, clock=time.monotonic):
+        self.requests = TokenBucket(requests_per_minute, clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock)
+        self.quantum = quantum
+        self.clock = clock
+        self._queues = {}
+        self._deficit = {}
+        self._active = deque()
+        self._cond = threading.Condition()
+        self.granted = 0
+        self.timed_out = 0
+
+    def _dispatch(self):
+        """Grant queued tickets while the buckets allow; returns True if any granted."""
+        progressed = False
+        while self._active:
+            session = self._active[0]
+            queue = self._queues[session]
+            ticket = queue[0]
+            if self._deficit[session] < ticket.cost:
+                # This session's turn is over; the next one starts its turn
+                # with a fresh quantum
+                self._active.rotate(-1)
+                self._deficit[self._active[0]] += self.quantum
+                continue
+            if not (self.requests.can_consume(1) and self.tokens.can_consume(ticket.cost)):
+                break
+            self.requests.consume(1)
+            self.tokens.consume(ticket.cost)
+            queue.popleft()
+            ticket.granted = True
+            self.granted += 1
+            progressed = True
+            self._deficit[session] -= ticket.cost
+            if not queue:
+                self._drop_session(session)
+        return progressed
+
+    def _drop_session(self, session):
+        head = self._active[0] == session
+        del self._queues[session]
+        del self._deficit[session]
+        self._active.remove(session)
+        if head and self._active:
+            self._deficit[self._active[0]] += self.quantum
+
+    def _position(self, ticket):
+        queue = self._queues.get(ticket.session)
+        if not queue or ticket not in queue:
+            return 0
+        rounds = queue.index(ticket) + 1
+        return sum(min(len(other), rounds) for other in self._queues.values())
+
+    def _refill_wait(self, ticket):
+        return max(self.requests.time_until(1), self.tokens.time_until(ticket.cost))
+
+    def queue_status(self, position):
+        """Expected wait in seconds for a ticket at `position`."""
+        ahead = max(0.0, position - self.requests.available())
+        return ahead / self.requests.rate if self.requests.rate else float('inf')
+
+    def _withdraw(self, ticket):
+        queue = self._queues.get(ticket.session)
+        if queue is not None and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                self._drop_session(ticket.session)
+            self._cond.notify_all()
+
+    def acquire(self, session, cost, timeout=60.0, on_wait=None):
+        """Block until this session may send a request of `cost` tokens.
+
+        on_wait(position, expected_wait_seconds) is called while queued and
+        once with (0, 0) after a wait ends. Returns False on timeout.
+        """
+        ticket = _Ticket(session, cost)
+        deadline = self.clock() + timeout
+        waited = False
+        with self._cond:
+            if session not in self._queues:
+                self._queues[session] = deque()
+                self._deficit[session] = 0
+                self._active.append(session)
+            self._queues[session].append(ticket)
+
+        try:
+            while True:
+                with self._cond:
+                    if self._dispatch():
+                        self._cond.notify_all()
+                    if ticket.granted:
+                        break
+                    if self.clock() >= deadline:
+                        self._withdraw(ticket)
+                        self.timed_out += 1
+                        break
+                    position = self._position(ticket)
+                    expected_wait = self.queue_status(position)
+                if on_wait:
+                    # Outside the lock: Streamlit callbacks may block or raise
+                    # RerunException, which must not stall the other sessions
+                    waited = True
+                    self._report(on_wait, position, expected_wait)
+                with self._cond:
+                    if self._dispatch():
+                        self._cond.notify_all()
+                    if not ticket.granted:
+                        remaining = max(0.0, deadline - self.clock())
+                        self._cond.wait(min(remaining, max(0.05, self._refill_wait(ticket))))
+        finally:
+            # An exception escaping on_wait must not leave the ticket queued,
+            # or a later dispatch would grant capacity nobody uses
+            with self._cond:
+                if not ticket.granted:
+                    self._withdraw(ticket)
+
+        if waited:
+            self._report(on_wait, 0, 0.0)
+        return ticket.granted
+
+    def try_acquire(self, cost):
+        """Take capacity immediately without queueing, e.g. for hedged calls."""
+        with self._cond:
+            if self._active:
+                return False
+            if self.requests.can_consume(1) and self.tokens.can_consume(cost):
+                self.requests.consume(1)
+                self.tokens.consume(cost)
+                self.granted += 1
+                return True
+            return False
+
+    @staticmethod
+    def _report(on_wait, position, expected_wait):
+        try:
+            on_wait(position, expected_wait)
+        except Exception:
+            # Reporting must never break the request itself
+            pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queued': sum(len(queue) for queue in self._queues.values()),
+                'sessions_waiting': len(self._queues),
+                'granted': self.granted,
+                'timed_out': self.timed_out,
+                'requests_available': round(self.requests.available(), 2),
+                'tokens_available': round(self.tokens.available()),
+            }
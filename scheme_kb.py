@@ -0,0 +1,217 @@
+"""
+Structured government scheme knowledge base for Krishi Mitra
+Scheme records are generated offline per language, stored in the versioned
+knowledge store and looked up by normalized name or alias before any live call
+"""
+
+import json
+import re
+import unicodedata
+
+import prompts
+
+SCHEME_FIELDS = ('overview', 'eligibility', 'benefits', 'process', 'contacts')
+
+# Section headings by language, like the records themselves; missing ones fall back to English
+SCHEME_FIELD_TITLES = {
+    'en': {
+        'overview': 'Scheme overview',
+        'eligibility': 'Eligibility criteria',
+        'benefits': 'Benefits',
+        'process': 'Application process',
+        'contacts': 'Contact information',
+    },
+    'mr': {
+        'overview': 'योजनेची माहिती',
+        'eligibility': 'पात्रता निकष',
+        'benefits': 'लाभ',
+        'process': 'अर्ज प्रक्रिया',
+        'contacts': 'संपर्क माहिती',
+    },
+    'hi': {
+        'overview': 'योजना का परिचय',
+        'eligibility': 'पात्रता मानदंड',
+        'benefits': 'लाभ',
+        'process': 'आवेदन प्रक्रिया',
+        'contacts': 'संपर्क जानकारी',
+    },
+    'gu': {
+        'overview': 'યોજનાની ઝાંખી',
+        'eligibility': 'પાત્રતા માપદંડ',
+        'benefits': 'લાભો',
+        'process': 'અરજી પ્રક્રિયા',
+        'contacts': 'સંપર્ક માહિતી',
+    },
+    'ta': {
+        'overview': 'திட்ட கண்ணோட்டம்',
+        'eligibility': 'தகுதி அளவுகோல்கள்',
+        'benefits': 'பலன்கள்',
+        'process': 'விண்ணப்ப செயல்முறை',
+        'contacts': 'தொடர்பு தகவல்',
+    },
+    'te': {
+        'overview': 'పథకం అవలోకనం',
+        'eligibility': 'అర్హత ప్రమాణాలు',
+        'benefits': 'ప్రయోజనాలు',
+        'process': 'దరఖాస్తు ప్రక్రియ',
+        'contacts': 'సంప్రదింపు సమాచారం',
+    },
+    'kn': {
+        'overview': 'ಯೋಜನೆಯ ಅವಲೋಕನ',
+        'eligibility': 'ಅರ್ಹತಾ ಮಾನದಂಡಗಳು',
+        'benefits': 'ಪ್ರಯೋಜನಗಳು',
+        'process': 'ಅರ್ಜಿ ಪ್ರಕ್ರಿಯೆ',
+        'contacts': 'ಸಂಪರ್ಕ ಮಾಹಿತಿ',
+    },
+}
+
+SCHEMES = [
+    {
+        'id': 'pm-kisan',
+        'name': 'PM-KISAN',
+        'full_name': 'Pradhan Mantri Kisan Samman Nidhi',
+        'aliases': ['pm kisan', 'pmkisan', 'kisan samman nidhi', 'पीएम किसान', 'किसान सम्मान निधि'],
+    },
+    {
+        'id': 'soil-health-card',
+        'name': 'Soil Health Card',
+        'full_name': 'Soil Health Card Scheme',
+        'aliases': ['shc', 'soil card', 'मृदा स्वास्थ्य कार्ड', 'मृद आरोग्य पत्रिका'],
+    },
+    {
+        'id': 'kcc',
+        'name': 'KCC',
+        'full_name': 'Kisan Credit Card',
+        'aliases': ['kisan credit card', 'किसान क्रेडिट कार्ड'],
+    },
+    {
+        'id': 'pmfby',
+        'name': 'PMFBY',
+        'full_name': 'Pradhan Mantri Fasal Bima Yojana',
+        'aliases': ['fasal bima', 'crop insurance', 'फसल बीमा', 'पीक विमा'],
+    },
+    {
+        'id': 'midh',
+        'name': 'MIDH',
+        'full_name': 'Mission for Integrated Development of Horticulture',
+        'aliases': ['horticulture mission'],
+    },
+    {
+        'id': 'nmoop',
+        'name': 'NMOOP',
+        'full_name': 'National Mission on Oilseeds and Oil Palm',
+        'aliases': ['oilseeds mission', 'oil palm mission'],
+    },
+    {
+        'id': 'pmksy',
+        'name': 'PMKSY',
+        'full_name': 'Pradhan Mantri Krishi Sinchayee Yojana',
+        'aliases': ['krishi sinchayee', 'per drop more crop', 'drip irrigation subsidy'],
+    },
+    {
+        'id': 'pm-kusum',
+        'name': 'PM-KUSUM',
+        'full_name': 'Pradhan Mantri Kisan Urja Suraksha evam Utthan Mahabhiyan',
+        'aliases': ['kusum', 'solar pump scheme'],
+    },
+    {
+        'id': 'e-nam',
+        'name': 'e-NAM',
+        'full_name': 'National Agriculture Market',
+        'aliases': ['enam', 'national agriculture market'],
+    },
+    {
+        'id': 'pkvy',
+        'name': 'PKVY',
+        'full_name': 'Paramparagat Krishi Vikas Yojana',
+        'aliases': ['organic farming scheme', 'paramparagat krishi'],
+    },
+]
+
+
+def alias_key(text):
+    """Collapse case, spacing and punctuation so 'PM-Kisan' matches 'pmkisan'."""
+    text = unicodedata.normalize('NFKC', str(text or '')).casefold()
+    return re.sub(r'[\W_]+', '', text)
+
+
+def _build_alias_index():
+    index = {}
+    for scheme in SCHEMES:
+        for name in [scheme['id'], scheme['name'], scheme['full_name']] + scheme['aliases']:
+            index[alias_key(name)] = scheme['id']
+    return index
+
+
+ALIAS_INDEX = _build_alias_index()
+SCHEMES_BY_ID = {scheme['id']: scheme for scheme in SCHEMES}
+
+
+def resolve_scheme(query):
+    """Return the scheme id a query names, or None for long-tail questions."""
+    return ALIAS_INDEX.get(alias_key(query))
+
+
+def scheme_prompt(scheme, lang_name):
+    """Prompt asking for one scheme as a JSON record."""
+    return prompts.SCHEME_RECORD.render(
+        name=scheme['name'], full_name=scheme['full_name'], language=lang_name,
+        fields=', '.join(f'"{field}"' for field in SCHEME_FIELDS)
+    )
+
+
+def parse_scheme_record(text):
+    """Parse and validate a generated JSON record; raises ValueError if malformed."""
+    text = text.strip()
+    fenced = re.search(r'```(?:json)?\s*(.*?)```', text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end == -1:
+        raise ValueError("No JSON object in scheme response")
+    record = json.loads(text[start:end + 1])
+    missing = [field for field in SCHEME_FIELDS if not str(record.get(field, '')).strip()]
+    if missing:
+        raise ValueError(f"Scheme record missing fields: {', '.join(missing)}")
+    return {field: str(record[field]).strip() for field in SCHEME_FIELDS}
+
+
+def render_scheme(scheme_id, record, language='en'):
+    """Render a structured record as markdown for the Schemes page."""
+    scheme = SCHEMES_BY_ID[scheme_id]
+    titles = SCHEME_FIELD_TITLES.get(language, {})
+    lines = [f"### {scheme['name']} — {scheme['full_name']}"]
+    for field in SCHEME_FIELDS:
+        title = titles.get(field, SCHEME_FIELD_TITLES['en'][field])
+        lines.append(f"\n**{title}**\n\n{record[field]}")
+    return '\n'.join(lines)
+
+
+class SchemeKnowledgeBase:
+    """Looks up pre-generated scheme records in the knowledge store."""
+
+    def __init__(self, store, version):
+        self.store = store
+        self.version = version
+
+    def get_record(self, query, language):
+        """Return (scheme_id, record) for a known scheme, or (None, None)."""
+        scheme_id = resolve_scheme(query)
+        if scheme_id is None:
+            return None, None
+        content = self.store.get('scheme', scheme_id, language, self.version)
+        if content is None:
+            return scheme_id, None
+        return scheme_id, json.loads(content)
+
+    def answer(self, query, language):
+        """Rendered markdown for a known, pre-generated scheme, else None."""
+        scheme_id, record = self.get_record(query, language)
+        if record is None:
+            return None
+        return render_scheme(scheme_id, record, language)
+
+    def put_record(self, scheme_id, language, record):
+        self.store.put('scheme', scheme_id, language, self.version,
+                       json.dumps(record, ensure_ascii=False),
+                       title=SCHEMES_BY_ID[scheme_id]['name'])
@@ -0,0 +1,491 @@
+"""
+Semantic near-duplicate cache for Krishi Mitra AI answers
+Embeds queries locally on CPU and matches them by cosine similarity
+"""
+
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+
+import numpy as np
+
+EMBEDDING_DIM = 256
+EMBEDDING_VERSION = 2
+
+# Indic scripts share the ISCII layout, so offsets inside each Unicode block
+# line up phonetically. Every script is folded onto this Latin table.
+INDIC_BLOCKS = [
+    (0x0900, 0x097F),  # Devanagari (Hindi, Marathi)
+    (0x0A80, 0x0AFF),  # Gujarati
+    (0x0B80, 0x0BFF),  # Tamil
+    (0x0C00, 0x0C7F),  # Telugu
+    (0x0C80, 0x0CFF),  # Kannada
+]
+
+INDIC_VOWELS = {
+    0x05: 'a', 0x06: 'a', 0x07: 'i', 0x08: 'i', 0x09: 'u', 0x0A: 'u',
+    0x0B: 'ri', 0x0C: 'li', 0x0D: 'e', 0x0E: 'e', 0x0F: 'e', 0x10: 'ai',
+    0x11: 'o', 0x12: 'o', 0x13: 'o', 0x14: 'au'
+}
+
+INDIC_CONSONANTS = {
+    0x15: 'k', 0x16: 'kh', 0x17: 'g', 0x18: 'gh', 0x19: 'n',
+    0x1A: 'ch', 0x1B: 'chh', 0x1C: 'j', 0x1D: 'jh', 0x1E: 'n',
+    0x1F: 't', 0x20: 'th', 0x21: 'd', 0x22: 'dh', 0x23: 'n',
+    0x24: 't', 0x25: 'th', 0x26: 'd', 0x27: 'dh', 0x28: 'n', 0x29: 'n',
+    0x2A: 'p', 0x2B: 'ph', 0x2C: 'b', 0x2D: 'bh', 0x2E: 'm',
+    0x2F: 'y', 0x30: 'r', 0x31: 'r', 0x32: 'l', 0x33: 'l', 0x34: 'l', 0x35: 'v',
+    0x36: 'sh', 0x37: 'sh', 0x38: 's', 0x39: 'h',
+    0x58: 'q', 0x59: 'kh', 0x5A: 'g', 0x5B: 'z', 0x5C: 'd', 0x5D: 'rh', 0x5E: 'f', 0x5F: 'y'
+}
+
+INDIC_MATRAS = {
+    0x3E: 'a', 0x3F: 'i', 0x40: 'i', 0x41: 'u', 0x42: 'u', 0x43: 'ri', 0x44: 'ri',
+    0x45: 'e', 0x46: 'e', 0x47: 'e', 0x48: 'ai', 0x49: 'o', 0x4A: 'o', 0x4B: 'o', 0x4C: 'au'
+}
+
+INDIC_SIGNS = {0x01: 'n', 0x02: 'n', 0x03: 'h'}
+VIRAMA = 0x4D
+NUKTA = 0x3C
+
+STOPWORDS = {
+    'a', 'an', 'the', 'to', 'in', 'for', 'of', 'on', 'and', 'or', 'is', 'are',
+    'how', 'what', 'which', 'best', 'my', 'do', 'i', 'can', 'with',
+    # Romanized Hindi/Marathi particles, as typed and as romanize() spells them
+    'me', 'men', 'mein', 'ki', 'ka', 'ke', 'ko', 'se', 'hai', 'hain', 'he',
+    'meri', 'mera', 'mere', 'aur', 'par', 'pe', 'liye', 'lie', 'la', 'chi', 'cha', 'che',
+    'kya', 'kaise', 'kese', 'kaisa', 'kasa', 'kashi'
+}
+
+# Words that flip or pin down the answer: a near-duplicate must agree on all of
+# them, however close the rest of the question is
+NEGATIONS = {
+    'not', 'no', 'never', 'without', 'avoid', 'dont', 'don', 'nahi', 'nahin',
+    'nahim', 'mat', 'na', 'bina', 'nako', 'naka', 'nahee'
+}
+
+UNITS = {
+    'acre': 'acre', 'acres': 'acre', 'ekad': 'acre', 'ekar': 'acre', 'ekkar': 'acre',
+    'hectare': 'hectare', 'hectares': 'hectare', 'ha': 'hectare', 'hektar': 'hectare',
+    'hektayar': 'hectare', 'bigha': 'bigha', 'guntha': 'guntha', 'gunta': 'guntha',
+    'kg': 'kg', 'kgs': 'kg', 'kilo': 'kg', 'kilogram': 'kg', 'kilograms': 'kg', 'kilogramam': 'kg',
+    'g': 'gram', 'gm': 'gram', 'gram': 'gram', 'grams': 'gram', 'graam': 'gram',
+    'l': 'litre', 'ltr': 'litre', 'litre': 'litre', 'liter': 'litre', 'litres': 'litre',
+    'liters': 'litre', 'litar': 'litre', 'ml': 'ml', 'quintal': 'quintal', 'kvintal': 'quintal',
+    'kwintal': 'quintal', 'ton': 'tonne', 'tonne': 'tonne', 'bag': 'bag', 'bags': 'bag',
+    'bori': 'bag', 'day': 'day', 'days': 'day', 'din': 'day', 'divas': 'day', 'week': 'week', 'weeks': 'week', 'hafta': 'week', 'month': 'month',
+    'months': 'month', 'mahina': 'month'
+}
+
+# Crop names across languages, spelled as typed and as romanize() folds them
+CROPS = {
+    'wheat': 'wheat', 'gehu': 'wheat', 'gehun': 'wheat', 'gehoon': 'wheat', 'gahu': 'wheat',
+    'gavh': 'wheat', 'gavha': 'wheat', 'ghaun': 'wheat', 'ghau': 'wheat',
+    'rice': 'rice', 'paddy': 'rice', 'dhan': 'rice', 'dhaan': 'rice', 'chaval': 'rice',
+    'chawal': 'rice', 'bhat': 'rice', 'bhata': 'rice', 'bhaat': 'rice', 'nel': 'rice',
+    'cotton': 'cotton', 'kapas': 'cotton', 'kapus': 'cotton', 'kapaas': 'cotton', 'hatti': 'cotton',
+    'sugarcane': 'sugarcane', 'ganna': 'sugarcane', 'ganne': 'sugarcane', 'us': 'sugarcane',
+    'oos': 'sugarcane', 'karumbu': 'sugarcane', 'cheraku': 'sugarcane', 'kabbu': 'sugarcane',
+    'soybean': 'soybean', 'soyabean': 'soybean', 'soyabin': 'soybean', 'soybin': 'soybean',
+    'tomato': 'tomato', 'tamatar': 'tomato', 'tometo': 'tomato', 'takkali': 'tomato',
+    'onion': 'onion', 'pyaj': 'onion', 'pyaz': 'onion', 'kanda': 'onion',
+    'potato': 'potato', 'aalu': 'potato', 'alu': 'potato', 'batata': 'potato',
+    'maize': 'maize', 'corn': 'maize', 'makka': 'maize', 'makai': 'maize',
+    'chickpea': 'chickpea', 'chana': 'chickpea', 'harbhara': 'chickpea',
+    'groundnut': 'groundnut', 'peanut': 'groundnut', 'mungphali': 'groundnut',
+    'shengdana': 'groundnut', 'bhuimug': 'groundnut', 'mustard': 'mustard', 'sarson': 'mustard',
+    'chilli': 'chilli', 'chili': 'chilli', 'mirchi': 'chilli', 'mirch': 'chilli',
+    'banana': 'banana', 'kela': 'banana', 'keli': 'banana', 'grape': 'grape', 'grapes': 'grape',
+    'angur': 'grape', 'draksha': 'grape', 'jowar': 'sorghum', 'sorghum': 'sorghum',
+    'bajra': 'millet', 'millet': 'millet', 'tur': 'pigeonpea', 'arhar': 'pigeonpea',
+    'brinjal': 'brinjal', 'baingan': 'brinjal', 'vangi': 'brinjal', 'mango': 'mango',
+    'aam': 'mango', 'amba': 'mango'
+}
+
+# Common farming words that farmers type in English, Hindi or Marathi
+SYNONYMS = {
+    'fertilizer': 'fertilizer', 'fertiliser': 'fertilizer', 'khad': 'fertilizer',
+    'khat': 'fertilizer', 'urvarak': 'fertilizer', 'manure': 'manure', 'gobar': 'manure',
+    'urea': 'urea', 'yuriya': 'urea', 'yuria': 'urea', 'pesticide': 'pesticide',
+    'kitnashak': 'pesticide', 'kitanashak': 'pesticide', 'pest': 'pest', 'kit': 'pest',
+    'kida': 'pest', 'kide': 'pest', 'kid': 'pest', 'aphid': 'aphid', 'mahu': 'aphid',
+    'mava': 'aphid', 'disease': 'disease', 'rog': 'disease', 'bimari': 'disease',
+    'water': 'water', 'pani': 'water', 'irrigation': 'irrigation', 'sinchai': 'irrigation',
+    'sowing': 'sow', 'sow': 'sow', 'buvai': 'sow', 'buai': 'sow', 'perani': 'sow',
+    'harvest': 'harvest', 'katai': 'harvest', 'kapani': 'harvest', 'seed': 'seed',
+    'seeds': 'seed', 'bij': 'seed', 'beej': 'seed', 'bijam': 'seed', 'yellow': 'yellow',
+    'pila': 'yellow', 'pile': 'yellow', 'peele': 'yellow', 'leaf': 'leaf', 'leaves': 'leaf',
+    'patta': 'leaf', 'patte': 'leaf', 'patti': 'leaf', 'pan': 'leaf', 'pane': 'leaf',
+    'control': 'control', 'niyantran': 'control',
+    'kitna': 'amount', 'kitana': 'amount', 'kiti': 'amount', 'use': 'use', 'dale': 'use',
+    'dalen': 'use', 'dalna': 'use', 'daalein': 'use', 'de': 'use', 'dena': 'use'
+}
+
+NUMBER_WORDS = {
+    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6',
+    'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10', 'half': '0.5',
+    'ek': '1', 'teen': '3', 'char': '4', 'panch': '5', 'das': '10', 'aadha': '0.5'
+}
+
+
+def _indic_offset(ch):
+    code = ord(ch)
+    for start, end in INDIC_BLOCKS:
+        if start <= code <= end:
+            return code - start
+    return None
+
+
+def romanize(text):
+    """Fold Indic-script text onto a rough Latin spelling."""
+    out = []
+    pending_a = False
+    for ch in text:
+        offset = _indic_offset(ch)
+        if offset is None:
+            # Word-final inherent vowels are silent in most Indic languages
+            pending_a = False
+            out.append(ch)
+            continue
+        if offset in INDIC_CONSONANTS:
+            if pending_a:
+                out.append('a')
+            out.append(INDIC_CONSONANTS[offset])
+            pending_a = True
+        elif offset in INDIC_MATRAS:
+            out.append(INDIC_MATRAS[offset])
+            pending_a = False
+        elif offset == VIRAMA:
+            pending_a = False
+        elif offset == NUKTA:
+            continue
+        else:
+            if pending_a:
+                out.append('a')
+                pending_a = False
+            if offset in INDIC_VOWELS:
+                out.append(INDIC_VOWELS[offset])
+            elif offset in INDIC_SIGNS:
+                out.append(INDIC_SIGNS[offset])
+            elif 0x66 <= offset <= 0x6F:
+                out.append(str(offset - 0x66))
+    return ''.join(out)
+
+
+def tokenize(text):
+    """Lower-case, romanize and split a query into content words and numbers."""
+    text = unicodedata.normalize('NFKC', str(text or '')).casefold()
+    text = romanize(text)
+    words = re.findall(r'[0-9]+(?:\.[0-9]+)?|[a-z]+', text)
+    return [w for w in words if w not in STOPWORDS]
+
+
+def _stem(word):
+    if len(word) > 4 and word.endswith('oes'):
+        return word[:-2]
+    if len(word) > 4 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+_SOUNDS = [
+    ('chh', 'ch'), ('kh', 'k'), ('gh', 'g'), ('jh', 'j'), ('th', 't'), ('dh', 'd'),
+    ('ph', 'f'), ('bh', 'b'), ('sh', 's'), ('ck', 'k'), ('ee', 'i'), ('oo', 'u'),
+    ('ai', 'e'), ('ei', 'e'), ('au', 'o'), ('w', 'v'), ('z', 'j'), ('q', 'k'), ('x', 'ks')
+]
+
+
+def _sound(word):
+    """Phonetic spelling that romanize() output and hand-typed Latin agree on."""
+    for written, spoken in _SOUNDS:
+        word = word.replace(written, spoken)
+    word = re.sub(r'(.)\1+', r'\1', word)
+    # Anusvara romanizes to a final n that Latin typists drop (gehun/gehu)
+    if len(word) > 4 and word.endswith('n') and word[-2] in 'aeiou':
+        word = word[:-1]
+    return word
+
+
+def _lexicon(table):
+    """Table lookups by exact spelling, falling back to the phonetic spelling."""
+    sounded = {_sound(key): value for key, value in table.items()}
+    return lambda word: table.get(word) or sounded.get(_sound(word))
+
+
+_crop = _lexicon(CROPS)
+_unit = _lexicon(UNITS)
+_synonym = _lexicon(SYNONYMS)
+
+
+def _is_number(word):
+    return word[0].isdigit() or word in NUMBER_WORDS
+
+
+def guard_terms(text):
+    """Crops, negation and the numbers with their units, in question order.
+
+    Two questions are only near-duplicates when these match exactly: "urea for
+    1 acre" and "urea for 2 acres" embed almost identically but need different
+    answers.
+    """
+    crops, quantities, negated = set(), [], False
+    for word in tokenize(text):
+        if word in NEGATIONS:
+            negated = True
+        elif _is_number(word):
+            quantities.append(NUMBER_WORDS.get(word, word))
+        elif _crop(word) or _crop(_stem(word)):
+            crops.add(_crop(word) or _crop(_stem(word)))
+        elif _unit(word) or _unit(_stem(word)):
+            quantities.append(_unit(word) or _unit(_stem(word)))
+    return tuple(sorted(crops)), tuple(quantities), negated
+
+
+def guard_key(text):
+    """guard_terms folded into an integer the NumPy index can compare."""
+    return zlib.crc32(repr(guard_terms(text)).encode('utf-8'))
+
+
+def embed(text, dim=EMBEDDING_DIM):
+    """Embed text as an L2-normalized hashed bag of words and character trigrams.
+
+    Words are spelled phonetically and known farming words map to one concept
+    across languages, so Devanagari and romanized questions land close.
+    Numbers and negations are left to guard_terms.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in tokenize(text):
+        if word in NEGATIONS or _is_number(word):
+            continue
+        stem = _stem(word)
+        concept = _crop(word) or _crop(stem) or _synonym(word) or _synonym(stem) or _unit(word)
+        word = _sound(stem)
+        features = [('k', concept, 3.0)] if concept else [('w', word, 2.0)]
+        padded = f'#{word}#'
+        features.extend(('c', padded[i:i + 3], 1.0) for i in range(len(padded) - 2))
+        for kind, feature, weight in features:
+            h = zlib.crc32(f'{kind}:{feature}'.encode('utf-8'))
+            sign = 1.0 if h & 1 else -1.0
+            vector[(h >> 1) % dim] += sign * weight
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class SemanticIndex:
+    """In-memory cosine-similarity index with LRU eviction at a fixed capacity."""
+
+    def __init__(self, capacity, dim=EMBEDDING_DIM):
+        self.capacity = capacity
+        self.dim = dim
+        self.vectors = np.zeros((min(capacity, 1024), dim), dtype=np.float32)
+        self.ids = np.zeros(len(self.vectors), dtype=np.int64)
+        self.guards = np.zeros(len(self.vectors), dtype=np.int64)
+        self.last_access = np.zeros(len(self.vectors), dtype=np.float64)
+        self.size = 0
+
+    def _grow(self):
+        new_len = min(self.capacity, len(self.vectors) * 2)
+        for name in ('vectors', 'ids', 'guards', 'last_access'):
+            old = getattr(self, name)
+            new = np.zeros((new_len,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def add(self, entry_id, vector, now=None, guard=0):
+        """Add a vector; returns the id evicted to make room, if any."""
+        evicted = None
+        if self.size >= self.capacity:
+            slot = int(np.argmin(self.last_access[:self.size]))
+            evicted = int(self.ids[slot])
+        else:
+            if self.size >= len(self.vectors):
+                self._grow()
+            slot = self.size
+            self.size += 1
+        self.vectors[slot] = vector
+        self.ids[slot] = entry_id
+        self.guards[slot] = guard
+        self.last_access[slot] = now if now is not None else time.time()
+        return evicted
+
+    def remove(self, entry_id):
+        matches = np.nonzero(self.ids[:self.size] == entry_id)[0]
+        if not len(matches):
+            return
+        slot = int(matches[0])
+        last = self.size - 1
+        self.vectors[slot] = self.vectors[last]
+        self.ids[slot] = self.ids[last]
+        self.guards[slot] = self.guards[last]
+        self.last_access[slot] = self.last_access[last]
+        self.size = last
+
+    def search(self, vector, threshold, guard=None):
+        """Return (id, similarity) of the best match at or above threshold, else None.
+
+        With a guard, only entries added under the same guard can match.
+        """
+        if self.size == 0:
+            return None
+        scores = self.vectors[:self.size] @ vector
+        if guard is not None:
+            scores = np.where(self.guards[:self.size] == guard, scores, -np.inf)
+        slot = int(np.argmax(scores))
+        score = float(scores[slot])
+        if score < threshold:
+            return None
+        self.last_access[slot] = time.time()
+        return int(self.ids[slot]), score
+
+
+class SemanticCache:
+    """Per-language semantic cache persisted in SQLite and rebuilt into NumPy on load.
+
+    Entries expire `ttl` seconds after they are stored; None keeps them until
+    evicted for capacity.
+    """
+
+    def __init__(self, db_path, threshold=0.78, max_entries_per_language=20000, ttl=None):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries_per_language
+        self.ttl = ttl
+        self.indexes = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_schema()
+        self.load()
+
+    def _init_schema(self):
+        with self._lock:
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS semantic_cache (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    language TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    embedding_version INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    guard INTEGER NOT NULL DEFAULT 0,
+                    expires_at REAL
+                )
+            ''')
+            columns = [row[1] for row in self._conn.execute('PRAGMA table_info(semantic_cache)')]
+            if 'guard' not in columns:
+                # Version 1 rows get their guard when load() re-embeds them
+                self._conn.execute('ALTER TABLE semantic_cache ADD COLUMN guard INTEGER NOT NULL DEFAULT 0')
+            if 'expires_at' not in columns:
+                self._conn.execute('ALTER TABLE semantic_cache ADD COLUMN expires_at REAL')
+            if self.ttl is not None:
+                # Rows stored before expiry was tracked age from when they were written
+                self._conn.execute('UPDATE semantic_cache SET expires_at = created_at + ? WHERE expires_at IS NULL',
+                                   (self.ttl,))
+            self._conn.commit()
+
+    def _index(self, language):
+        if language not in self.indexes:
+            self.indexes[language] = SemanticIndex(self.max_entries)
+        return self.indexes[language]
+
+    def load(self):
+        """Load stored embeddings into the per-language indexes."""
+        with self._lock:
+            self.indexes = {}
+            self._conn.execute('DELETE FROM semantic_cache WHERE expires_at <= ?', (time.time(),))
+            rows = self._conn.execute('''
+                SELECT id, language, embedding, embedding_version, last_access, guard
+                FROM semantic_cache ORDER BY last_access ASC
+            ''').fetchall()
+            stale = [row for row in rows if row[3] != EMBEDDING_VERSION]
+            if stale:
+                self._reembed_locked()
+                rows = self._conn.execute('''
+                    SELECT id, language, embedding, embedding_version, last_access, guard
+                    FROM semantic_cache ORDER BY last_access ASC
+                ''').fetchall()
+            for entry_id, language, blob, _, last_access, guard in rows:
+                vector = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+                evicted = self._index(language).add(entry_id, vector, last_access, guard)
+                if evicted is not None:
+                    self._conn.execute('DELETE FROM semantic_cache WHERE id = ?', (evicted,))
+            self._conn.commit()
+
+    def _reembed_locked(self):
+        rows = self._conn.execute('SELECT id, query FROM semantic_cache').fetchall()
+        self._conn.executemany(
+            'UPDATE semantic_cache SET embedding = ?, embedding_version = ?, guard = ? WHERE id = ?',
+            [(embed(query).astype(np.float16).tobytes(), EMBEDDING_VERSION, guard_key(query), entry_id)
+             for entry_id, query in rows]
+        )
+
+    def rebuild(self):
+        """Re-embed every stored query and reload the indexes from disk."""
+        with self._lock:
+            self._reembed_locked()
+            self._conn.commit()
+        self.load()
+
+    def lookup(self, query, language):
+        """Return the stored answer for a near-duplicate query, or None."""
+        vector = embed(query)
+        guard = guard_key(query)
+        with self._lock:
+            match = self._index(language).search(vector, self.threshold, guard)
+            if match is None:
+                self.misses += 1
+                return None
+            entry_id, _ = match
+            now = time.time()
+            row = self._conn.execute(
+                'SELECT response, expires_at FROM semantic_cache WHERE id = ?', (entry_id,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] <= now):
+                self._index(language).remove(entry_id)
+                self._conn.execute('DELETE FROM semantic_cache WHERE id = ?', (entry_id,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute(
+                'UPDATE semantic_cache SET last_access = ? WHERE id = ?',
+                (now, entry_id)
+            )
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def add(self, query, language, response):
+        """Store an answer and index its query embedding."""
+        vector = embed(query)
+        guard = guard_key(query)
+        now = time.time()
+        expires_at = None if self.ttl is None else now + self.ttl
+        with self._lock:
+            cursor = self._conn.execute('''
+                INSERT INTO semantic_cache
+                (language, query, response, embedding, embedding_version, created_at, last_access, guard,
+                 expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (language, query, response, vector.astype(np.float16).tobytes(),
+                  EMBEDDING_VERSION, now, now, guard, expires_at))
+            evicted = self._index(language).add(cursor.lastrowid, vector, now, guard)
+            if evicted is not None:
+                self._conn.execute('DELETE FROM semantic_cache WHERE id = ?', (evicted,))
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'threshold': self.threshold,
+                'entries': {lang: index.size for lang, index in self.indexes.items()},
+            }
@@ -0,0 +1,96 @@
+"""
+Single-flight request coalescing for Krishi Mitra AI calls
+Identical concurrent requests share one upstream call and its result
+"""
+
+import threading
+
+
+class _Call:
+    """One in-flight computation that any number of waiters can attach to."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+    def resolve(self, result):
+        self.result = result
+        self._done.set()
+
+    def fail(self, error):
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """Return the leader's result, re-raising its exception."""
+        if not self._done.wait(timeout):
+            raise TimeoutError("Timed out waiting for an identical in-flight request")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class SingleFlight:
+    """Coalesces calls that share a key while one of them is in flight.
+
+    When the leader is interrupted by a BaseException such as Streamlit's
+    rerun, followers get `interrupted` instead; the exception stays in the
+    leader's thread.
+    """
+
+    def __init__(self, timeout=90, interrupted=None):
+        self.timeout = timeout
+        self.interrupted = interrupted
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key):
+        """Return (call, is_leader); the leader must later finish(key, ...)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self.leaders += 1
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        """Publish the leader's outcome to every waiter."""
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        if error is not None:
+            call.fail(error)
+        else:
+            call.resolve(result)
+
+    def do(self, key, fn):
+        """Run fn once for all concurrent callers with the same key."""
+        call, is_leader = self.begin(key)
+        if not is_leader:
+            return call.wait(self.timeout)
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        except BaseException:
+            self.finish(key, call, result=self.interrupted)
+            raise
+        self.finish(key, call, result=result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+            }
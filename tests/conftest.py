@@ -0,0 +1,14 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# config reads these at import, and database.py migrates its database on
+# import: keep every database, cache and job store out of the checkout
+DATA_DIR = tempfile.mkdtemp(prefix='krishi-tests-')
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+os.environ['KRISHI_DATA_DIR'] = DATA_DIR
+os.environ.setdefault('GEMINI_API_KEY', 'test')
@@ -0,0 +1,29 @@
+import time
+
+from ai_cache import ResponseCache
+
+
+def test_hits_only_touch_stale_last_access(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.db'), touch_interval=60)
+    cache.set('get_farming_response', 'when to sow wheat', 'en', 'model', 'November')
+    writes = cache._conn.total_changes
+    assert cache.get('get_farming_response', 'when to sow wheat', 'en', 'model') == 'November'
+    assert cache._conn.total_changes == writes
+
+    cache._conn.execute('UPDATE ai_response_cache SET last_access = ?', (time.time() - 61,))
+    writes = cache._conn.total_changes
+    cache.get('get_farming_response', 'when to sow wheat', 'en', 'model')
+    assert cache._conn.total_changes == writes + 1
+
+
+def test_running_total_evicts_least_recent(tmp_path):
+    path = str(tmp_path / 'cache.db')
+    cache = ResponseCache(path, max_bytes=25)
+    for query in ('a', 'b', 'c'):
+        cache.set('m', query, 'en', 'model', 'x' * 10)
+    assert cache.stats()['entries'] == 2 and cache.stats()['size_bytes'] == 20
+    assert cache.get('m', 'a', 'en', 'model') is None
+    # Replacing an entry does not count its old size twice
+    cache.set('m', 'c', 'en', 'model', 'y' * 10)
+    assert cache.stats()['entries'] == 2
+    assert ResponseCache(path, max_bytes=25)._total_bytes == 20
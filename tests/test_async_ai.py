@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+from ai_service import AsyncKrishiAI
+
+
+def test_run_timeout_returns_error_and_cancels():
+    client = AsyncKrishiAI(ai=None, timeout=0.1)
+    finished = []
+
+    async def slow():
+        await asyncio.sleep(2)
+        finished.append(True)
+
+    assert client.run(slow()).startswith("Error: ")
+
+    async def others_pending():
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    time.sleep(0.1)
+    # The coroutine was cancelled on the loop rather than left running
+    assert asyncio.run_coroutine_threadsafe(others_pending(), client._loop).result(1) == []
+    assert not finished
+
+
+def test_gather_timeout_returns_one_error_per_call():
+    client = AsyncKrishiAI(ai=None, timeout=0.1)
+    results = client.gather(asyncio.sleep(2), asyncio.sleep(2))
+    assert len(results) == 2 and all(result.startswith("Error: ") for result in results)
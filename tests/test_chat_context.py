@@ -0,0 +1,54 @@
+from chat_context import ConversationContext
+
+
+class RecordingSummarizer:
+    """Summarizes to a short marker and remembers every message it folded."""
+
+    def __init__(self):
+        self.folded = []
+
+    def __call__(self, previous_summary, messages):
+        self.folded.extend(message['content'] for message in messages)
+        return f"summary of {len(self.folded)} messages"
+
+
+def _history(turns, words):
+    history = []
+    for turn in range(turns):
+        history.append({'role': 'user', 'content': f"question-{turn} " + 'word ' * words})
+        history.append({'role': 'assistant', 'content': f"answer-{turn} " + 'word ' * words})
+    return history
+
+
+def test_long_history_loses_no_turn():
+    summarize = RecordingSummarizer()
+    context = ConversationContext(summarize, keep_messages=6, token_budget=400, summary_tokens=50)
+    history = _history(turns=12, words=60)
+    state = {}
+    text = context.build(history, state)
+
+    for message in history:
+        marker = message['content'].split()[0]
+        assert message['content'] in summarize.folded or marker in text, marker
+    assert state['summarized_upto'] == len(summarize.folded)
+    assert summarize.folded == [message['content'] for message in history[:state['summarized_upto']]]
+
+
+def test_rebuild_does_not_refold():
+    summarize = RecordingSummarizer()
+    context = ConversationContext(summarize, keep_messages=6, token_budget=400, summary_tokens=50)
+    history = _history(turns=12, words=60)
+    state = {}
+    first = context.build(history, state)
+    folded = len(summarize.folded)
+    assert context.build(history, state) == first
+    assert len(summarize.folded) == folded
+
+
+def test_short_history_is_verbatim():
+    summarize = RecordingSummarizer()
+    context = ConversationContext(summarize)
+    history = _history(turns=2, words=5)
+    text = context.build(history, {})
+    assert not summarize.folded
+    assert all(message['content'].strip() in text for message in history)
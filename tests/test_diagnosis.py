@@ -0,0 +1,68 @@
+import json
+import random
+
+import google.generativeai as genai
+import pytest
+from PIL import Image
+
+import ai_service
+from ai_service import KrishiAI
+from diagnosis import parse_diagnoses, parse_diagnosis
+
+DIAGNOSIS = {
+    'crop': 'Tomato', 'health_score': 62, 'health_summary': 'Leaf spots',
+    'diseases': [{'name': 'Early blight', 'confidence': 80}],
+    'treatments': ['Spray mancozeb'], 'care_tips': ['Water at the base'],
+}
+
+
+def test_batch_diagnoses_are_matched_by_image_number():
+    text = json.dumps([{**DIAGNOSIS, 'image': 2, 'crop': 'Rice'}, {**DIAGNOSIS, 'image': 1}])
+    first, second = parse_diagnoses(text, 2)
+    assert first['crop'] == 'Tomato' and second['crop'] == 'Rice'
+    assert 'image' not in first and first['diseases'][0]['confidence'] == 0.8
+
+
+def test_malformed_batch_diagnoses_are_none():
+    garbled = {key: value for key, value in DIAGNOSIS.items() if key != 'crop'}
+    text = json.dumps([{**DIAGNOSIS, 'image': 1}, {**garbled, 'image': 2}, {**DIAGNOSIS, 'image': 9}])
+    assert [d is not None for d in parse_diagnoses(text, 3)] == [True, False, False]
+    assert parse_diagnoses("=== IMAGE 1 ===\nLeaf spot", 1) == [None]
+
+
+class BatchModel:
+    """Answers batch requests with a valid first diagnosis and a garbled second one."""
+    calls = []
+
+    def __init__(self, name, **kwargs):
+        self.name = name
+
+    def generate_content(self, contents, generation_config=None, **kwargs):
+        schema = generation_config['response_schema']
+        self.calls.append(schema['type'])
+        if schema['type'] == 'array':
+            text = json.dumps([{**DIAGNOSIS, 'image': 1}, {'image': 2, 'crop': 'Rice'}])
+        else:
+            text = json.dumps({**DIAGNOSIS, 'crop': 'Rice'})
+        return type('Response', (), {'text': text, 'usage_metadata': None})()
+
+
+@pytest.fixture
+def ai(monkeypatch, tmp_path):
+    monkeypatch.setattr(ai_service, 'AI_CACHE_PATH', str(tmp_path / 'ai_cache.db'))
+    monkeypatch.setattr(genai, 'configure', lambda **kwargs: None)
+    monkeypatch.setattr(genai, 'GenerativeModel', BatchModel)
+    instance = KrishiAI()
+    BatchModel.calls = []
+    return instance
+
+
+def test_batch_caches_only_validated_reports(ai):
+    images = [Image.frombytes('RGB', (64, 64), random.Random(seed).randbytes(64 * 64 * 3)) for seed in (1, 2)]
+    reports = ai.analyze_crop_images(images, language='mr')
+    assert [parse_diagnosis(report)['crop'] for report in reports] == ['Tomato', 'Rice']
+    # The garbled photo was asked for again on its own, with the single-image schema
+    assert BatchModel.calls == ['array', 'object']
+    for image in images:
+        assert parse_diagnosis(ai.analyze_crop_image(image, language='mr')) is not None
+    assert BatchModel.calls == ['array', 'object']
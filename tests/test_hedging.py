@@ -0,0 +1,51 @@
+from hedging import HedgePolicy
+
+
+def test_refused_hedge_is_not_counted_and_returns_budget():
+    policy = HedgePolicy(enabled=True, max_per_minute=1)
+    reservation = policy.try_acquire()
+    assert reservation is not None
+    policy.release(reservation)
+    stats = policy.stats()
+    assert stats['hedges_fired'] == 0
+    assert stats['extra_quota_calls'] == 0
+    assert stats['skipped_rate_limit'] == 1
+    assert policy.try_acquire() is not None
+
+
+def test_fired_hedge_counts_against_budget():
+    policy = HedgePolicy(enabled=True, max_per_minute=1)
+    assert policy.try_acquire() is not None
+    policy.fired()
+    assert policy.try_acquire() is None
+    stats = policy.stats()
+    assert (stats['hedges_fired'], stats['extra_quota_calls'], stats['skipped_budget']) == (1, 1, 1)
+
+
+def test_queued_primary_does_not_trigger_hedge(monkeypatch, tmp_path):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    import google.generativeai as genai
+
+    import ai_service
+
+    class Fast:
+        def __init__(self, name, **kwargs):
+            self.name = name
+
+        def generate_content(self, contents, **kwargs):
+            return type('Response', (), {'text': 'answer', 'usage_metadata': None})()
+
+    monkeypatch.setattr(ai_service, 'AI_CACHE_PATH', str(tmp_path / 'ai_cache.db'))
+    monkeypatch.setattr(genai, 'configure', lambda **kwargs: None)
+    monkeypatch.setattr(genai, 'GenerativeModel', Fast)
+    ai = ai_service.KrishiAI()
+    ai.hedging = HedgePolicy(enabled=True, min_delay=0.05)
+    # Every pool worker is busy, so the primary waits its turn
+    ai._executor = ThreadPoolExecutor(max_workers=1)
+    ai._executor.submit(time.sleep, 0.3)
+
+    primary, backup = ai.models_to_try[:2]
+    assert ai._hedged_call(primary, backup, "when to sow wheat")[0] == 'answer'
+    assert ai.hedging.stats()['hedges_fired'] == 0
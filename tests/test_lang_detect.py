@@ -0,0 +1,29 @@
+import pytest
+
+from lang_detect import detect, detect_language
+
+
+@pytest.mark.parametrize('text, expected', [
+    ("How do I stop termites in sugarcane", 'en'),
+    ("गेहूं में दीमक लग गई है", 'hi'),
+    ("उसावर हुमणी अळी पडली आहे", 'mr'),
+    ("ganne mein deemak ka ilaj kya hai", 'hi'),
+    ("usavar humani ali padli aahe", 'mr'),
+    ("શેરડીમાં ઉધઈ લાગી છે", 'gu'),
+    ("கரும்பில் கரையான் தாக்குதல்", 'ta'),
+    ("చెరకులో చెదలు వచ్చాయి", 'te'),
+    ("ಕಬ್ಬಿಗೆ ಗೆದ್ದಲು ಹುಳು ಬಂದಿದೆ", 'kn'),
+])
+def test_detects_language(text, expected):
+    assert detect_language(text) == expected
+
+
+def test_empty_text_uses_default():
+    assert detect('') == ('en', 0.0)
+    assert detect_language('123 ?', default='mr') == 'mr'
+
+
+def test_mixed_script_lowers_confidence():
+    _, pure = detect("गेहूं में दीमक लग गई है")
+    _, mixed = detect("गेहूं में termite control for wheat crop")
+    assert mixed < pure
@@ -0,0 +1,86 @@
+from concurrent.futures import Future
+
+import google.generativeai as genai
+import pytest
+
+import ai_service
+from ai_service import KrishiAI, LocalAnswer, is_cacheable, is_error_response, join_chunks
+from job_queue import DONE, JobQueue
+from local_llm import Backend
+
+
+class QuotaExhausted:
+    """Gemini model handle whose every call is refused for quota."""
+
+    def __init__(self, name, **kwargs):
+        self.name = name
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        raise Exception("429 Resource has been exhausted (e.g. check quota).")
+
+
+class Healthy(QuotaExhausted):
+    def generate_content(self, contents, stream=False, **kwargs):
+        return type('Response', (), {'text': 'Gemini answer', 'usage_metadata': None})()
+
+
+class EchoBackend(Backend):
+    name = 'echo'
+
+    def available(self):
+        return True
+
+    def submit(self, prompt):
+        future = Future()
+        future.set_result('local answer')
+        return future
+
+
+@pytest.fixture
+def ai(monkeypatch, tmp_path):
+    monkeypatch.setattr(genai, 'configure', lambda **kwargs: None)
+    monkeypatch.setattr(genai, 'GenerativeModel', QuotaExhausted)
+    instance = KrishiAI(fallback=EchoBackend())
+    instance.cache.clear()
+    return instance
+
+
+def test_local_answer_is_served_but_not_cached(ai, monkeypatch):
+    answer = ai.get_farming_response("how to store onions", 'en')
+    assert isinstance(answer, LocalAnswer) and answer == 'local answer'
+    assert ai.semantic_cache.lookup("how to store onions", 'en') is None
+
+    # Once Gemini recovers, the farmer gets its answer rather than the stopgap
+    monkeypatch.setattr(genai, 'GenerativeModel', Healthy)
+    recovered = KrishiAI(fallback=EchoBackend())
+    assert recovered.get_farming_response("how to store onions", 'en') == 'Gemini answer'
+
+
+def test_streamed_local_answer_is_not_cached(ai):
+    chunks = list(ai.stream_farming_response("when to sow mustard", 'en'))
+    assert ''.join(chunks) == 'local answer'
+    assert ai.cache.get('get_farming_response', "when to sow mustard", 'en', ai.models_to_try[0]) is None
+
+
+def test_is_cacheable():
+    assert is_cacheable("Gemini answer")
+    assert not is_cacheable(LocalAnswer("local answer"))
+    assert not is_cacheable(ai_service.ALL_MODELS_UNAVAILABLE)
+
+
+def test_queued_local_answer_is_not_reused(tmp_path):
+    calls = []
+
+    def runner(method, args):
+        calls.append(method)
+        return iter([LocalAnswer('local '), LocalAnswer('answer')])
+
+    queue = JobQueue(str(tmp_path / 'jobs.db'), runner, workers=1, is_error=is_error_response,
+                     cacheable=is_cacheable, join=join_chunks).start()
+    key = queue.submit('stream_crop_knowledge', 'wheat', 'en')
+    job = queue.wait(key, timeout=5)
+    assert job['status'] == DONE and job['result'] == 'local answer'
+
+    assert queue.submit('stream_crop_knowledge', 'wheat', 'en') == key
+    assert queue.wait(key, timeout=5)['status'] == DONE
+    assert len(calls) == 2
@@ -0,0 +1,42 @@
+import sqlite3
+
+import pytest
+
+from migrations import MIGRATIONS, migrate
+
+
+def test_fresh_database_gets_every_migration_once(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'krishi.db'))
+    assert migrate(conn) == [version for version, _, _ in MIGRATIONS]
+    assert migrate(conn) == []
+
+
+def test_versions_are_contiguous():
+    assert [version for version, _, _ in MIGRATIONS] == list(range(1, len(MIGRATIONS) + 1))
+
+
+def test_listings_page_through_time_id_indexes(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'krishi.db'))
+    migrate(conn)
+    for table, column in (('community_posts', 'created_at'), ('organic_products', 'created_at'),
+                          ('users', 'created_at'), ('login_history', 'login_time')):
+        plan = conn.execute(f'''
+            EXPLAIN QUERY PLAN SELECT * FROM {table}
+            WHERE ({column}, id) < (?, ?) ORDER BY {column} DESC, id DESC LIMIT 20
+        ''', ('2026-01-01', 10)).fetchall()
+        detail = ' '.join(row[-1] for row in plan)
+        assert f'_id ({column}<?)' in detail and 'TEMP B-TREE' not in detail, detail
+
+
+def test_product_search_waits_for_fts5_trigram(tmp_path, monkeypatch):
+    import migrations
+    conn = sqlite3.connect(str(tmp_path / 'krishi.db'))
+    monkeypatch.setattr(migrations, 'fts5_trigram_available', lambda conn: False)
+    assert 4 not in migrate(conn)
+    assert migrate(conn) == []
+
+    # The host's SQLite was upgraded
+    monkeypatch.undo()
+    if not migrations.fts5_trigram_available(conn):
+        pytest.skip("SQLite lacks FTS5 trigram support")
+    assert migrate(conn) == [4]
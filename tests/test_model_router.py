@@ -0,0 +1,32 @@
+import google.generativeai as genai
+import pytest
+
+from ai_service import KrishiAI
+from model_router import HALF_OPEN
+
+
+class Streaming:
+    def __init__(self, name, **kwargs):
+        self.name = name
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        return iter([type('Chunk', (), {'text': word, 'usage_metadata': None})() for word in ('one ', 'two')])
+
+
+@pytest.fixture
+def ai(monkeypatch):
+    monkeypatch.setattr(genai, 'configure', lambda **kwargs: None)
+    monkeypatch.setattr(genai, 'GenerativeModel', Streaming)
+    return KrishiAI()
+
+
+def test_closed_stream_frees_half_open_trial(ai):
+    name = ai.models_to_try[0]
+    ai.router.stats[name].state = HALF_OPEN
+    stream = ai._try_generate_stream("when to sow wheat")
+    assert next(stream) == 'one '
+    assert name not in ai.router.candidates()
+
+    # The farmer navigated away mid-answer
+    stream.close()
+    assert name in ai.router.candidates()
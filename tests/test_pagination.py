@@ -0,0 +1,50 @@
+import types
+
+import pytest
+
+import database
+import main_app
+from migrations import migrate
+
+
+@pytest.fixture
+def posts(tmp_path, monkeypatch):
+    pool = database.ConnectionPool(str(tmp_path / 'krishi.db'))
+    monkeypatch.setattr(database, '_pool', pool)
+    monkeypatch.setattr(main_app, 'st', types.SimpleNamespace(session_state={}))
+    migrate(pool.connection())
+
+    def add(count):
+        conn = pool.connection()
+        with conn:
+            for _ in range(count):
+                # One timestamp for all, so only the id orders them
+                conn.execute("INSERT INTO community_posts (farmer_name, content, created_at) "
+                             "VALUES ('Ramesh', 'update', '2026-01-01 00:00:00')")
+    return add
+
+
+def feed():
+    return main_app.paged_rows('feed', lambda cursor, until=None: database.get_posts_page(3, cursor, until))
+
+
+def test_new_posts_neither_repeat_nor_skip_rows(posts):
+    posts(10)
+    rows, next_cursor = feed()
+    main_app.st.session_state['feed'].append(next_cursor)
+    assert [row['id'] for row in feed()[0]] == [10, 9, 8, 7, 6, 5]
+
+    posts(2)
+    rows, next_cursor = feed()
+    assert [row['id'] for row in rows] == [12, 11, 10, 9, 8, 7, 6, 5]
+    main_app.st.session_state['feed'].append(next_cursor)
+    rows, next_cursor = feed()
+    assert [row['id'] for row in rows] == [12, 11, 10, 9, 8, 7, 6, 5, 4, 3, 2]
+
+
+def test_last_page_has_no_next_cursor(posts):
+    posts(4)
+    rows, next_cursor = feed()
+    main_app.st.session_state['feed'].append(next_cursor)
+    rows, next_cursor = feed()
+    assert [row['id'] for row in rows] == [4, 3, 2, 1] and next_cursor is None
@@ -0,0 +1,28 @@
+import pytest
+
+import pregenerate_knowledge
+
+
+class FailingAI:
+    def __init__(self):
+        self.calls = 0
+
+    def _try_generate(self, prompt):
+        self.calls += 1
+        return "Error: 503 unavailable"
+
+
+def test_no_sleep_after_last_attempt(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(pregenerate_knowledge.time, 'sleep', sleeps.append)
+    ai = FailingAI()
+    with pytest.raises(RuntimeError, match='503'):
+        pregenerate_knowledge.generate_with_retries(ai, 'prompt', retries=2)
+    assert ai.calls == 3
+    assert sleeps == [1, 2]
+
+
+def test_help_needs_no_secrets(capsys):
+    with pytest.raises(SystemExit):
+        pregenerate_knowledge.parse_args(['--help'])
+    assert '--kind' in capsys.readouterr().out
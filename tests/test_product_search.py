@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+from database import _search_products
+from migrations import fts5_trigram_available, migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'krishi.db'))
+    conn.row_factory = sqlite3.Row
+    migrate(conn)
+    if not fts5_trigram_available(conn):
+        pytest.skip("SQLite lacks FTS5 trigram support")
+    with conn:
+        conn.executemany(
+            'INSERT INTO organic_products (farmer_name, product_name, quantity, location, phone_number) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [('Ramesh', 'Basmati Rice', '10 kg', 'Karnal', '1'),
+             ('Suresh', 'Basmati Rice', '10 kg', 'Nashik', '2'),
+             ('Anita', 'Organic Tomatoes', '5 kg', 'Pune', '3')])
+    return conn
+
+
+def names(products):
+    return sorted(product['farmer_name'] for product in products)
+
+
+def test_short_terms_filter_longer_matches(conn):
+    assert names(_search_products(conn, 'basmati ka')) == ['Ramesh']
+    assert names(_search_products(conn, 'basmati')) == ['Ramesh', 'Suresh']
+
+
+def test_short_terms_filter_misspelt_matches(conn):
+    assert names(_search_products(conn, 'basmti ik')) == ['Suresh']
+
+
+def test_short_terms_alone_use_like(conn):
+    assert names(_search_products(conn, 'pu')) == ['Anita']
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from rate_limiter import FairScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Rerun(BaseException):
+    """Stands in for Streamlit's RerunException."""
+
+
+def _drained(rpm=60, clock=time.monotonic):
+    scheduler = FairScheduler(rpm, 1_000_000, clock=clock)
+    scheduler.requests.tokens = 0
+    return scheduler
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.01)
+
+
+def test_sessions_are_served_round_robin():
+    clock = Clock()
+    scheduler = _drained(clock=clock)
+    order = []
+
+    def request(session):
+        assert scheduler.acquire(session, 500, timeout=600)
+        order.append(session)
+
+    threads = [threading.Thread(target=request, args=('spammer',)) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: scheduler.stats()['queued'] == 6)
+    farmer = threading.Thread(target=request, args=('farmer',))
+    farmer.start()
+    threads.append(farmer)
+    _wait_for(lambda: scheduler.stats()['queued'] == 7)
+
+    # 60 RPM: one request per simulated second
+    while len(order) < 7:
+        clock.now += 1.0
+        with scheduler._cond:
+            scheduler._cond.notify_all()
+        before = len(order)
+        _wait_for(lambda: len(order) > before)
+    for thread in threads:
+        thread.join()
+    # The farmer waits out at most the spammer's current turn
+    assert order.index('farmer') <= scheduler.quantum // 500
+
+
+def test_timeout_removes_ticket():
+    scheduler = _drained()
+    assert scheduler.acquire('farmer', 100, timeout=0.1) is False
+    stats = scheduler.stats()
+    assert (stats['queued'], stats['sessions_waiting'], stats['timed_out']) == (0, 0, 1)
+
+
+def test_exception_from_on_wait_removes_ticket():
+    scheduler = _drained()
+
+    def rerun(position, expected_wait):
+        raise Rerun()
+
+    with pytest.raises(Rerun):
+        scheduler.acquire('farmer', 100, timeout=5, on_wait=rerun)
+    assert scheduler.stats()['queued'] == 0
+    scheduler.requests.tokens = 1
+    # Nothing is left queued ahead of new requests to take the slot
+    assert scheduler.try_acquire(100)
+
+
+def test_on_wait_runs_without_the_lock():
+    scheduler = _drained()
+    other_thread_done = []
+
+    def on_wait(position, expected_wait):
+        if position:
+            reader = threading.Thread(target=lambda: other_thread_done.append(scheduler.stats()))
+            reader.start()
+            reader.join(timeout=1)
+
+    scheduler.acquire('farmer', 100, timeout=0.2, on_wait=on_wait)
+    assert other_thread_done
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from config import SUPPORTED_LANGUAGES
+from scheme_kb import (SCHEME_FIELD_TITLES, SCHEME_FIELDS, SCHEMES, parse_scheme_record, render_scheme,
+                       scheme_prompt)
+
+
+def test_scheme_prompt_comes_from_template():
+    prompt = scheme_prompt(SCHEMES[0], 'Marathi')
+    assert prompt.name == 'scheme_record'
+    assert SCHEMES[0]['full_name'] in prompt
+    assert 'Marathi language' in prompt
+    assert all(f'"{field}"' in prompt for field in SCHEME_FIELDS)
+
+
+def test_parse_scheme_record_accepts_fenced_json():
+    record = {field: f"- {field} line" for field in SCHEME_FIELDS}
+    assert parse_scheme_record(f"```json\n{json.dumps(record)}\n```") == record
+
+
+def test_parse_scheme_record_rejects_missing_fields():
+    with pytest.raises(ValueError, match='contacts'):
+        parse_scheme_record(json.dumps({field: 'x' for field in SCHEME_FIELDS[:-1]}))
+
+
+def test_render_scheme_uses_record_language_headings():
+    record = {field: 'x' for field in SCHEME_FIELDS}
+    marathi = render_scheme('pm-kisan', record, 'mr')
+    assert '**पात्रता निकष**' in marathi and 'Eligibility' not in marathi
+    assert '**Eligibility criteria**' in render_scheme('pm-kisan', record, 'xx')
+    assert set(SCHEME_FIELD_TITLES) >= set(SUPPORTED_LANGUAGES)
@@ -0,0 +1,86 @@
+import pytest
+
+from semantic_cache import SemanticCache, guard_terms
+
+THRESHOLD = 0.78
+
+HITS = [
+    ("how to control aphids in cotton", "aphid control in cotton?"),
+    ("best fertilizer for rice", "which fertilizer is best for paddy"),
+    ("गेहूं में यूरिया कितना डालें", "gehu me urea kitna dale"),
+    ("धान में खाद कब डालें?", "dhan me khad kab dale"),
+    ("सोयाबीन की बुवाई कब करें", "soyabean ki buvai kab kare"),
+    ("urea dose for 1 acre wheat", "wheat urea dose per 1 acre"),
+    ("tomato leaf curl virus treatment", "treatment for leaf curl virus in tomatoes"),
+]
+
+NON_HITS = [
+    ("urea for 1 acre", "urea for 2 acre"),
+    ("urea for 1 acre wheat", "urea for 1 hectare wheat"),
+    ("spray 2 ml per litre", "spray 20 ml per litre"),
+    ("do not use urea", "use urea"),
+    ("मत डालो यूरिया", "यूरिया डालो"),
+    ("गेहूं में यूरिया कितना डालें", "धान में यूरिया कितना डालें"),
+    ("how to control aphids", "aphid control in cotton?"),
+    ("when to sow wheat", "when to harvest wheat"),
+    ("how to store wheat seed", "how to treat wheat seed"),
+]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SemanticCache(str(tmp_path / 'semantic.db'), threshold=THRESHOLD)
+
+
+@pytest.mark.parametrize('stored, asked', HITS)
+def test_near_duplicates_hit(cache, stored, asked):
+    cache.add(stored, 'hi', 'answer')
+    assert cache.lookup(asked, 'hi') == 'answer'
+
+
+@pytest.mark.parametrize('stored, asked', NON_HITS)
+def test_different_questions_miss(cache, stored, asked):
+    cache.add(stored, 'hi', 'answer')
+    assert cache.lookup(asked, 'hi') is None
+
+
+def test_guard_terms_span_scripts():
+    assert guard_terms("गेहूं में 2 किलो यूरिया") == guard_terms("gehun me 2 kilo urea")
+    assert guard_terms("१ एकड़") == guard_terms("1 ekad") == ((), ('1', 'acre'), False)
+
+
+def test_best_match_with_same_guard_wins(cache):
+    cache.add("urea for 1 acre wheat", 'en', 'one acre')
+    cache.add("urea for 2 acre wheat", 'en', 'two acres')
+    assert cache.lookup("wheat urea for 2 acre", 'en') == 'two acres'
+
+
+def test_rebuild_keeps_guards(tmp_path):
+    path = str(tmp_path / 'semantic.db')
+    SemanticCache(path, threshold=THRESHOLD).add("urea for 1 acre", 'en', 'answer')
+    cache = SemanticCache(path, threshold=THRESHOLD)
+    cache.rebuild()
+    assert cache.lookup("urea for 1 acre?", 'en') == 'answer'
+    assert cache.lookup("urea for 2 acre", 'en') is None
+
+
+def test_languages_are_separate(cache):
+    cache.add("aphid control", 'en', 'answer')
+    assert cache.lookup("aphid control", 'mr') is None
+
+
+def test_expired_entries_are_skipped_and_deleted(tmp_path, monkeypatch):
+    import semantic_cache
+    path = str(tmp_path / 'semantic.db')
+    cache = SemanticCache(path, threshold=THRESHOLD, ttl=60)
+    cache.add("aphid control in cotton", 'en', 'answer')
+    assert cache.lookup("aphid control in cotton?", 'en') == 'answer'
+
+    later = semantic_cache.time.time() + 61
+    monkeypatch.setattr(semantic_cache.time, 'time', lambda: later)
+    assert cache.lookup("aphid control in cotton?", 'en') is None
+    assert cache.stats()['entries']['en'] == 0
+
+    cache.add("when to sow wheat", 'en', 'answer')
+    monkeypatch.setattr(semantic_cache.time, 'time', lambda: later + 61)
+    assert SemanticCache(path, threshold=THRESHOLD, ttl=60).stats()['entries'] == {}
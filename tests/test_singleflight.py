@@ -0,0 +1,45 @@
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class Rerun(BaseException):
+    """Stands in for Streamlit's RerunException."""
+
+
+def lead_with_follower(flight, error):
+    """Raise `error` in the leader once a second caller has attached; returns what the follower got."""
+    results = []
+
+    def follower():
+        try:
+            results.append(flight.do('key', lambda: 'unused'))
+        except BaseException as e:
+            results.append(e)
+
+    thread = threading.Thread(target=follower)
+
+    def leader():
+        thread.start()
+        while flight.stats()['coalesced'] == 0:
+            pass
+        raise error
+
+    with pytest.raises(type(error)):
+        flight.do('key', leader)
+    thread.join(1)
+    return results
+
+
+def test_leader_interruption_stays_in_leader_thread():
+    flight = SingleFlight(timeout=1, interrupted='interrupted')
+    assert lead_with_follower(flight, Rerun()) == ['interrupted']
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_follower_shares_leader_error():
+    flight = SingleFlight(timeout=1)
+    results = lead_with_follower(flight, ValueError("quota"))
+    assert isinstance(results[0], ValueError)
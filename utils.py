@@ -61,16 +61,35 @@ def compress_image(image_file, max_size=(800, 800), quality=85):
         if image.width > max_size[0] or image.height > max_size[1]:
             image.thumbnail(max_size, Image.Resampling.LANCZOS)
         
+        # Hash before JPEG re-encoding so retakes and forwards hash alike
+        image_hash = perceptual_hash(image)
+        
         # Save to buffer with compression
         buffer = io.BytesIO()
         image.save(buffer, format='JPEG', quality=quality, optimize=True)
         buffer.seek(0)
         
-        return Image.open(buffer)
+        compressed = Image.open(buffer)
+        compressed.info['dhash'] = image_hash
+        return compressed
     except Exception as e:
         st.error(f"Image processing error: {str(e)}")
         return None
 
+def perceptual_hash(image, hash_size=8):
+    """
+    Difference hash (dHash) of an image as a 64-bit integer.
+    Near-identical photos differ in only a few bits.
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
 def save_uploaded_file(uploaded_file, save_dir):
     """
     Save uploaded file to disk and return file path.